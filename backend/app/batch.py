@@ -0,0 +1,336 @@
+"""
+Offline batch analysis of recorded sessions (dispute reviews, threshold tuning).
+
+Run from backend/:
+    python -m app.batch RECORDING [RECORDING ...] --out results.npz [--workers N]
+                        [--sample-fps 5] [--fps 5] [--session ID]
+                        [--brow-threshold 0.35] [--gaze-left 0.45] [--gaze-right 0.55]
+
+A recording is a video file or a directory of frames (sorted by name, --fps apart) and
+holds one student, named after the file / directory. Recordings run in parallel on a
+process pool, one recording per worker; inside a worker a reader thread reads (and for
+videos decodes) ahead of the analysis. Frames take the live path (decode reduction,
+CVPipeline, SessionEvaluator) with the rule timers driven by the recording's timestamps
+instead of the wall clock. Thresholds go to that recording's pipeline and rules only.
+
+Writes:
+    results.npz    columnar timeline, one row per analyzed frame: student, t, status,
+                   alert, face_count, confusion_score, gaze, brow, smile (+ name tables)
+    results.json   per-student summary: seconds per status / alert, alert episodes,
+                   analysis speed vs real time
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.config import MAX_STUDENT_FPS
+from app.models.session_state import STATUS_NAMES, ALERT_NAMES, STATUS_CODES, ALERT_CODES
+
+logger = logging.getLogger("BatchAnalysis")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+GAZE_NAMES = ["CENTER", "LEFT", "RIGHT"]
+GAZE_CODES = {name: code for code, name in enumerate(GAZE_NAMES)}
+
+# Timeline columns and their on-disk types
+COLUMNS = {
+    "t": np.float64, "status": np.int8, "alert": np.int8, "face_count": np.int16,
+    "confusion_score": np.float32, "gaze": np.int8, "brow": np.float32, "smile": np.float32,
+}
+
+# Frames decoded ahead of the analysis per worker
+_READ_AHEAD = 8
+_DONE = object()
+
+
+# --- FRAME SOURCES (reader thread) ---
+# A source yields (t, payload); its decode turns a payload into the frame at a decode reduction.
+# The reduction is chosen when the frame is analyzed, from the face size the previous frame
+# measured (as on the live path), so only what does not depend on it runs ahead on the reader.
+
+def _video_frames(path: str, sample_fps: float) -> Iterator[Tuple[float, np.ndarray]]:
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = 1.0 / sample_fps if sample_fps > 0 else 0.0
+    next_t, index = 0.0, -1
+    try:
+        # grab() every frame (cheap), decode only the sampled ones
+        while capture.grab():
+            index += 1
+            t = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 or index / source_fps
+            if t + 1e-6 < next_t:
+                continue
+            next_t = max(next_t + step, t) if step else t
+            ok, frame = capture.retrieve()
+            if ok:
+                yield t, frame
+    finally:
+        capture.release()
+
+
+def _resize_frame(frame: np.ndarray, reduction: int) -> np.ndarray:
+    # Same resolution the live path would decode at
+    if reduction > 1:
+        frame = cv2.resize(frame, (frame.shape[1] // reduction, frame.shape[0] // reduction),
+                           interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def _directory_frames(path: str, fps: float) -> Iterator[Tuple[float, bytes]]:
+    # Encoded images: a JPEG decodes straight at the reduction (frame_receiver), on the analysis thread
+    files = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+    for index, name in enumerate(files):
+        with open(os.path.join(path, name), "rb") as f:
+            yield index / fps, f.read()
+
+
+def _decode_image(encoded: bytes, reduction: int) -> Optional[np.ndarray]:
+    from app.services.frame_receiver import frame_receiver
+
+    return frame_receiver.decode_bytes(encoded, reduction=reduction)
+
+
+def _read_ahead(frames: Iterator, depth: int = _READ_AHEAD) -> Iterator:
+    """
+    Runs `frames` on a thread, `depth` items ahead of the consumer. Decoding and
+    MediaPipe both release the GIL, so reading overlaps with the analysis.
+    """
+    buffer = queue.Queue(maxsize=depth)
+
+    def produce():
+        try:
+            for item in frames:
+                buffer.put(item)
+            buffer.put(_DONE)
+        except Exception as e:
+            buffer.put(e)
+
+    threading.Thread(target=produce, name="batch-reader", daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+# --- ANALYSIS (one recording, runs inside a pool worker) ---
+
+_pipeline = None
+
+
+def _batch_pipeline(gaze_left: float, gaze_right: float):
+    """
+    This process's CVPipeline for these gaze cutoffs (one at a time: every recording of a
+    batch shares its thresholds, so a worker builds it once).
+    """
+    from app.services.cv_pipeline import CVPipeline
+
+    global _pipeline
+    if _pipeline is None or (_pipeline.gaze_left, _pipeline.gaze_right) != (gaze_left, gaze_right):
+        _pipeline = CVPipeline(gaze_left, gaze_right)
+    return _pipeline
+
+
+def analyze_recording(path: str, student_id: Optional[str] = None, session_id: str = "OFFLINE",
+                      sample_fps: float = MAX_STUDENT_FPS, fps: float = MAX_STUDENT_FPS,
+                      thresholds: Optional[dict] = None) -> dict:
+    """
+    Analyzes one recording. `thresholds` (brow, gaze_left, gaze_right; None = default)
+    go to its pipeline (gaze labels), fusion (gaze cutoffs) and confusion rule (brow).
+    Returns {"student_id", "path", "columns": {name: array}, "media_seconds", "processing_seconds"}.
+    """
+    from app.services.confusion import ConfusionEngine
+    from app.services.landmark_metrics import GAZE_LEFT_RATIO, GAZE_RIGHT_RATIO
+    from app.services.metric_fusion import MetricFusion
+    from app.services.proctoring import ProctoringEngine
+    from app.services.session_evaluator import SessionEvaluator
+    from app.utils.timers import ManualClock, TimerWheel
+
+    student_id = student_id or os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    thresholds = {name: value for name, value in (thresholds or {}).items() if value is not None}
+    gaze_left = thresholds.get("gaze_left", GAZE_LEFT_RATIO)
+    gaze_right = thresholds.get("gaze_right", GAZE_RIGHT_RATIO)
+    cv_pipeline = _batch_pipeline(gaze_left, gaze_right)
+    # Fresh rule timers per recording, on the recording's clock
+    clock = ManualClock(0.0)
+    wheel = TimerWheel(clock=clock)
+    confusion = ConfusionEngine(wheel, brow_threshold=thresholds["brow"]) if "brow" in thresholds else ConfusionEngine(wheel)
+    evaluator = SessionEvaluator(ttl_seconds=math.inf, proctoring=ProctoringEngine(wheel), confusion=confusion,
+                                 wheel=wheel, fusion=MetricFusion(gaze_left=gaze_left, gaze_right=gaze_right))
+
+    if os.path.isdir(path):
+        frames, decode = _directory_frames(path, fps), _decode_image
+    else:
+        frames, decode = _video_frames(path, sample_fps), _resize_frame
+
+    rows: Dict[str, list] = {name: [] for name in COLUMNS}
+    started = time.perf_counter()
+    try:
+        for t, payload in _read_ahead(frames):
+            # Reduction from the face size of the frame just analyzed, as the live path decodes
+            r = cv_pipeline.decode_reduction(student_id)
+            frame = decode(payload, r)
+            if frame is None:
+                continue
+            result = cv_pipeline.process_frame(frame, student_id, r)
+            clock.set(t)
+            wheel.advance()
+            state = evaluator.evaluate(student_id, session_id, result, now=t)
+            metrics = result["metrics"]
+            rows["t"].append(t)
+            rows["status"].append(state.status)
+            rows["alert"].append(state.alert)
+            rows["face_count"].append(state.face_count)
+            rows["confusion_score"].append(state.confusion_score)
+            rows["gaze"].append(GAZE_CODES.get(metrics.get("gaze"), 0))
+            rows["brow"].append(metrics.get("brow", 0.0))
+            rows["smile"].append(metrics.get("smile", 0.0))
+    finally:
+        # Release the student's tracking graph (workers analyze several recordings)
+        if cv_pipeline.sessions is not None:
+            cv_pipeline.sessions.evict(student_id)
+
+    columns = {name: np.asarray(values, dtype=COLUMNS[name]) for name, values in rows.items()}
+    interval = 1.0 / (sample_fps if sample_fps > 0 and not os.path.isdir(path) else fps)
+    media = float(columns["t"][-1] - columns["t"][0]) + interval if len(columns["t"]) else 0.0
+    return {"student_id": student_id, "path": path, "columns": columns,
+            "media_seconds": media, "processing_seconds": time.perf_counter() - started}
+
+
+def summarize(record: dict) -> dict:
+    """
+    Per-student report: time per status / alert (each row lasts until the next one) and
+    alert episodes (entries into each alert).
+    """
+    c = record["columns"]
+    n = len(c["t"])
+    summary = {"path": record["path"], "frames": n, "media_seconds": round(record["media_seconds"], 3),
+               "processing_seconds": round(record["processing_seconds"], 3),
+               "realtime_factor": round(record["media_seconds"] / record["processing_seconds"], 1)
+               if record["processing_seconds"] else None}
+    if not n:
+        return summary
+
+    durations = np.diff(c["t"], append=c["t"][0] + record["media_seconds"])
+    summary["status_seconds"] = {name: round(float(durations[c["status"] == code].sum()), 3)
+                                 for code, name in enumerate(STATUS_NAMES) if (c["status"] == code).any()}
+    summary["alert_seconds"] = {name: round(float(durations[c["alert"] == code].sum()), 3)
+                                for code, name in enumerate(ALERT_NAMES) if (c["alert"] == code).any()}
+    entered = np.flatnonzero(np.diff(c["alert"], prepend=ALERT_CODES["NONE"]) != 0)
+    episodes = {}
+    for i in entered:
+        name = ALERT_NAMES[c["alert"][i]]
+        if name != "NONE":
+            episodes.setdefault(name, []).append(round(float(c["t"][i]), 3))
+    summary["alert_episodes"] = episodes
+    confused = np.diff((c["status"] == STATUS_CODES["CONFUSED"]).astype(np.int8), prepend=0) == 1
+    summary["confused_episodes"] = [round(float(t), 3) for t in c["t"][confused]]
+    return summary
+
+
+# --- BATCH ---
+
+def _init_worker():
+    logging.basicConfig(level=logging.WARNING)
+
+
+def run_batch(paths: List[str], out: str, workers: int = os.cpu_count() or 1, session_id: str = "OFFLINE",
+              sample_fps: float = MAX_STUDENT_FPS, fps: float = MAX_STUDENT_FPS,
+              thresholds: Optional[dict] = None) -> dict:
+    """
+    Analyzes every recording (one per worker process) and writes `out` (.npz timeline)
+    plus the JSON summary next to it. Returns the summary.
+    """
+    import multiprocessing
+
+    started = time.perf_counter()
+    records = []
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(paths))), mp_context=ctx,
+                             initializer=_init_worker) as pool:
+        futures = {pool.submit(analyze_recording, path, None, session_id, sample_fps, fps, thresholds): path
+                   for path in paths}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                logger.error(f"{futures[future]}: analysis failed: {e}")
+                continue
+            records.append(record)
+            logger.info(f"{record['student_id']}: {len(record['columns']['t'])} frames, "
+                        f"{record['media_seconds']:.1f}s of media in {record['processing_seconds']:.1f}s")
+    wall = time.perf_counter() - started
+
+    records.sort(key=lambda r: r["student_id"])
+    write_timeline(out, records)
+    media = sum(r["media_seconds"] for r in records)
+    summary = {
+        "session_id": session_id,
+        "recordings": len(paths),
+        "analyzed": len(records),
+        "media_seconds": round(media, 3),
+        "wall_seconds": round(wall, 3),
+        "realtime_factor": round(media / wall, 1) if wall else None,
+        "thresholds": thresholds or {},
+        "students": {r["student_id"]: summarize(r) for r in records},
+    }
+    with open(os.path.splitext(out)[0] + ".json", "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def write_timeline(out: str, records: List[dict]):
+    """
+    One table for all students: a `student` column indexes `students`; status / alert /
+    gaze are codes into the *_names tables.
+    """
+    columns = {name: np.concatenate([r["columns"][name] for r in records]) if records
+               else np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+    student = np.concatenate([np.full(len(r["columns"]["t"]), i, np.int32) for i, r in enumerate(records)]) \
+        if records else np.empty(0, np.int32)
+    np.savez_compressed(out, student=student, **columns,
+                        students=np.array([r["student_id"] for r in records]),
+                        status_names=np.array(STATUS_NAMES), alert_names=np.array(ALERT_NAMES),
+                        gaze_names=np.array(GAZE_NAMES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help="video files or frame directories (one student each)")
+    parser.add_argument("--out", required=True, help="timeline .npz (summary written next to it as .json)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--session", default="OFFLINE")
+    parser.add_argument("--sample-fps", type=float, default=MAX_STUDENT_FPS,
+                        help="frames analyzed per second of video (0 = every frame)")
+    parser.add_argument("--fps", type=float, default=MAX_STUDENT_FPS, help="frame rate of frame directories")
+    parser.add_argument("--brow-threshold", type=float)
+    parser.add_argument("--gaze-left", type=float)
+    parser.add_argument("--gaze-right", type=float)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    # Per-frame rule logs are noise here
+    logging.getLogger("SessionEvaluator").setLevel(logging.WARNING)
+
+    thresholds = {k: v for k, v in (("brow", args.brow_threshold), ("gaze_left", args.gaze_left),
+                                    ("gaze_right", args.gaze_right)) if v is not None}
+    summary = run_batch(args.recordings, args.out, args.workers, args.session, args.sample_fps, args.fps, thresholds)
+    print(f"{summary['analyzed']}/{summary['recordings']} recordings, {summary['media_seconds']:.0f}s of media "
+          f"in {summary['wall_seconds']:.1f}s ({summary['realtime_factor']}x real time) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,215 @@
 # This file stores configuration values.
-# TODO: Define camera frame rate limits.
 # TODO: Define gaze-away duration threshold (e.g., 4 seconds).
 # TODO: Define confusion detection time window.
-# TODO: Store any environment-based configuration.
+import os
+
+# --- Analysis Engine (CV Process Pool) ---
+# Number of worker processes running the CV pipeline.
+# 0 = run the pipeline in a single background thread inside the API process (dev mode).
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+
+# Maximum frames waiting for (or inside) the workers before new frames are rejected.
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", 64))
+
+# Load and warm the models in every worker at startup (/ready reports 503 until done).
+# 0 = load lazily on the first frame.
+ANALYSIS_WARM_UP = os.getenv("ANALYSIS_WARM_UP", "1") == "1"
+
+# --- Per-Student Analyzer Sessions ---
+# Idle analyzer sessions (FaceMesh graph + tracking state) are dropped after this many seconds.
+ANALYZER_SESSION_TTL_SECONDS = float(os.getenv("ANALYZER_SESSION_TTL_SECONDS", 120))
+
+# Hard cap of live analyzer sessions per worker (least recently seen is evicted first).
+ANALYZER_MAX_SESSIONS = int(os.getenv("ANALYZER_MAX_SESSIONS", 256))
+
+# Face detection score needed before a session switches to mesh-only tracking.
+TRACKING_LOCK_CONFIDENCE = float(os.getenv("TRACKING_LOCK_CONFIDENCE", 0.7))
+
+# While tracking, FaceDetection still runs every N frames (reused static frames count) so MULTIPLE_FACES is not missed.
+DETECTION_REFRESH_FRAMES = int(os.getenv("DETECTION_REFRESH_FRAMES", 10))
+
+# While tracking, a frame thumbnail cell away from the face that moved by more than this many gray
+# levels since the last detection (someone stepping in) forces a detection on that frame. 0 = off.
+DETECTION_SCENE_THRESHOLD = float(os.getenv("DETECTION_SCENE_THRESHOLD", 24))
+
+# --- Admission Control (Frame Rate Limits) ---
+# Maximum frames analyzed per second for one student; extra frames wait in a
+# one-slot mailbox where a newer frame replaces the unprocessed older one.
+MAX_STUDENT_FPS = float(os.getenv("MAX_STUDENT_FPS", 5.0))
+
+# Frames analyzed concurrently across all students.
+ANALYSIS_MAX_CONCURRENCY = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", max(1, ANALYSIS_WORKERS) * 2))
+
+# Frames older than this when they reach the front of the line are dropped (bounds latency).
+MAX_FRAME_AGE_MS = float(os.getenv("MAX_FRAME_AGE_MS", 1000))
+
+# Students sending client-side landmarks instead of frames: rule updates per second.
+# Analysis is ~0.1 ms on the event loop (no worker process), so no real concurrency cap applies.
+LANDMARK_MAX_FPS = float(os.getenv("LANDMARK_MAX_FPS", 10.0))
+
+# --- Teacher Broadcast ---
+# Delta broadcast ticks per second (changed students only, serialized once per tick).
+BROADCAST_HZ = float(os.getenv("BROADCAST_HZ", 5.0))
+
+# Outbound messages buffered per teacher socket before it is resynced with a snapshot.
+TEACHER_QUEUE_SIZE = int(os.getenv("TEACHER_QUEUE_SIZE", 8))
+
+# A single send blocked longer than this drops the teacher connection.
+TEACHER_SEND_TIMEOUT_SECONDS = float(os.getenv("TEACHER_SEND_TIMEOUT_SECONDS", 2.0))
+
+# Longest a GET /teacher/sessions long-poll (?wait=) is held open before answering 304.
+LONG_POLL_MAX_SECONDS = float(os.getenv("LONG_POLL_MAX_SECONDS", 25.0))
+
+# Removed / moved students remembered for ?since_version= deltas; older versions get a full list.
+STORE_TOMBSTONES = int(os.getenv("STORE_TOMBSTONES", 4096))
+
+# --- Quality Governor (analysis fidelity under load) ---
+# Lowest fidelity a student can be stepped down to: 0 = always full analysis, 1 = reduced
+# resolution, 2 = mesh every QUALITY_MESH_EVERY frames (face count in between), 3 = face count only.
+QUALITY_MAX_LEVEL = int(os.getenv("QUALITY_MAX_LEVEL", 3))
+
+# Analysis latency budget per frame (queue + IPC + decode + CV); a student above it steps down.
+QUALITY_TARGET_MS = float(os.getenv("QUALITY_TARGET_MS", 200))
+
+# Minimum time between two level changes of a student (stepping back up waits twice as long).
+QUALITY_STEP_SECONDS = float(os.getenv("QUALITY_STEP_SECONDS", 2.0))
+
+# At level 2 the mesh runs on one frame in N; frames in between only count faces.
+QUALITY_MESH_EVERY = int(os.getenv("QUALITY_MESH_EVERY", 3))
+
+# --- Capture Profile (what student clients are asked to send) ---
+# 0 = clients only get the admission backoff interval (X-Capture-Interval-Ms), as before.
+CAPTURE_PROFILE_ENABLED = os.getenv("CAPTURE_PROFILE_ENABLED", "1") == "1"
+
+# Capture interval while a student is not steadily focused (alerts, confusion, distraction).
+CAPTURE_INTERVAL_MS = float(os.getenv("CAPTURE_INTERVAL_MS", 200))
+
+# Interval once the student has been FOCUSED without an alert for CAPTURE_STABLE_SECONDS.
+CAPTURE_STABLE_INTERVAL_MS = float(os.getenv("CAPTURE_STABLE_INTERVAL_MS", 750))
+CAPTURE_STABLE_SECONDS = float(os.getenv("CAPTURE_STABLE_SECONDS", 10))
+
+# Upper bound of the suggested interval (admission backoff and governor level included).
+CAPTURE_MAX_INTERVAL_MS = float(os.getenv("CAPTURE_MAX_INTERVAL_MS", 2000))
+
+# Frame width range; the width asked for keeps the face about MIN_FACE_PIXELS wide.
+CAPTURE_MIN_WIDTH = int(os.getenv("CAPTURE_MIN_WIDTH", 320))
+CAPTURE_MAX_WIDTH = int(os.getenv("CAPTURE_MAX_WIDTH", 640))
+
+# JPEG quality (canvas.toBlob), lowered while the student is stable or the server is loaded.
+CAPTURE_JPEG_QUALITY = float(os.getenv("CAPTURE_JPEG_QUALITY", 0.6))
+CAPTURE_STABLE_JPEG_QUALITY = float(os.getenv("CAPTURE_STABLE_JPEG_QUALITY", 0.5))
+
+# --- Metric Fusion (per-student smoothing between the landmarks and the rules) ---
+# Filter each student's landmark metrics over time before the rules run (on a still face the
+# decisions are the per-frame ones). 0 = the rules see each frame's raw metrics.
+FUSION_ENABLED = os.getenv("FUSION_ENABLED", "1") == "1"
+
+# One-Euro filter: cutoff (Hz) while a metric holds still, and how fast it opens as the metric moves.
+FUSION_MIN_CUTOFF = float(os.getenv("FUSION_MIN_CUTOFF", 0.5))
+FUSION_BETA = float(os.getenv("FUSION_BETA", 2.0))
+
+# Gaze labels keep the per-frame cutoffs (GAZE_LEFT_RATIO / GAZE_RIGHT_RATIO in landmark_metrics):
+# a LEFT / RIGHT label clears once the smoothed ratio is this far back inside them (0 = at the cutoff;
+# a margin keeps a student whose resting gaze sits near a cutoff flagged longer).
+FUSION_GAZE_HYSTERESIS = float(os.getenv("FUSION_GAZE_HYSTERESIS", 0.0))
+
+# Share of the right eye's iris ratio blended in, weighted by how frontal each eye is
+# (0 = left eye only, as the per-frame label; 1 = both eyes by eye_balance: half the iris noise).
+FUSION_EYE_BLEND = float(os.getenv("FUSION_EYE_BLEND", 1.0))
+
+# Head turn proxy (nose offset / face width) ignored around the camera axis, and its weight beyond
+# (added to the gaze ratio; 0 = ignored, as the per-frame label). A frontal face stays under 0.1;
+# at gain 1 a head turned past ~0.2 (about 25 degrees) reads as looking away with centered irises.
+FUSION_HEAD_DEADZONE = float(os.getenv("FUSION_HEAD_DEADZONE", 0.15))
+FUSION_HEAD_GAIN = float(os.getenv("FUSION_HEAD_GAIN", 1.0))
+
+# Eye aspect ratio of an open eye: narrower eyes (blinks, squints) weigh the iris position less.
+FUSION_OPEN_EAR = float(os.getenv("FUSION_OPEN_EAR", 0.25))
+
+# Damp a jump until the next frame confirms it: one glitched frame cannot start a rule timer at
+# 1 FPS, but every real change is then flagged a frame later. 0 = off.
+FUSION_CONFIRM_JUMPS = os.getenv("FUSION_CONFIRM_JUMPS", "0") == "1"
+
+# --- Pre-Processing ---
+# Largest JPEG decode reduction (1, 2, 4 or 8); 1 always decodes at full resolution.
+DECODE_REDUCTION = int(os.getenv("DECODE_REDUCTION", 2))
+
+# Reduced decoding is used only while the face stays at least this many pixels wide.
+MIN_FACE_PIXELS = int(os.getenv("MIN_FACE_PIXELS", 160))
+
+# Run the mesh on the previous frame's face box instead of the full frame.
+ROI_CROP_ENABLED = os.getenv("ROI_CROP_ENABLED", "1") == "1"
+
+# Padding added on each side of the face box, as a fraction of the face size.
+ROI_PADDING = float(os.getenv("ROI_PADDING", 0.5))
+
+# --- Static Frames ---
+# A frame whose gray thumbnail differs from the last analyzed one by at most this many
+# levels in every cell reuses that analysis (detection + mesh skipped). 0 = analyze every frame.
+STATIC_FRAME_THRESHOLD = float(os.getenv("STATIC_FRAME_THRESHOLD", 8))
+
+# A full analysis is forced after this many consecutive reused frames (bounds staleness).
+STATIC_FRAME_REFRESH = int(os.getenv("STATIC_FRAME_REFRESH", 10))
+
+# --- Timeline History ---
+# Rows kept per student (ring buffer, ~16 bytes per row).
+TIMELINE_CAPACITY = int(os.getenv("TIMELINE_CAPACITY", 1024))
+
+# Besides state transitions, a sample row is recorded at most this often.
+TIMELINE_SAMPLE_SECONDS = float(os.getenv("TIMELINE_SAMPLE_SECONDS", 5.0))
+
+# --- Class Summaries ---
+# Width of the time buckets behind the 1 / 5 / 15 minute windows (window resolution).
+SUMMARY_BUCKET_SECONDS = float(os.getenv("SUMMARY_BUCKET_SECONDS", 5.0))
+
+# Teacher sockets receive each followed room's summary at most this often (when it changed).
+SUMMARY_PUSH_SECONDS = float(os.getenv("SUMMARY_PUSH_SECONDS", 2.0))
+
+# --- Persistence (optional) ---
+# SQLite file (WAL mode) for the state event log. Empty = in-memory only.
+PERSISTENCE_PATH = os.getenv("PERSISTENCE_PATH", "")
+
+# Group commit: pending transitions are written in one transaction at most this often.
+PERSISTENCE_COMMIT_MS = float(os.getenv("PERSISTENCE_COMMIT_MS", 200))
+
+# A compact snapshot is written (and the log behind it truncated) after this many events...
+PERSISTENCE_SNAPSHOT_EVENTS = int(os.getenv("PERSISTENCE_SNAPSHOT_EVENTS", 5000))
+
+# ...or after this many seconds with at least one new event.
+PERSISTENCE_SNAPSHOT_SECONDS = float(os.getenv("PERSISTENCE_SNAPSHOT_SECONDS", 300))
+
+# --- Instrumentation ---
+# Per-frame debug logs are emitted once every N frames (set the logger to DEBUG to see them).
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", 100))
+
+# Flight recorder: last N frames per student (timings, raw metrics, decisions), 88 bytes each.
+# Dumped by GET /admin/flight-recorder. 0 = off.
+FLIGHT_RECORDER_FRAMES = int(os.getenv("FLIGHT_RECORDER_FRAMES", 256))
+
+# Required in the X-Admin-Token header by /admin endpoints (empty = the endpoints answer 404).
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# --- Multi-Worker State ---
+# "memory" = single process (default); "broker" = local socket broker; "redis" = Redis server.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+
+# Broker / Redis address shared by all workers (tcp://host:port or redis://host:port/db).
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "tcp://127.0.0.1:6390")
+
+# Hash holding the latest entry per student, and the channel workers publish updates on.
+STATE_HASH = os.getenv("STATE_HASH", "smartsession:students")
+STATE_CHANNEL = os.getenv("STATE_CHANNEL", "smartsession:updates")
+
+# Cross-worker sync ticks per second (changed students only, latest wins within a tick).
+STATE_SYNC_HZ = float(os.getenv("STATE_SYNC_HZ", 20.0))
+
+# --- Rule Timers ---
+# Resolution of the timer wheel driving gaze-away, confusion, offline and eviction timers.
+TIMER_TICK_SECONDS = float(os.getenv("TIMER_TICK_SECONDS", 0.1))
+
+# A student whose frames stop for this long is shown as OFFLINE (evicted after ANALYZER_SESSION_TTL_SECONDS).
+OFFLINE_TIMEOUT_SECONDS = float(os.getenv("OFFLINE_TIMEOUT_SECONDS", 10.0))
+
+# Hysteresis: an active gaze-away / confusion condition clears only after this long without it (0 = at once).
+GAZE_CLEAR_SECONDS = float(os.getenv("GAZE_CLEAR_SECONDS", 0.0))
+CONFUSION_CLEAR_SECONDS = float(os.getenv("CONFUSION_CLEAR_SECONDS", 0.0))
@@ -1,8 +1,19 @@
+import asyncio
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes.student import router as student_router
+from app.routes.student import router as student_router, active_streams
 from app.routes.teacher import router as teacher_router
+from app.routes.admin import router as admin_router
+from app.services.analysis_engine import analysis_engine
+from app.services.connection_manager import manager
+from app.services.session_evaluator import session_evaluator
+from app.state.persistence import persistence
+from app.state.backend import state_backend
+from app.services.admission import admission_controller
+from app.state.session_store import SESSION_STORE
+from app.utils.instrumentation import registry
+from app.utils.flight_recorder import flight_recorder
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
@@ -24,18 +35,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Admission feedback / capture profile headers read by the student client, ETag by the teacher long-poll
+    expose_headers=["X-Frame-Status", "X-Frames-Coalesced", "X-Frames-Dropped", "X-Capture-Interval-Ms",
+                    "X-Capture-Width", "X-Capture-Quality", "ETag"],
 )
 
 app.include_router(student_router)
 app.include_router(teacher_router)
+app.include_router(admin_router)
+
+# Connection counts and queue depths, read at scrape time
+registry.gauge("smartsession_teacher_connections", "Open teacher WebSockets", lambda: len(manager.active_connections))
+registry.gauge("smartsession_student_streams", "Open student frame streams", lambda: len(active_streams))
+registry.gauge("smartsession_teacher_queue_depth", "Messages waiting in teacher send queues", lambda: manager.queued_messages)
+registry.gauge("smartsession_analysis_queue_depth", "Frames queued or running in the analysis workers", lambda: analysis_engine.pending)
+registry.gauge("smartsession_admission_mailboxes", "Students with an admission mailbox", lambda: len(admission_controller))
+registry.gauge("smartsession_students", "Students in the session store", lambda: len(SESSION_STORE))
+registry.gauge("smartsession_flight_recorder_students", "Students with a flight recorder ring", lambda: len(flight_recorder))
+
+# Startup tasks kept referenced until they finish
+_background = []
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("Backend starting up...")
+    if persistence.enabled:
+        # Rebuild store + rule timers before serving
+        persistence.open()
+    analysis_engine.start()
+    if analysis_engine.warm_up_on_start:
+        # Models load in the workers while the app already answers /health
+        _background.append(asyncio.create_task(analysis_engine.warm_up()))
+    manager.start()
+    # Gaze-away / confusion / offline / eviction timers
+    session_evaluator.start()
+    # Multi-worker: load the other workers' students, then follow their updates
+    await state_backend.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Backend shutting down...")
+    for task in _background:
+        task.cancel()
+    await state_backend.stop()
+    await session_evaluator.stop()
+    await manager.stop()
+    analysis_engine.shutdown()
+    persistence.close()
 
 @app.get("/health")
 async def health_check():
@@ -44,6 +90,25 @@ async def health_check():
     """
     return {"status": "ok", "service": "smartsession-backend"}
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """
+    Readiness for load balancers and rolling deploys: 503 until every analysis worker has
+    loaded and warmed its models (and the shared state backend is connected).
+    """
+    checks = {"analysis": analysis_engine.ready, "state_backend": state_backend.ready}
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "starting", "checks": checks}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition of the per-stage histograms, counters and gauges.
+    """
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "SmartSession Backend is Live"}
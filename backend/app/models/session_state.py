@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from enum import Enum
 from typing import Optional, List
 from datetime import datetime
+import json
 
 class StudentStatus(Enum):
     FOCUSED = "FOCUSED"
@@ -16,6 +17,16 @@ class AlertType(Enum):
     UNAUTHORIZED_OBJECT = "UNAUTHORIZED_OBJECT"
     GAZE_AWAY = "GAZE_AWAY"
 
+# Compact integer codes (timeline storage / columnar payloads), in declaration order
+STATUS_NAMES = [s.value for s in StudentStatus]
+ALERT_NAMES = [a.value for a in AlertType]
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+ALERT_CODES = {name: code for code, name in enumerate(ALERT_NAMES)}
+
+def enum_value(field):
+    # use_enum_values converts assigned values only; untouched defaults stay Enum members
+    return getattr(field, "value", field)
+
 class SessionState(BaseModel):
     """
     Represents the real-time state of a student.
@@ -31,9 +42,82 @@ class SessionState(BaseModel):
     # Telemetry
     face_count: int = 1
     confusion_score: float = 0.0 # 0-100
+    # Analysis fidelity under load: 0 full, 1 reduced resolution, 2 sparse mesh, 3 face count only
+    quality_level: int = 0
     
     # Metadata
     last_updated: float = Field(default_factory=lambda: datetime.now().timestamp())
     
     class Config:
         use_enum_values = True
+
+
+class StudentRecord:
+    """
+    Internal per-frame student state (store, timers, timeline, replication).
+    Slots + integer status / alert codes: a few hundred ns to build, where a SessionState
+    costs validation and enum conversion. SessionState stays the API schema; the wire
+    format (to_dict / to_json) is identical to SessionState.dict().
+    Records are never mutated once published, so the JSON encoding is cached.
+    """
+    __slots__ = ("student_id", "session_id", "status", "alert", "face_count",
+                 "confusion_score", "last_updated", "quality_level", "_json")
+
+    def __init__(self, student_id: str, session_id: str, status: int = 0, alert: int = 0,
+                 face_count: int = 1, confusion_score: float = 0.0, last_updated: Optional[float] = None,
+                 quality_level: int = 0):
+        self.student_id = student_id
+        self.session_id = session_id
+        self.status = status                # code into STATUS_NAMES
+        self.alert = alert                  # code into ALERT_NAMES
+        self.face_count = face_count
+        self.confusion_score = confusion_score
+        self.last_updated = datetime.now().timestamp() if last_updated is None else last_updated
+        self.quality_level = quality_level
+        self._json = None
+
+    @property
+    def status_name(self) -> str:
+        return STATUS_NAMES[self.status]
+
+    @property
+    def alert_name(self) -> str:
+        return ALERT_NAMES[self.alert]
+
+    def to_dict(self) -> dict:
+        return {
+            "student_id": self.student_id,
+            "session_id": self.session_id,
+            "status": STATUS_NAMES[self.status],
+            "alert": ALERT_NAMES[self.alert],
+            "face_count": self.face_count,
+            "confusion_score": self.confusion_score,
+            "quality_level": self.quality_level,
+            "last_updated": self.last_updated,
+        }
+
+    def to_json(self) -> str:
+        if self._json is None:
+            self._json = json.dumps(self.to_dict())
+        return self._json
+
+    def to_model(self) -> SessionState:
+        return SessionState(**self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StudentRecord":
+        """
+        From the wire format (persistence log, shared backend, SessionState.dict()).
+        """
+        return cls(data["student_id"], data["session_id"],
+                   STATUS_CODES[enum_value(data.get("status", StudentStatus.FOCUSED))],
+                   ALERT_CODES[enum_value(data.get("alert", AlertType.NONE))],
+                   data.get("face_count", 1), data.get("confusion_score", 0.0), data.get("last_updated"),
+                   data.get("quality_level", 0))
+
+    @classmethod
+    def from_model(cls, state: SessionState) -> "StudentRecord":
+        return cls.from_dict(state.dict())
+
+    def __repr__(self) -> str:
+        return f"StudentRecord({self.to_dict()!r})"
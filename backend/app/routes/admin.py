@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+import hmac
+import time
+
+from app.config import ADMIN_TOKEN
+from app.utils.flight_recorder import flight_recorder, to_ndjson, to_npz
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+
+def _authorize(token: Optional[str]):
+    # No token configured: the admin endpoints stay off (CORS lets any origin call them)
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+
+@router.get("/flight-recorder")
+async def dump_flight_recorder(student_id: Optional[str] = None, session_id: Optional[str] = None,
+                               last: int = 0, format: Literal["ndjson", "npz"] = "ndjson",
+                               x_admin_token: Optional[str] = Header(None)):
+    """
+    Dump of the per-frame flight recorder (last FLIGHT_RECORDER_FRAMES frames per student),
+    oldest frame first: one student with ?student_id=, one class with ?session_id=, else all.
+    ?last=N keeps the N most recent frames per student.
+    - ndjson: one JSON object per frame, codes as names
+    - npz: one structured array per student under s/<student_id> (flight_recorder.from_npz),
+      see flight_recorder.FLIGHT_DTYPE
+    """
+    _authorize(x_admin_token)
+    # Copied here, serialized below: frames keep being recorded meanwhile
+    snapshot = flight_recorder.snapshot(student_id, session_id)
+    if last > 0:
+        snapshot = [(s, room, rows[-last:]) for s, room, rows in snapshot]
+
+    name = f"flight-{time.strftime('%Y%m%d-%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{name}"', "Cache-Control": "no-store"}
+    if format == "npz":
+        return Response(content=to_npz(snapshot), media_type="application/octet-stream", headers=headers)
+    return StreamingResponse(to_ndjson(snapshot), media_type="application/x-ndjson", headers=headers)
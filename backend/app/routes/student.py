@@ -1,20 +1,30 @@
-from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Response, WebSocket, WebSocketDisconnect, status
+from pydantic import BaseModel, ValidationError
+from typing import Literal, Optional
+import asyncio
 import logging
 
 # Services
-from app.services.frame_receiver import frame_receiver
-from app.services.cv_pipeline import cv_pipeline
-from app.services.proctoring import proctoring_engine, ProctoringAlert
-from app.services.confusion import confusion_engine
+from app.services.frame_receiver import frame_receiver, FRAME_HEADER
+from app.services.analysis_engine import analysis_engine
+from app.services.admission import admission_controller, landmark_admission, PROCESSED
+from app.services.landmark_receiver import landmark_receiver, LandmarkPacket, LandmarkPacketError
+from app.services.session_evaluator import session_evaluator
+from app.services.quality_governor import quality_governor
+from app.services.capture_profile import capture_advisor, profile_headers
 from app.state.session_store import SESSION_STORE
+from app.state.timeline_store import TIMELINE_STORE
+from app.state.persistence import persistence
+from app.state.backend import state_backend
 
 # Shared State (MVP)
 # The SESSION_STORE is now imported from app.state.session_store
 from app.services.connection_manager import manager
 
 # Models
-from app.models.session_state import SessionState, StudentStatus, AlertType
+from app.models.session_state import SessionState, StudentRecord
+from app.utils.instrumentation import STAGE_SECONDS, FRAMES
+from app.utils.flight_recorder import flight_recorder, SOURCE_FRAMES, SOURCE_LANDMARKS
 
 # Define Router
 router = APIRouter(
@@ -27,117 +37,171 @@ logger = logging.getLogger("StudentRoute")
 
 import time
 
+_EXTRACT = STAGE_SECONDS.labels("extract")
+_STORE_UPDATE = STAGE_SECONDS.labels("store_update")
+_REQUEST = STAGE_SECONDS.labels("request")
+_LANDMARKS = STAGE_SECONDS.labels("landmarks")
+
+# Open binary frame streams (exposed as a gauge at /metrics)
+active_streams = set()
+
 # Input Model
 class FramePayload(BaseModel):
     studentId: str
     sessionId: str
     frameData: str # Base64 string
 
+# Client-side face mesh output: base64 landmark packet (see landmark_receiver.LANDMARK_HEADER)
+class LandmarkPayload(BaseModel):
+    studentId: str
+    sessionId: str
+    landmarkData: str
+
+# WebSocket Handshake (first text message on /student/ws)
+class StreamHandshake(BaseModel):
+    studentId: str
+    sessionId: str
+    mode: Literal["frames", "landmarks"] = "frames"
+
+
+def _admission_headers(admission) -> dict:
+    # Lets HTTP clients throttle their capture interval
+    feedback = admission.feedback
+    return {
+        "X-Frame-Status": admission.status,
+        "X-Frames-Coalesced": str(feedback.get("coalesced", 0)),
+        "X-Frames-Dropped": str(feedback.get("dropped", 0)),
+        "X-Capture-Interval-Ms": str(feedback.get("interval_ms", 0)),
+    }
+
+
+def _publish(session_state: StudentRecord):
+    started = time.perf_counter()
+    # Update Global Store (partitioned by session_id)
+    moved_from = SESSION_STORE.put(session_state)
+    # History: transitions + periodic samples only
+    TIMELINE_STORE.record(session_state)
+    # Durable log (no-op unless PERSISTENCE_PATH is set; never does I/O here)
+    persistence.record(session_state)
+    # Other workers' teachers (no-op unless STATE_BACKEND is shared; never awaits)
+    state_backend.publish(session_state)
+
+    # Teachers get it on the next broadcast tick (never awaits teacher I/O)
+    manager.mark_dirty(session_state.session_id, session_state.student_id)
+    if moved_from is not None:
+        manager.mark_dirty(moved_from, session_state.student_id)
+    _STORE_UPDATE.observe(time.perf_counter() - started)
+
+
+def _record(student_id: str, session_id: str, seq: int, source: int, admission,
+            state: Optional[StudentRecord] = None, started: Optional[float] = None, outcome: Optional[str] = None):
+    # Flight recorder: one row in the student's fixed ring (no per-frame logging)
+    request = time.perf_counter() - started if started is not None else float("nan")
+    flight_recorder.record(student_id, session_id, seq, outcome or admission.status, source, admission.waited,
+                           admission.cv_result, state, request)
+
+
+def _state_response(state: StudentRecord, headers: dict) -> Response:
+    # Served from the record's cached encoding (SessionState stays the documented schema)
+    return Response(content=state.to_json(), media_type="application/json", headers=headers)
+
+
+async def _analyze_landmarks(packet: LandmarkPacket) -> dict:
+    # Inline on the event loop: validation already ran, the metric kernel takes microseconds
+    started = time.perf_counter()
+    result = landmark_receiver.analyze(packet)
+    _LANDMARKS.observe(time.perf_counter() - started)
+    return result
+
+
+def _forget(student_id: str):
+    # Evicted by the rule timers (no frames for ANALYZER_SESSION_TTL_SECONDS)
+    room = SESSION_STORE.room_of(student_id)
+    SESSION_STORE.remove(student_id)
+    TIMELINE_STORE.remove(student_id)
+    persistence.remove(student_id)
+    state_backend.remove(student_id)
+    quality_governor.forget(student_id)
+    capture_advisor.forget(student_id)
+    flight_recorder.forget(student_id)
+    if room is not None:
+        # The next delta tells the room's teachers the student is gone
+        manager.mark_dirty(room, student_id)
+
+
+# Timer-driven states (gaze-away / confusion maturing between frames, OFFLINE) and evictions
+session_evaluator.listeners.append(_publish)
+session_evaluator.evict_listeners.append(_forget)
+
+
 @router.post("/process-frame", response_model=SessionState)
-async def process_frame(payload: FramePayload):
+async def process_frame(payload: FramePayload, response: Response):
     """
-    Main processing loop for student frames.
+    Main processing loop for student frames (HTTP fallback path).
     1. Decode Frame
     2. Extract Landmarks (Face Count)
     3. Evaluate Proctoring Rules
     4. Evaluate Confusion Rules
     5. Return Session State
+    Frames superseded by a newer one (or dropped under load) return the latest known
+    state; X-Frame-Status / X-Capture-Interval-Ms tell the client to slow down.
+    X-Capture-Width / X-Capture-Quality / X-Capture-Interval-Ms are the capture profile
+    the client should use for its next frames (see CaptureAdvisor).
     """
     try:
-        start_time = time.time()
-        
-        # 1. Decode Frame
-        frame = frame_receiver.decode_frame(payload.frameData)
-        if frame is None:
-            # Corrupted frame, just return previous/default state but don't crash
+        start_time = time.perf_counter()
+
+        # 1. Extract encoded image bytes (cheap, stays on the event loop)
+        image_bytes = frame_receiver.extract_bytes(payload.frameData)
+        _EXTRACT.observe(time.perf_counter() - start_time)
+        if image_bytes is None:
+            FRAMES.inc("invalid")
             logger.warning(f"Frame decoding failed for {payload.studentId}")
             raise HTTPException(status_code=400, detail="Invalid frame data")
 
-        # 2. CV Pipeline (Advanced)
+        # 2. Admission -> Decode + CV Pipeline (Advanced), off the event loop on the student's worker
         try:
-            cv_result = cv_pipeline.process_frame(frame)
-            logger.info("CV Pipeline executed successfully")
+            admission = await admission_controller.submit(
+                payload.studentId,
+                lambda: analysis_engine.analyze(payload.studentId, image_bytes)
+            )
         except Exception as e:
             logger.error(f"CV Pipeline Failed: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
-        face_count = cv_result["face_count"]
-        metrics = cv_result["metrics"] # {gaze, brow, smile}
-        
-        # 3. Proctoring Check (Includes Gaze)
-        integrity_alert = proctoring_engine.evaluate(face_count, metrics.get("gaze", "CENTER"))
-        
-        # 4. Engagement Analysis (Emotion/Confusion)
-        raw_emotion = confusion_engine.calculate_state(metrics.get("brow", 0.0), metrics.get("smile", 0.0))
-        is_confused = confusion_engine.update_state(payload.studentId, raw_emotion)
-        
-        # 5. Final State Machine (Strict Priority)
-        current_status = StudentStatus.FOCUSED
-        current_alert = AlertType.NONE
-
-        # (1) DISTRACTED
-        if integrity_alert == ProctoringAlert.NO_FACE:
-            current_status = StudentStatus.DISTRACTED
-            current_alert = AlertType.NO_FACE
-        elif integrity_alert == ProctoringAlert.MULTIPLE_FACES:
-            current_status = StudentStatus.DISTRACTED
-            current_alert = AlertType.MULTIPLE_FACES
-        
-        # (1.5) GAZE AWAY
-        elif integrity_alert == ProctoringAlert.GAZE_AWAY:
-            current_status = StudentStatus.DISTRACTED
-            current_alert = AlertType.GAZE_AWAY
-        
-        # (2) CONFUSED (Sustained)
-        elif is_confused:
-             current_status = StudentStatus.CONFUSED
-        
-        # (3) HAPPY / FOCUSED
-        elif raw_emotion == "HAPPY":
-             # Optional: Could have a HAPPY status, or just map to FOCUSED with high engagement
-             current_status = StudentStatus.FOCUSED 
-        else:
-             current_status = StudentStatus.FOCUSED
-
-        # Define numeric score for dashboard compatibility
-        confusion_score = 70.0 if is_confused else 0.0
-
-        # Create Response Object
-        session_state = SessionState(
-            student_id=payload.studentId,
-            session_id=payload.sessionId,
-            status=current_status,
-            alert=current_alert,
-            face_count=face_count,
-            confusion_score=confusion_score
-        )
-        
-        # Processing Time
-        processing_time = (time.time() - start_time) * 1000
-        
-        # detailed debug logging
-        logger.info(f"Student {payload.studentId} | Gaze: {metrics.get('gaze')} | Brow: {metrics.get('brow'):.2f} | Smile: {metrics.get('smile'):.2f} | Confused: {is_confused} | Status: {current_status.value} | Alert: {current_alert.value}")
-        
-        # User Feedback Hint
-        bs = metrics.get('brow', 0.0)
-        ss = metrics.get('smile', 0.0)
-        if bs > 0.15 and bs < 0.35:
-            logger.warning(f"⚠️  ALMOST CONFUSED! Frown Harder! (Current: {bs:.2f}, Needed: >0.35)")
-        if bs > 0.4 and ss > 0.3:
-            logger.warning(f"⚠️  SMILE DETECTED! Stop Smiling to trigger Confusion. (Smile: {ss:.2f})")
-        
-        
-        # Update Global Store
-        SESSION_STORE[payload.studentId] = session_state
-        
-        # Broadcast via WebSocket (Hybrid Approach)
-        try:
-            # Pydantic .dict() uses configured use_enum_values=True
-            await manager.broadcast([s.dict() for s in SESSION_STORE.values()])
-        except Exception as e:
-            logger.warning(f"WS Broadcast failed: {e}")
+        headers = _admission_headers(admission)
+        response.headers.update(headers)
+
+        if admission.status != PROCESSED:
+            _record(payload.studentId, payload.sessionId, 0, SOURCE_FRAMES, admission)
+            headers.update(profile_headers(capture_advisor.advise(payload.studentId, admission.feedback)))
+            previous = SESSION_STORE.get(payload.studentId)
+            if previous is None:
+                raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                    detail=f"Frame {admission.status.lower()}", headers=headers)
+            return _state_response(previous, headers)
 
-        return session_state
+        cv_result = admission.cv_result
+
+        if cv_result is None:
+            # Corrupted frame, just return previous/default state but don't crash
+            _record(payload.studentId, payload.sessionId, 0, SOURCE_FRAMES, admission, outcome="INVALID")
+            FRAMES.inc("invalid")
+            logger.warning(f"Frame decoding failed for {payload.studentId}")
+            raise HTTPException(status_code=400, detail="Invalid frame data")
+
+        # 3-5. Rules + State Machine
+        session_state = session_evaluator.evaluate(payload.studentId, payload.sessionId, cv_result)
+
+        _publish(session_state)
+        headers.update(profile_headers(
+            capture_advisor.advise(payload.studentId, admission.feedback, session_state, cv_result)))
+
+        # Processing Time (request received -> state published)
+        _REQUEST.observe(time.perf_counter() - start_time)
+        _record(payload.studentId, payload.sessionId, 0, SOURCE_FRAMES, admission, session_state, start_time)
+
+        return _state_response(session_state, headers)
 
     except HTTPException:
         raise
@@ -147,3 +211,149 @@ async def process_frame(payload: FramePayload):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal processing error"
         )
+
+
+@router.post("/process-landmarks", response_model=SessionState)
+async def process_landmarks(payload: LandmarkPayload):
+    """
+    HTTP path for students running the face mesh in the browser: one landmark packet
+    (base64) instead of a frame. Only the metric kernel and the rules run on the server.
+    """
+    start_time = time.perf_counter()
+    packet_bytes = frame_receiver.extract_bytes(payload.landmarkData)
+    try:
+        if packet_bytes is None:
+            raise LandmarkPacketError("Invalid base64 payload")
+        packet = landmark_receiver.parse(packet_bytes)
+    except LandmarkPacketError as e:
+        FRAMES.inc("invalid")
+        logger.warning(f"Landmark packet rejected for {payload.studentId}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    admission = await landmark_admission.submit(payload.studentId, lambda: _analyze_landmarks(packet))
+    headers = _admission_headers(admission)
+    if admission.status != PROCESSED:
+        _record(payload.studentId, payload.sessionId, packet.seq, SOURCE_LANDMARKS, admission)
+        headers.update(profile_headers(capture_advisor.advise(payload.studentId, admission.feedback, frames=False)))
+        previous = SESSION_STORE.get(payload.studentId)
+        if previous is None:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail=f"Packet {admission.status.lower()}", headers=headers)
+        return _state_response(previous, headers)
+
+    session_state = session_evaluator.evaluate(payload.studentId, payload.sessionId, admission.cv_result)
+    _publish(session_state)
+    headers.update(profile_headers(capture_advisor.advise(
+        payload.studentId, admission.feedback, session_state, admission.cv_result, frames=False)))
+    _REQUEST.observe(time.perf_counter() - start_time)
+    _record(payload.studentId, payload.sessionId, packet.seq, SOURCE_LANDMARKS, admission, session_state, start_time)
+    return _state_response(session_state, headers)
+
+
+@router.websocket("/ws")
+async def frame_stream(websocket: WebSocket):
+    """
+    Persistent binary ingestion channel (primary path).
+    1. Client sends one text handshake: {"studentId": ..., "sessionId": ..., "mode": "frames" | "landmarks"}
+    2. Client then sends binary packets:
+       - frames (default): FRAME_HEADER (seq, timestamp) + JPEG/WebP bytes
+       - landmarks: LANDMARK_HEADER (seq, timestamp, faces, version, count) + float16 landmarks,
+         from a face mesh running in the browser (no server-side CV)
+    3. Server replies per packet with {"type": "STATE" | "COALESCED" | "DROPPED" | "ERROR", "seq": ..., "admission": {...},
+       "capture": {"width", "quality", "interval_ms"}}: the capture profile for the next frames
+       (only "interval_ms" in landmarks mode)
+    Packets are read continuously so a newer frame can replace one still waiting for analysis.
+    """
+    await websocket.accept()
+
+    try:
+        handshake = StreamHandshake.parse_raw(await websocket.receive_text())
+    except (ValidationError, ValueError) as e:
+        logger.warning(f"Invalid frame stream handshake: {e}")
+        await websocket.close(code=1008)
+        return
+    except WebSocketDisconnect:
+        return
+
+    student_id, session_id = handshake.studentId, handshake.sessionId
+    landmarks = handshake.mode == "landmarks"
+    source = SOURCE_LANDMARKS if landmarks else SOURCE_FRAMES
+    logger.info(f"Frame stream opened for {student_id} ({session_id}, {handshake.mode})")
+    active_streams.add(websocket)
+
+    send_lock = asyncio.Lock()
+    inflight = set()
+
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def handle(admit, job, seq: int, timestamp: float):
+        started = time.perf_counter()
+        try:
+            admission = await admit.submit(student_id, job)
+            if admission.status != PROCESSED:
+                _record(student_id, session_id, seq, source, admission)
+                capture = capture_advisor.advise(student_id, admission.feedback, frames=not landmarks)
+                await send({"type": admission.status, "seq": seq, "admission": admission.feedback, "capture": capture})
+                return
+
+            if admission.cv_result is None:
+                _record(student_id, session_id, seq, source, admission, outcome="INVALID")
+                FRAMES.inc("invalid")
+                await send({"type": "ERROR", "seq": seq, "detail": "Invalid frame data"})
+                return
+
+            session_state = session_evaluator.evaluate(student_id, session_id, admission.cv_result)
+            _publish(session_state)
+            _REQUEST.observe(time.perf_counter() - started)
+            _record(student_id, session_id, seq, source, admission, session_state, started)
+
+            capture = capture_advisor.advise(student_id, admission.feedback, session_state, admission.cv_result,
+                                             frames=not landmarks)
+            await send({"type": "STATE", "seq": seq, "timestamp": timestamp,
+                        "state": session_state.to_dict(), "admission": admission.feedback, "capture": capture})
+        except Exception as e:
+            logger.error(f"CV Pipeline Failed: {e}")
+            try:
+                await send({"type": "ERROR", "seq": seq, "detail": "Internal processing error"})
+            except Exception:
+                pass
+
+    try:
+        while True:
+            packet = await websocket.receive_bytes()
+
+            if landmarks:
+                try:
+                    parsed = landmark_receiver.parse(packet)
+                except LandmarkPacketError as e:
+                    FRAMES.inc("invalid")
+                    await send({"type": "ERROR", "detail": str(e)})
+                    continue
+                seq, timestamp = parsed.seq, parsed.timestamp
+                admit, job = landmark_admission, (lambda parsed=parsed: _analyze_landmarks(parsed))
+            else:
+                header = frame_receiver.parse_header(packet)
+                if header is None:
+                    FRAMES.inc("invalid")
+                    await send({"type": "ERROR", "detail": "Invalid frame packet"})
+                    continue
+                seq, timestamp = header
+                # Decode straight from the received packet, skipping the header in place
+                admit = admission_controller
+                job = lambda packet=packet: analysis_engine.analyze(student_id, packet, FRAME_HEADER.size)
+
+            # At most one running + one waiting frame per student; older ones resolve as COALESCED
+            task = asyncio.create_task(handle(admit, job, seq, timestamp))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+
+    except WebSocketDisconnect:
+        logger.info(f"Frame stream closed for {student_id}")
+    except Exception as e:
+        logger.error(f"Frame stream error for {student_id}: {e}")
+    finally:
+        active_streams.discard(websocket)
+        for task in inflight:
+            task.cancel()
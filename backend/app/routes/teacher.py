@@ -1,8 +1,12 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List
-from app.models.session_state import SessionState
+from fastapi import APIRouter, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from typing import List, Optional
+from app.config import LONG_POLL_MAX_SECONDS
+from app.models.session_state import SessionState, STATUS_NAMES, ALERT_NAMES
+from app.state.class_summary import SUMMARY_STORE
 from app.state.session_store import SESSION_STORE
+from app.state.timeline_store import TIMELINE_STORE
 from app.services.connection_manager import manager
+import json
 import logging
 
 logger = logging.getLogger("TeacherRoute")
@@ -12,17 +16,110 @@ router = APIRouter(
     tags=["Teacher"]
 )
 
+def _etag(version: int) -> str:
+    # The epoch keeps ETags from another process (restart, other worker) from matching
+    return f'"{SESSION_STORE.epoch}-{version}"'
+
+
+def _version(session_id: Optional[str]) -> int:
+    return SESSION_STORE.version if session_id is None else SESSION_STORE.room_version(session_id)
+
+
 @router.get("/sessions", response_model=List[SessionState])
-async def get_all_sessions():
-    return list(SESSION_STORE.values())
+async def get_all_sessions(request: Request, session_id: Optional[str] = None, since_version: Optional[int] = None,
+                           epoch: Optional[str] = None, wait: float = 0.0):
+    """
+    Latest state of every student, or only one class with ?session_id=.
+    Served from the store's pre-encoded snapshot (rebuilt only after a change).
+    - ETag / If-None-Match: 304 while nothing changed
+    - ?since_version=N&epoch=E: only what changed since version N, as
+      {"epoch", "version", "full", "students", "removed"}; full=true (other epoch or N too
+      old) means `students` is the whole list
+    - ?wait=S: long-poll, held up to S seconds (max LONG_POLL_MAX_SECONDS) for the next
+      change instead of answering 304 at once
+    """
+    version = _version(session_id)
+    if since_version is not None:
+        if epoch is not None and epoch != SESSION_STORE.epoch:
+            since_version = -1
+        unchanged = since_version == version
+    else:
+        unchanged = _etag(version) in {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+
+    wait = min(max(wait, 0.0), LONG_POLL_MAX_SECONDS)
+    if unchanged and wait > 0 and await manager.wait_for_change(session_id, version, wait):
+        version, unchanged = _version(session_id), False
+
+    headers = {"ETag": _etag(version), "Cache-Control": "no-cache"}
+    if unchanged:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if since_version is None:
+        version, body = SESSION_STORE.snapshot(session_id)
+    else:
+        version, full, students, removed = SESSION_STORE.changes(since_version, session_id)
+        body = '{"epoch": %s, "version": %d, "full": %s, "students": %s, "removed": %s}' % (
+            json.dumps(SESSION_STORE.epoch), version, json.dumps(full), students, json.dumps(removed))
+    headers["ETag"] = _etag(version)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/sessions/{session_id}/timeline")
+async def get_session_timeline(session_id: str, since: float = 0.0):
+    """
+    History of one class since a timestamp (exclusive), as columns per student.
+    status / alert are integer codes into status_names / alert_names.
+    Poll incrementally by passing the last returned `t` as ?since=.
+    """
+    return {
+        "session_id": session_id,
+        "status_names": STATUS_NAMES,
+        "alert_names": ALERT_NAMES,
+        "students": TIMELINE_STORE.query(session_id, since),
+    }
+
+@router.get("/sessions/{session_id}/summary")
+async def get_session_summary(session_id: str):
+    """
+    Class-level aggregates, maintained on every status / alert transition:
+    - students, status (percent per status now), counts, alerts (students with each alert now)
+    - windows: {"1m" | "5m" | "15m": {"status": percent of student-time per status,
+      "alerts": alert onsets}}, to SUMMARY_BUCKET_SECONDS resolution
+    """
+    body = SUMMARY_STORE.to_json(session_id, empty=True)
+    return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-cache"})
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, session_id: Optional[List[str]] = Query(None),
+                             summary_only: bool = False):
+    """
+    Teacher updates. Follows every session unless subscribed:
+    - connect with /teacher/ws?session_id=A&session_id=B, or
+    - send {"action": "subscribe" | "unsubscribe", "session_ids": [...]}
+      (subscribe with no session_ids follows every session again; unsubscribing from the
+      last room follows none)
+    Followed rooms' class summaries are pushed too; ?summary_only=true sends only those
+    (no per-student snapshot / deltas, for large classes).
+    """
+    await manager.connect(websocket, session_id, summary_only)
     try:
         while True:
-            # Keep alive
-            await websocket.receive_text()
+            # Keep alive + subscription control messages
+            message = await websocket.receive_text()
+            try:
+                command = json.loads(message)
+            except ValueError:
+                continue
+            if not isinstance(command, dict):
+                continue
+
+            session_ids = command.get("session_ids") or []
+            if not isinstance(session_ids, list) or not all(isinstance(s, str) for s in session_ids):
+                logger.warning("Ignoring teacher command with malformed session_ids")
+                continue
+            if command.get("action") == "subscribe":
+                manager.subscribe(websocket, session_ids)
+            elif command.get("action") == "unsubscribe":
+                manager.unsubscribe(websocket, session_ids)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
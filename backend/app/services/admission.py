@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.config import (
+    MAX_STUDENT_FPS, ANALYSIS_MAX_CONCURRENCY, MAX_FRAME_AGE_MS, ANALYZER_SESSION_TTL_SECONDS, LANDMARK_MAX_FPS,
+)
+from app.services.analysis_engine import EngineOverloaded
+from app.services.quality_governor import QualityGovernor, quality_governor
+from app.utils.instrumentation import FRAMES
+
+logger = logging.getLogger("AdmissionControl")
+
+# Frame outcomes reported back to the client
+PROCESSED = "PROCESSED"
+COALESCED = "COALESCED"   # replaced by a newer frame before analysis
+DROPPED = "DROPPED"       # too old or analysis queue full
+
+# Backoff multiplier bounds for the suggested capture interval
+MAX_BACKOFF = 8.0
+
+
+def _resolve(waiter: asyncio.Future, result):
+    # The caller may have gone away (client disconnect cancels the await)
+    if not waiter.done():
+        waiter.set_result(result)
+
+
+class AdmissionResult:
+    __slots__ = ("status", "cv_result", "feedback", "waited")
+
+    def __init__(self, status: str, cv_result: Optional[dict] = None, feedback: Optional[dict] = None,
+                 waited: float = 0.0):
+        self.status = status
+        self.cv_result = cv_result
+        self.feedback = feedback or {}
+        # Seconds from submit to analysis start (or to being coalesced / dropped)
+        self.waited = waited
+
+
+class _Mailbox:
+    """
+    One-slot mailbox for a single student.
+    Holds at most one frame waiting for analysis; a newer frame replaces it.
+    """
+    __slots__ = ("student_id", "job", "waiter", "enqueued_at", "busy", "next_allowed",
+                 "processed", "coalesced", "dropped", "backoff", "last_seen")
+
+    def __init__(self, student_id: str):
+        self.student_id = student_id
+        self.job = None
+        self.waiter: Optional[asyncio.Future] = None
+        self.enqueued_at = 0.0
+        self.busy = False
+        self.next_allowed = 0.0
+        self.processed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.backoff = 1.0
+        self.last_seen = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Latest-frame-wins admission in front of the CV pipeline.
+    - Per student: one-slot mailbox + max analysis rate (MAX_STUDENT_FPS)
+    - Global: semaphore capping concurrent analyses (ANALYSIS_MAX_CONCURRENCY)
+    - Frames that waited longer than MAX_FRAME_AGE_MS are dropped, so latency stays bounded
+    - Each frame's latency (admission or the end of its rate-limit wait -> result or drop) and the
+      backlog go to the quality governor
+    """
+    def __init__(self, max_fps: float = MAX_STUDENT_FPS, max_concurrency: int = ANALYSIS_MAX_CONCURRENCY,
+                 max_frame_age_ms: float = MAX_FRAME_AGE_MS, ttl_seconds: float = ANALYZER_SESSION_TTL_SECONDS,
+                 governor: Optional[QualityGovernor] = None):
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_frame_age = max_frame_age_ms / 1000.0
+        self.ttl_seconds = ttl_seconds
+        self.governor = governor
+        self._mailboxes: Dict[str, _Mailbox] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Drains waiting for an analysis slot
+        self._waiting = 0
+        self._last_sweep = time.monotonic()
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def submit(self, student_id: str, job: Callable[[], Awaitable[dict]]) -> AdmissionResult:
+        """
+        Offers one frame for analysis. `job` runs the actual decode + CV work.
+        Resolves immediately with COALESCED if a newer frame replaces this one.
+        """
+        now = time.monotonic()
+        self._sweep(now)
+
+        mailbox = self._mailboxes.get(student_id)
+        if mailbox is None:
+            mailbox = self._mailboxes[student_id] = _Mailbox(student_id)
+        mailbox.last_seen = now
+
+        # Latest frame wins: release the older waiter right away
+        if mailbox.waiter is not None:
+            mailbox.coalesced += 1
+            FRAMES.inc("coalesced")
+            mailbox.backoff = min(MAX_BACKOFF, mailbox.backoff * 2)
+            _resolve(mailbox.waiter, AdmissionResult(COALESCED, feedback=self._feedback(mailbox),
+                                                     waited=now - mailbox.enqueued_at))
+
+        waiter = asyncio.get_running_loop().create_future()
+        mailbox.job, mailbox.waiter, mailbox.enqueued_at = job, waiter, now
+
+        if not mailbox.busy:
+            mailbox.busy = True
+            asyncio.create_task(self._drain(mailbox))
+
+        return await waiter
+
+    async def _drain(self, mailbox: _Mailbox):
+        try:
+            while mailbox.waiter is not None:
+                # 1. Per-student rate limit (newer frames may replace the slot meanwhile)
+                delay = mailbox.next_allowed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                # 2. Global concurrency cap
+                self._waiting += 1
+                try:
+                    await self.semaphore.acquire()
+                finally:
+                    self._waiting -= 1
+                try:
+                    job, waiter, enqueued_at = mailbox.job, mailbox.waiter, mailbox.enqueued_at
+                    mailbox.job, mailbox.waiter = None, None
+                    if waiter is None or waiter.done():
+                        continue
+
+                    started = time.monotonic()
+                    # The rate-limit wait is the student's own pacing, not load: the governor's latency starts after it
+                    ready_at = max(enqueued_at, mailbox.next_allowed)
+                    if started - enqueued_at > self.max_frame_age:
+                        self._drop(mailbox, waiter, enqueued_at, ready_at)
+                        continue
+
+                    mailbox.next_allowed = started + self.min_interval
+                    try:
+                        cv_result = await job()
+                    except EngineOverloaded:
+                        self._drop(mailbox, waiter, enqueued_at, ready_at)
+                        continue
+                    except Exception as e:
+                        FRAMES.inc("failed")
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                        continue
+                finally:
+                    self.semaphore.release()
+
+                self._observe(mailbox, ready_at)
+                mailbox.processed += 1
+                FRAMES.inc("processed")
+                mailbox.backoff = max(1.0, mailbox.backoff / 2)
+                _resolve(waiter, AdmissionResult(PROCESSED, cv_result, self._feedback(mailbox), started - enqueued_at))
+        finally:
+            mailbox.busy = False
+
+    def _observe(self, mailbox: _Mailbox, ready_at: float):
+        if self.governor is not None:
+            self.governor.observe(mailbox.student_id, time.monotonic() - ready_at,
+                                  self._waiting / self.max_concurrency)
+
+    def _drop(self, mailbox: _Mailbox, waiter: asyncio.Future, enqueued_at: float, ready_at: float):
+        self._observe(mailbox, ready_at)
+        mailbox.dropped += 1
+        FRAMES.inc("dropped")
+        mailbox.backoff = min(MAX_BACKOFF, mailbox.backoff * 2)
+        _resolve(waiter, AdmissionResult(DROPPED, feedback=self._feedback(mailbox),
+                                         waited=time.monotonic() - enqueued_at))
+
+    def _feedback(self, mailbox: _Mailbox) -> dict:
+        # Counters + suggested capture interval so the client can throttle itself
+        return {
+            "processed": mailbox.processed,
+            "coalesced": mailbox.coalesced,
+            "dropped": mailbox.dropped,
+            "interval_ms": round(self.min_interval * 1000 * mailbox.backoff),
+        }
+
+    def __len__(self) -> int:
+        return len(self._mailboxes)
+
+    def _sweep(self, now: float):
+        # Amortized idle eviction (at most once per quarter TTL)
+        if now - self._last_sweep < self.ttl_seconds / 4:
+            return
+        self._last_sweep = now
+        idle = [s for s, m in self._mailboxes.items() if not m.busy and now - m.last_seen > self.ttl_seconds]
+        for student_id in idle:
+            del self._mailboxes[student_id]
+
+
+# Global Instance
+admission_controller = AdmissionController(governor=quality_governor)
+
+# Client-side landmark packets: same latest-wins mailbox and rate cap, no worker behind it
+landmark_admission = AdmissionController(max_fps=LANDMARK_MAX_FPS, max_concurrency=1024)
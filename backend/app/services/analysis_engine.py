@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
+
+from app.config import ANALYSIS_WORKERS, ANALYSIS_QUEUE_SIZE, ANALYSIS_WARM_UP
+from app.services.quality_governor import QualityGovernor, quality_governor, QUALITY_FULL
+from app.utils.instrumentation import STAGE_SECONDS, FALLBACK_FRAMES, STATIC_FRAMES
+
+logger = logging.getLogger("AnalysisEngine")
+
+
+# Submit -> result on the API side (worker queue + IPC + decode + cv)
+_ANALYSIS = STAGE_SECONDS.labels("analysis")
+
+
+class EngineOverloaded(Exception):
+    """Raised when the bounded analysis queue is full."""
+
+
+# --- WORKER SIDE ---
+# These functions run inside the worker processes (or the inline thread).
+# Each worker creates its own CVPipeline instance on first use (or on warm-up).
+
+def _warm_up() -> dict:
+    """
+    Loads the models and runs the whole decode + pipeline path once on the synthetic frame.
+    """
+    import cv2
+    from app.services.frame_receiver import frame_receiver
+    from app.services.cv_pipeline import get_cv_pipeline, synthetic_frame
+
+    started = time.perf_counter()
+    cv_pipeline = get_cv_pipeline()
+    loaded = time.perf_counter()
+    _, jpeg = cv2.imencode(".jpg", synthetic_frame())
+    cv_pipeline.warm_up(frame_receiver.decode_bytes(jpeg.tobytes()))
+    return {"load": loaded - started, "warm_up": time.perf_counter() - loaded, "fallback": cv_pipeline.use_fallback}
+
+
+def _analyze(student_id: str, image_bytes: bytes, offset: int = 0, quality: int = QUALITY_FULL) -> Optional[dict]:
+    """
+    Decode + analyze one encoded frame (`offset` skips a binary packet header) at the
+    given quality level (see quality_governor).
+    Returns the CV result (without the raw landmark protobuf) or None if decoding failed.
+    """
+    from app.services.frame_receiver import frame_receiver
+    from app.services.cv_pipeline import get_cv_pipeline
+
+    cv_pipeline = get_cv_pipeline()
+    # Decode at reduced resolution when the student's last face was large enough
+    started = time.perf_counter()
+    reduction = cv_pipeline.decode_reduction(student_id, quality)
+    frame = frame_receiver.decode_bytes(image_bytes, offset, reduction)
+    if frame is None:
+        return None
+    decoded = time.perf_counter()
+
+    result = cv_pipeline.process_frame(frame, student_id, reduction, quality)
+    # Landmarks are not needed by the rules, keep the IPC payload small.
+    result["landmarks"] = None
+    # Stage timings measured inside the worker (seconds), next to the pipeline's own steps
+    result["timings"].update(decode=decoded - started, cv=time.perf_counter() - decoded)
+    return result
+
+
+class AnalysisEngine:
+    """
+    Executor-backed CV analysis.
+    Keeps one single-process pool per worker so every student is pinned to the
+    same worker, and therefore to the same AnalyzerSession (tracking FaceMesh), for
+    the whole session.
+    Each frame runs at the quality level the governor picked for its student (the
+    admission controller feeds the governor).
+    """
+    def __init__(self, workers: int = ANALYSIS_WORKERS, queue_size: int = ANALYSIS_QUEUE_SIZE,
+                 warm_up_on_start: bool = ANALYSIS_WARM_UP, governor: QualityGovernor = quality_governor):
+        self.workers = max(0, workers)
+        self.queue_size = max(1, queue_size)
+        self.warm_up_on_start = warm_up_on_start
+        self.governor = governor
+        self._executors: List = []
+        self._pending = 0
+        self._warmed = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._executors)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def ready(self) -> bool:
+        """
+        True once every worker has loaded and warmed its models (or right after start
+        when warm-up is disabled).
+        """
+        return self.running and (self._warmed or not self.warm_up_on_start)
+
+    def start(self):
+        if self.running:
+            return
+
+        if self.workers == 0:
+            # Dev mode: MediaPipe graphs are not thread-safe, so a single thread owns them.
+            self._executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix="cv-inline")]
+        else:
+            # 'spawn' avoids inheriting MediaPipe/OpenCV thread state through fork().
+            ctx = multiprocessing.get_context("spawn")
+            self._executors = [
+                ProcessPoolExecutor(max_workers=1, mp_context=ctx)
+                for _ in range(self.workers)
+            ]
+        logger.info(f"Analysis engine started with {len(self._executors)} worker(s)")
+
+    async def warm_up(self):
+        """
+        Spawns every worker and warms it in parallel. Frames arriving meanwhile queue
+        behind the warm-up on their worker.
+        """
+        if not self.running:
+            self.start()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            stats = await asyncio.gather(*(loop.run_in_executor(e, _warm_up) for e in self._executors))
+        except Exception as e:
+            logger.error(f"Analysis warm-up failed: {e}")
+            return
+        self._warmed = True
+        slowest = max(stats, key=lambda s: s["load"] + s["warm_up"])
+        logger.info(f"Analysis workers ready in {time.perf_counter() - started:.2f}s "
+                    f"(model load {slowest['load']:.2f}s, warm-up {slowest['warm_up']:.2f}s"
+                    f"{', OpenCV fallback' if slowest['fallback'] else ''})")
+
+    def shutdown(self):
+        executors, self._executors = self._executors, []
+        self._warmed = False
+        for executor in executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if executors:
+            logger.info("Analysis engine stopped")
+
+    def worker_for(self, student_id: str) -> int:
+        # Stable hash (Python's hash() is randomized per process).
+        return zlib.crc32(student_id.encode("utf-8")) % len(self._executors)
+
+    async def analyze(self, student_id: str, image_bytes: bytes, offset: int = 0) -> Optional[dict]:
+        """
+        Runs decode + CV pipeline for one frame on the student's worker.
+        Raises EngineOverloaded when the queue is full.
+        """
+        if not self.running:
+            self.start()
+
+        if self._pending >= self.queue_size:
+            raise EngineOverloaded(f"Analysis queue full ({self._pending}/{self.queue_size})")
+
+        executor = self._executors[self.worker_for(student_id)]
+        loop = asyncio.get_running_loop()
+        quality = self.governor.level(student_id)
+
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(executor, _analyze, student_id, image_bytes, offset, quality)
+        finally:
+            self._pending -= 1
+
+        # Worker timings come back with the result; record them in this (API) process
+        elapsed = time.perf_counter() - started
+        _ANALYSIS.observe(elapsed)
+        if result is not None:
+            for stage, seconds in result.get("timings", {}).items():
+                STAGE_SECONDS.labels(stage).observe(seconds)
+            # Round trip (worker queue + IPC + decode + CV), for the flight recorder
+            result["timings"]["analysis"] = elapsed
+            if result.get("fallback"):
+                FALLBACK_FRAMES.inc()
+            if result.get("static"):
+                STATIC_FRAMES.inc()
+        return result
+
+
+# Global Instance
+analysis_engine = AnalysisEngine()
@@ -0,0 +1,123 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from app.config import ANALYZER_SESSION_TTL_SECONDS, ANALYZER_MAX_SESSIONS
+
+logger = logging.getLogger("AnalyzerSession")
+
+
+class AnalyzerSession:
+    """
+    Per-student CV state.
+    Owns a dedicated FaceMesh graph (video/tracking mode) so MediaPipe can follow
+    the same face from frame to frame instead of re-detecting it every call.
+    """
+    __slots__ = ("student_id", "face_mesh", "locked", "frames_since_detection", "scene", "last_roi",
+                 "crop_box", "crop_size", "face_px", "last_seen",
+                 "thumbnail", "thumbnail_key", "last_result", "static_frames", "mesh_metrics", "sparse_frames")
+
+    def __init__(self, student_id: str, face_mesh):
+        self.student_id = student_id
+        self.face_mesh = face_mesh
+        # True once detection + mesh agreed on a single confident face
+        self.locked = False
+        self.frames_since_detection = 0
+        # Frame thumbnail cells at the last detection (scene-change check while tracking)
+        self.scene = None
+        # Last face bounding box in normalized coords (x, y, w, h)
+        self.last_roi: Optional[Tuple[float, float, float, float]] = None
+        # Stable mesh crop in pixels (x0, y0, x1, y1) for frames of size crop_size (w, h)
+        self.crop_box: Optional[Tuple[int, int, int, int]] = None
+        self.crop_size: Optional[Tuple[int, int]] = None
+        # Last face width in full-resolution pixels (drives reduced decoding)
+        self.face_px: Optional[float] = None
+        self.last_seen = time.monotonic()
+        # Static-frame detection: thumbnail of the last analyzed frame, the (w, h, face box)
+        # it was taken with, that frame's result and the frames reused from it since
+        self.thumbnail = None
+        self.thumbnail_key = None
+        self.last_result: Optional[dict] = None
+        self.static_frames = 0
+        # Sparse mesh (QUALITY_SPARSE): metrics of the last mesh frame, face-count frames since
+        self.mesh_metrics: Optional[dict] = None
+        self.sparse_frames = 0
+
+    def lock(self):
+        self.locked = True
+
+    def unlock(self):
+        self.locked = False
+        self.last_roi = None
+        self.crop_box = None
+        self.face_px = None
+
+    def close(self):
+        if self.face_mesh is not None:
+            try:
+                self.face_mesh.close()
+            except Exception as e:
+                logger.warning(f"FaceMesh close failed for {self.student_id}: {e}")
+            self.face_mesh = None
+
+
+class AnalyzerSessionRegistry:
+    """
+    studentId -> AnalyzerSession, with idle TTL and an LRU size cap.
+    Lives inside each analysis worker (students are pinned to one worker).
+    """
+    def __init__(self, mesh_factory: Callable, ttl_seconds: float = ANALYZER_SESSION_TTL_SECONDS,
+                 max_sessions: int = ANALYZER_MAX_SESSIONS):
+        self.mesh_factory = mesh_factory
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: "OrderedDict[str, AnalyzerSession]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, student_id: str) -> AnalyzerSession:
+        now = time.monotonic()
+        self._sweep(now)
+
+        session = self._sessions.get(student_id)
+        if session is None:
+            session = AnalyzerSession(student_id, self.mesh_factory())
+            self._sessions[student_id] = session
+            # LRU cap: drop the least recently seen student
+            while len(self._sessions) > self.max_sessions:
+                _, oldest = self._sessions.popitem(last=False)
+                oldest.close()
+        else:
+            self._sessions.move_to_end(student_id)
+
+        session.last_seen = now
+        return session
+
+    def peek(self, student_id: str) -> Optional[AnalyzerSession]:
+        """
+        Looks up a session without creating it or refreshing its TTL.
+        """
+        return self._sessions.get(student_id)
+
+    def evict(self, student_id: str):
+        session = self._sessions.pop(student_id, None)
+        if session:
+            session.close()
+
+    def _sweep(self, now: float):
+        # Amortized: at most one pass per quarter TTL. Sessions are in LRU order,
+        # so the scan stops at the first session that is still fresh.
+        if now - self._last_sweep < self.ttl_seconds / 4:
+            return
+        self._last_sweep = now
+
+        while self._sessions:
+            student_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            session.close()
+            logger.info(f"Evicted idle analyzer session {student_id}")
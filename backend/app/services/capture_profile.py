@@ -0,0 +1,132 @@
+import math
+import time
+from typing import Callable, Dict, Optional
+
+from app.config import (
+    CAPTURE_PROFILE_ENABLED, CAPTURE_INTERVAL_MS, CAPTURE_STABLE_INTERVAL_MS, CAPTURE_MAX_INTERVAL_MS,
+    CAPTURE_STABLE_SECONDS, CAPTURE_MIN_WIDTH, CAPTURE_MAX_WIDTH, CAPTURE_JPEG_QUALITY,
+    CAPTURE_STABLE_JPEG_QUALITY, MIN_FACE_PIXELS,
+)
+from app.models.session_state import StudentRecord, StudentStatus, AlertType, STATUS_CODES, ALERT_CODES
+from app.services.quality_governor import QualityGovernor, quality_governor, QUALITY_REDUCED, QUALITY_SPARSE
+
+_FOCUSED = STATUS_CODES[StudentStatus.FOCUSED.value]
+_NO_ALERT = ALERT_CODES[AlertType.NONE.value]
+
+# Requested widths are multiples of this (fewer distinct canvas sizes on the client)
+_WIDTH_STEP = 80
+# The face should be this much wider than MIN_FACE_PIXELS (head movement between frames)
+_FACE_MARGIN = 1.25
+# Smoothing of the face width (weight of the newest frame)
+_ALPHA = 0.2
+
+
+class _Student:
+    __slots__ = ("face", "key", "stable_since")
+
+    def __init__(self, now: float):
+        self.face: Optional[float] = None   # face width / frame width, smoothed
+        self.key = None                     # (status, alert) of the last state
+        self.stable_since = now
+
+
+class CaptureAdvisor:
+    """
+    Server-side capture profile per student: the frame width, JPEG quality and capture
+    interval the browser should use next, so ingest bandwidth and decode CPU follow what
+    the analysis needs instead of whatever the client defaults to.
+    - width: just enough for the face to stay MIN_FACE_PIXELS wide (halved when the
+      governor decodes at reduced resolution anyway); the largest width while no single
+      face is seen (detection needs it)
+    - interval: CAPTURE_STABLE_INTERVAL_MS once the student has been FOCUSED without an
+      alert for CAPTURE_STABLE_SECONDS, CAPTURE_INTERVAL_MS on any other state; never
+      faster than the admission backoff, slower at low governor levels
+    - quality: lower JPEG quality while stable or under load
+    Clients never upscale (width is capped by the camera). Landmark streams only get an
+    interval (no image is sent).
+    """
+    def __init__(self, governor: Optional[QualityGovernor] = quality_governor,
+                 enabled: bool = CAPTURE_PROFILE_ENABLED, clock: Callable[[], float] = time.monotonic):
+        self.governor = governor
+        self.enabled = enabled
+        self.clock = clock
+        self._students: Dict[str, _Student] = {}
+
+    def advise(self, student_id: str, feedback: dict, state: Optional[StudentRecord] = None,
+               cv_result: Optional[dict] = None, frames: bool = True) -> dict:
+        """
+        Profile for the student's next capture: {"width", "quality", "interval_ms"}
+        (only "interval_ms" for landmark streams). `feedback` is the admission feedback
+        of the current packet; `state` / `cv_result` are given when it was analyzed.
+        """
+        backoff = feedback.get("interval_ms", 0)
+        if not self.enabled:
+            return {"interval_ms": backoff}
+        now = self.clock()
+        student = self._students.get(student_id)
+        if student is None:
+            student = _Student(now)
+            # Kept only for students the evaluator tracks (its eviction calls forget): a rejected
+            # or dropped packet from an unknown student gets the default profile, no entry
+            if state is not None:
+                self._students[student_id] = student
+        if state is not None:
+            self._observe(student, state, cv_result, now)
+
+        level = self.governor.level(student_id) if self.governor is not None else 0
+        stable = student.key == (_FOCUSED, _NO_ALERT) and now - student.stable_since >= CAPTURE_STABLE_SECONDS
+
+        # 1. Interval: slow while nothing happens, never faster than admission allows
+        interval = CAPTURE_STABLE_INTERVAL_MS if stable else CAPTURE_INTERVAL_MS
+        interval = min(CAPTURE_MAX_INTERVAL_MS, max(interval * (1 + level / 2), backoff))
+        profile = {"interval_ms": round(interval)}
+        if not frames:
+            return profile
+
+        # 2. Resolution: enough pixels on the face, no more
+        profile["width"] = self._width(student, level)
+        profile["quality"] = CAPTURE_STABLE_JPEG_QUALITY if stable or level >= QUALITY_SPARSE else CAPTURE_JPEG_QUALITY
+        return profile
+
+    def _observe(self, student: _Student, state: StudentRecord, cv_result: Optional[dict], now: float):
+        key = (state.status, state.alert)
+        if key != student.key:
+            student.key, student.stable_since = key, now
+        if cv_result is None:
+            return
+        if cv_result.get("face_count") != 1:
+            # Lost or extra faces: go back to full width until one face is tracked again
+            student.face = None
+            return
+        # 0.0 on frames without a mesh (sparse mesh level): keep the last width
+        face = cv_result.get("face_width", 0.0)
+        if face > 0:
+            student.face = face if student.face is None else student.face + _ALPHA * (face - student.face)
+
+    def _width(self, student: _Student, level: int) -> int:
+        if student.face is None:
+            return CAPTURE_MAX_WIDTH
+        needed = MIN_FACE_PIXELS * _FACE_MARGIN / student.face
+        if level >= QUALITY_REDUCED:
+            needed /= 2
+        width = math.ceil(needed / _WIDTH_STEP) * _WIDTH_STEP
+        return max(CAPTURE_MIN_WIDTH, min(width, CAPTURE_MAX_WIDTH))
+
+    def forget(self, student_id: str):
+        self._students.pop(student_id, None)
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+
+def profile_headers(profile: dict) -> dict:
+    # HTTP clients get the profile as headers next to the admission ones
+    headers = {"X-Capture-Interval-Ms": str(profile["interval_ms"])}
+    if "width" in profile:
+        headers["X-Capture-Width"] = str(profile["width"])
+        headers["X-Capture-Quality"] = str(profile["quality"])
+    return headers
+
+
+# Singleton
+capture_advisor = CaptureAdvisor()
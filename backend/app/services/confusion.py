@@ -1,6 +1,8 @@
-import time
 import logging
 
+from app.config import CONFUSION_CLEAR_SECONDS
+from app.utils.timers import Condition, TimerWheel, timer_wheel
+
 logger = logging.getLogger("ConfusionEngine")
 
 class ConfusionEngine:
@@ -8,10 +10,14 @@ class ConfusionEngine:
     Robust MVP Confusion Logic.
     Triggers 'Confused' only after sustained presence without distraction.
     """
-    def __init__(self):
+    def __init__(self, wheel: TimerWheel = timer_wheel, clear_seconds: float = CONFUSION_CLEAR_SECONDS,
+                 brow_threshold: float = 0.35):
         # Tuned for Demo: 1.0s (was 3.0s) for instant feedback
         self.TIME_WINDOW_SECONDS = 1.0
-        self.state = {}
+        # Brow furrow score above which a non-smiling face counts as confused
+        self.BROW_THRESHOLD = brow_threshold
+        # Per-student confusion windows on the shared wheel (an entry only while confused)
+        self.confused = Condition("confused", wheel, self.TIME_WINDOW_SECONDS, clear_seconds)
 
     def calculate_state(self, brow_score: float, smile_score: float) -> str:
         """
@@ -24,30 +30,22 @@ class ConfusionEngine:
         # Confusion Rule
         # Brow furrowed (High Score) AND No Smile
         # Tuned: Brow > 0.35 is sufficient for subtle expressions
-        if brow_score > 0.35 and smile_score < 0.3:
+        if brow_score > self.BROW_THRESHOLD and smile_score < 0.3:
             return "CONFUSED"
 
         return "FOCUSED"
 
-    def update_state(self, student_id: str, current_emotion: str) -> bool:
+    def update_state(self, student_id: str, current_emotion: str, now: float = None) -> bool:
         """
         Persistence Check.
         Returns True if 'CONFUSED' is sustained for N seconds.
+        `now` defaults to the wheel's clock (offline replays pass the frame timestamp).
         """
-        now = time.time()
-        if student_id not in self.state:
-            self.state[student_id] = {"start": None, "last_emotion": "FOCUSED"}
-
         # Only track persistence for CONFUSED
-        if current_emotion == "CONFUSED":
-            if self.state[student_id]["start"] is None:
-                self.state[student_id]["start"] = now
-            elif now - self.state[student_id]["start"] >= self.TIME_WINDOW_SECONDS:
-                return True
-        else:
-            self.state[student_id]["start"] = None
-
-        return False
+        return self.confused.update(student_id, current_emotion == "CONFUSED", now)
+
+    def remove(self, student_id: str):
+        self.confused.reset(student_id)
 
 
 confusion_engine = ConfusionEngine()
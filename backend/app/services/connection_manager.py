@@ -1,37 +1,334 @@
 from fastapi import WebSocket
-from typing import List
+from typing import Dict, Iterable, List, Optional, Set
+import asyncio
+import json
 import logging
+import time
+
+from app.config import BROADCAST_HZ, SUMMARY_PUSH_SECONDS, TEACHER_QUEUE_SIZE, TEACHER_SEND_TIMEOUT_SECONDS
+from app.state.class_summary import SUMMARY_STORE
+from app.state.session_store import SESSION_STORE
+from app.utils.instrumentation import STAGE_SECONDS, BROADCAST_MESSAGES
 
 logger = logging.getLogger("ConnectionManager")
 
+_BROADCAST = STAGE_SECONDS.labels("broadcast")
+_TEACHER_SEND = STAGE_SECONDS.labels("teacher_send")
+
+# Queue marker: send a fresh full snapshot (built at send time, so it is never stale)
+RESYNC = None
+
+
+class TeacherConnection:
+    """
+    One teacher socket with its own bounded outbound queue and sender task,
+    so a slow teacher never blocks the others (or the student request path).
+    `subscriptions` is the set of session_ids it follows (None = every session, empty = none).
+    `summary_only` teachers get class summaries without per-student snapshots / deltas.
+    """
+    def __init__(self, websocket: WebSocket, queue_size: int, subscriptions: Optional[Set[str]] = None,
+                 summary_only: bool = False):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.subscriptions = subscriptions
+        self.summary_only = summary_only
+        self.resyncing = False
+        self.sender: Optional[asyncio.Task] = None
+
+
 class ConnectionManager:
     """
     Manages WebSocket connections for the Teacher Dashboard.
-    Allows broadcasting of real-time session updates.
+    Student updates only mark entries dirty per room; a ticker (BROADCAST_HZ) serializes
+    one delta per dirty room and queues it for the teachers subscribed to that room.
+    Messages:
+        {"type": "snapshot", "students": [SessionState, ...]}
+        {"type": "delta", "session_id": str, "students": [SessionState, ...], "removed": [student_id, ...]}
+        {"type": "summary", "session_id": str, ...}   (ClassSummaryStore, every SUMMARY_PUSH_SECONDS if changed)
+    Messages are assembled from the records' cached JSON (no per-teacher or per-tick re-encoding).
+    HTTP long-polls (wait_for_change) are woken by the same tick.
     """
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, store=SESSION_STORE, hz: float = BROADCAST_HZ,
+                 queue_size: int = TEACHER_QUEUE_SIZE, send_timeout: float = TEACHER_SEND_TIMEOUT_SECONDS,
+                 summaries=SUMMARY_STORE, summary_seconds: float = SUMMARY_PUSH_SECONDS):
+        self.store = store
+        self.summaries = summaries
+        self.summary_seconds = summary_seconds
+        self.interval = 1.0 / hz
+        self.queue_size = max(1, queue_size)
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[WebSocket, TeacherConnection] = {}
+        # Fanout indexes: room -> subscribed connections, plus connections following every room
+        self._room_subscribers: Dict[str, Set[TeacherConnection]] = {}
+        self._global_subscribers: Set[TeacherConnection] = set()
+        # Dirty students per room since the last tick
+        self._dirty: Dict[str, Set[str]] = {}
+        self._ticker: Optional[asyncio.Task] = None
+        # Long-poll waiters: room -> futures (None = waiting on every room)
+        self._pollers: Dict[Optional[str], Set[asyncio.Future]] = {}
+        # room -> summary JSON last pushed (unchanged summaries are not re-sent)
+        self._pushed_summaries: Dict[str, str] = {}
+
+    # --- LIFECYCLE ---
+
+    def start(self):
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._run())
 
-    async def connect(self, websocket: WebSocket):
+    async def stop(self):
+        if self._ticker:
+            self._ticker.cancel()
+            self._ticker = None
+        for websocket in list(self.active_connections):
+            self.disconnect(websocket)
+
+    async def connect(self, websocket: WebSocket, session_ids: Optional[Iterable[str]] = None,
+                      summary_only: bool = False):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.start()
+
+        conn = TeacherConnection(websocket, self.queue_size, summary_only=summary_only)
+        self.active_connections[websocket] = conn
+        self._index(conn, set(session_ids) if session_ids else None)
+        # New clients start from a full snapshot
+        self._resync(conn)
+        conn.sender = asyncio.create_task(self._sender(conn))
         logger.info(f"New WebSocket connection established. Total clients: {len(self.active_connections)}")
 
+    @property
+    def queued_messages(self) -> int:
+        return sum(conn.queue.qsize() for conn in self.active_connections.values())
+
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        conn = self.active_connections.pop(websocket, None)
+        if conn:
+            self._unindex(conn)
+            if conn.sender and conn.sender is not asyncio.current_task():
+                conn.sender.cancel()
             logger.info(f"WebSocket disconnected. Remaining clients: {len(self.active_connections)}")
 
-    async def broadcast(self, message: list):
+    # --- SUBSCRIPTIONS ---
+
+    def subscribe(self, websocket: WebSocket, session_ids: Iterable[str]):
+        """
+        Adds rooms to the teacher's set (a teacher following every room narrows to them).
+        No session_ids: follow every room.
+        """
+        conn = self.active_connections.get(websocket)
+        if conn is None:
+            return
+        session_ids = set(session_ids)
+        current = conn.subscriptions or set()
+        self._unindex(conn)
+        self._index(conn, current | session_ids if session_ids else None)
+        self._resync(conn)
+
+    def unsubscribe(self, websocket: WebSocket, session_ids: Iterable[str]):
+        """
+        Removes rooms from the teacher's set. Leaving the last room follows none (an empty set),
+        never every room.
+        """
+        conn = self.active_connections.get(websocket)
+        if conn is None or conn.subscriptions is None:
+            return
+        remaining = conn.subscriptions - set(session_ids)
+        self._unindex(conn)
+        self._index(conn, remaining)
+        self._resync(conn)
+
+    def _index(self, conn: TeacherConnection, session_ids: Optional[Set[str]]):
+        conn.subscriptions = session_ids
+        if session_ids is None:
+            self._global_subscribers.add(conn)
+            return
+        for session_id in session_ids:
+            self._room_subscribers.setdefault(session_id, set()).add(conn)
+
+    def _unindex(self, conn: TeacherConnection):
+        self._global_subscribers.discard(conn)
+        for session_id in conn.subscriptions or ():
+            subscribers = self._room_subscribers.get(session_id)
+            if subscribers:
+                subscribers.discard(conn)
+                if not subscribers:
+                    del self._room_subscribers[session_id]
+
+    # --- PUBLISHING ---
+
+    def mark_dirty(self, session_id: str, student_id: str):
         """
-        Broadcasts a list of session states (dictionaries) to all connected clients.
+        Called on the student path. Never awaits teacher I/O.
         """
-        for connection in self.active_connections:
+        self._dirty.setdefault(session_id, set()).add(student_id)
+
+    async def _run(self):
+        next_summary = time.monotonic() + self.summary_seconds
+        while True:
+            await asyncio.sleep(self.interval)
             try:
-                await connection.send_json(message)
+                self.flush()
+                if time.monotonic() >= next_summary:
+                    next_summary = time.monotonic() + self.summary_seconds
+                    self.flush_summaries()
             except Exception as e:
-                logger.error(f"Error broadcasting message: {e}")
-                # If send fails, we assume the client is gone, but we wait for the disconnect event to clean up properly.
+                logger.error(f"Broadcast tick failed: {e}")
+
+    def flush(self):
+        """
+        Sends each dirty room's delta (serialized once) to that room's subscribers.
+        Cost scales with the changed rooms' size and audience, not the deployment.
+        """
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        if self._pollers:
+            self._wake(dirty)
+        if not self.active_connections:
+            return
+        started = time.perf_counter()
+
+        for session_id, student_ids in dirty.items():
+            audience = [conn for conn in self._audience(session_id) if not conn.summary_only]
+            if not audience:
+                continue
+
+            room = self.store.room(session_id)
+            students = ", ".join(room[s].to_json() for s in student_ids if s in room)
+            # Students that left the room (moved or expired) since they were marked
+            removed = [s for s in student_ids if s not in room]
+            message = '{"type": "delta", "session_id": %s, "students": [%s], "removed": %s}' % (
+                json.dumps(session_id), students, json.dumps(removed))
+
+            for conn in audience:
+                self._enqueue(conn, message)
+            BROADCAST_MESSAGES.inc("delta", amount=len(audience))
+        _BROADCAST.observe(time.perf_counter() - started)
+
+    def flush_summaries(self):
+        """
+        Sends each followed room's class summary (built once per room) if it changed since
+        the last push. Windows slide with time, so busy rooms are refreshed every push.
+        """
+        if not self.active_connections:
+            self._pushed_summaries = {}
+            return
+        rooms = self.summaries.room_ids() if self._global_subscribers else list(self._room_subscribers)
+        pushed, self._pushed_summaries = self._pushed_summaries, {}
+        for session_id in rooms:
+            audience = self._audience(session_id)
+            body = self.summaries.to_json(session_id) if audience else None
+            if body is None:
+                continue
+            self._pushed_summaries[session_id] = body
+            if pushed.get(session_id) == body:
+                continue
+            message = _summary_message(body)
+            for conn in audience:
+                self._enqueue(conn, message)
+            BROADCAST_MESSAGES.inc("summary", amount=len(audience))
+
+    def _audience(self, session_id: str) -> Set[TeacherConnection]:
+        return self._global_subscribers | self._room_subscribers.get(session_id, set())
+
+    # --- LONG-POLL (GET /teacher/sessions?wait=) ---
+
+    async def wait_for_change(self, session_id: Optional[str], version: int, timeout: float) -> bool:
+        """
+        Waits until the room (every room if session_id is None) is no longer at `version`.
+        Returns False on timeout. Costs one future per waiting request, nothing per frame.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self.start()
+        while self._version(session_id) == version:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            future = loop.create_future()
+            waiters = self._pollers.setdefault(session_id, set())
+            waiters.add(future)
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiters.discard(future)
+                if not waiters and self._pollers.get(session_id) is waiters:
+                    del self._pollers[session_id]
+        return True
+
+    def _version(self, session_id: Optional[str]) -> int:
+        return self.store.version if session_id is None else self.store.room_version(session_id)
+
+    def _wake(self, dirty: Dict[str, Set[str]]):
+        for session_id in (*dirty, None):
+            for future in self._pollers.pop(session_id, ()):
+                if not future.done():
+                    future.set_result(None)
+
+    def _enqueue(self, conn: TeacherConnection, message: str):
+        if conn.resyncing:
+            # A snapshot is already queued (built when sent), it will include this delta
+            return
+        try:
+            conn.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: discard its backlog and resync with one full snapshot
+            logger.warning("Teacher connection is lagging, resyncing with snapshot")
+            self._resync(conn)
+
+    def _resync(self, conn: TeacherConnection):
+        while not conn.queue.empty():
+            conn.queue.get_nowait()
+        conn.resyncing = True
+        conn.queue.put_nowait(RESYNC)
+        BROADCAST_MESSAGES.inc("resync")
+
+    def _summaries(self, conn: TeacherConnection) -> List[str]:
+        rooms = self.summaries.room_ids() if conn.subscriptions is None else conn.subscriptions
+        bodies = (self.summaries.to_json(session_id) for session_id in rooms)
+        return [_summary_message(body) for body in bodies if body is not None]
+
+    def _snapshot(self, conn: TeacherConnection) -> str:
+        # The store's cached JSON lists, shared by every teacher following the same rooms
+        if conn.subscriptions is None:
+            _, students = self.store.snapshot()
+        else:
+            rooms = (self.store.snapshot(session_id)[1][1:-1] for session_id in conn.subscriptions)
+            students = "[" + ", ".join(room for room in rooms if room) + "]"
+        return '{"type": "snapshot", "students": %s}' % students
+
+    async def _sender(self, conn: TeacherConnection):
+        try:
+            while True:
+                message = await conn.queue.get()
+                if message is RESYNC:
+                    # Snapshot first, then the followed rooms' current summaries
+                    conn.resyncing = False
+                    messages = self._summaries(conn)
+                    if not conn.summary_only:
+                        messages.insert(0, self._snapshot(conn))
+                else:
+                    messages = (message,)
+                for message in messages:
+                    started = time.perf_counter()
+                    await asyncio.wait_for(conn.websocket.send_text(message), self.send_timeout)
+                    _TEACHER_SEND.observe(time.perf_counter() - started)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Stuck or closed socket: drop the consumer, the client reconnects and gets a snapshot
+            logger.error(f"Error broadcasting message: {e!r}")
+            self.disconnect(conn.websocket)
+            try:
+                await conn.websocket.close()
+            except Exception:
+                pass
+
+def _summary_message(body: str) -> str:
+    # The summary is a JSON object: prepend the message type
+    return '{"type": "summary", ' + body[1:]
+
 
 # Global Instance
 manager = ConnectionManager()
@@ -1,19 +1,66 @@
 import cv2
-import mediapipe as mp
 import logging
 import math
+import time
 import numpy as np
 
+from app.config import (
+    TRACKING_LOCK_CONFIDENCE, DETECTION_REFRESH_FRAMES, DETECTION_SCENE_THRESHOLD, ROI_CROP_ENABLED,
+    STATIC_FRAME_THRESHOLD, STATIC_FRAME_REFRESH, QUALITY_MESH_EVERY,
+)
+from app.services.analyzer_session import AnalyzerSessionRegistry
+from app.services.preprocessing import FramePreprocessor, FRAME_THUMBNAIL
+from app.services.landmark_metrics import landmarks_to_array, frame_metrics, GAZE_LEFT_RATIO, GAZE_RIGHT_RATIO
+from app.services.quality_governor import QUALITY_FULL, QUALITY_REDUCED, QUALITY_SPARSE, QUALITY_FACE_COUNT
+
 logger = logging.getLogger("CVPipeline")
 
+# Session key used when a caller does not identify the student
+DEFAULT_SESSION = "__default__"
+# Throwaway session used by warm_up()
+WARMUP_SESSION = "__warmup__"
+# Largest decode reduction the quality ladder forces (smaller frames starve the mesh)
+QUALITY_MAX_REDUCTION = 4
+# Scene-change check while tracking: margin around the face (in face sizes) whose cells it ignores
+SCENE_FACE_MARGIN = 0.5
+# A tracked mesh whose center moves more than MESH_JUMP_SHIFT face widths, or whose width changes by
+# more than MESH_JUMP_SCALE, between two frames may have jumped to another face: detection runs at once
+MESH_JUMP_SHIFT = 0.5
+MESH_JUMP_SCALE = 0.3
+
+
+def synthetic_frame(width: int = 640, height: int = 480) -> np.ndarray:
+    """
+    Bundled warm-up frame (BGR): a face-like shape on a gradient background. Good enough
+    to run every graph once; no image file to ship or load.
+    """
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[:] = np.linspace(60, 160, width, dtype=np.uint8)[None, :, None]
+    cx, cy, r = width // 2, height // 2, min(width, height) // 4
+    cv2.ellipse(frame, (cx, cy), (int(r * 0.8), r), 0, 0, 360, (150, 180, 225), -1)
+    for dx in (-r // 3, r // 3):
+        cv2.circle(frame, (cx + dx, cy - r // 4), r // 10, (40, 40, 40), -1)
+    cv2.ellipse(frame, (cx, cy + r // 2), (r // 3, r // 10), 0, 0, 180, (60, 60, 150), 3)
+    return frame
+
+
 class CVPipeline:
-    def __init__(self):
+    def __init__(self, gaze_left: float = GAZE_LEFT_RATIO, gaze_right: float = GAZE_RIGHT_RATIO):
         self.use_fallback = False
         self.face_detector = None
-        self.face_mesh = None
+        self.sessions = None
+        self.haar_cascade = None
+        self._haar_loaded = False
+        self.preprocessor = FramePreprocessor()
+        # Also return the full (478, 3) mesh as results["landmarks"] (benchmarks, offline tools)
+        self.keep_landmarks = False
+        # Gaze label cutoffs on the iris ratio (offline runs pass their own)
+        self.gaze_left = gaze_left
+        self.gaze_right = gaze_right
         
-        # 1. Initialize MediaPipe
+        # 1. Initialize MediaPipe (imported here: ~1s, paid by the analysis workers only)
         try:
+            import mediapipe as mp
             self.mp_face_detection = mp.solutions.face_detection
             self.face_detector = self.mp_face_detection.FaceDetection(
                 model_selection=0,
@@ -21,46 +68,111 @@ class CVPipeline:
             )
             
             self.mp_face_mesh = mp.solutions.face_mesh
-            self.face_mesh = self.mp_face_mesh.FaceMesh(
-                max_num_faces=1,
-                refine_landmarks=True,
-                min_detection_confidence=0.5,
-                min_tracking_confidence=0.5
-            )
-            logger.info("MediaPipe Initialized (Detection + Mesh)")
+            # One FaceMesh graph per student (tracking mode), created on demand
+            self.sessions = AnalyzerSessionRegistry(self._create_face_mesh)
+            logger.info("MediaPipe Initialized (Detection + Per-Student Mesh)")
         except Exception as e:
             logger.error(f"MediaPipe Init Failed: {e}. Switching to OpenCV Fallback.")
             self.use_fallback = True
+            self._haar()
+
+    def _haar(self):
+        # Haar cascade: the fallback detector, and the face counter of QUALITY_FACE_COUNT (loaded on first use)
+        if not self._haar_loaded:
+            self._haar_loaded = True
             try:
-                # Initialize Haar Cascade for fallback face detection
-                self.haar_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            except Exception as e2:
-                logger.error(f"Haar Init Failed: {e2}")
-                self.haar_cascade = None
+                cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+                self.haar_cascade = None if cascade.empty() else cascade
+            except Exception as e:
+                logger.error(f"Haar Init Failed: {e}")
+        return self.haar_cascade
+
+    def _create_face_mesh(self):
+        # static_image_mode=False: after the first detection the graph tracks the face
+        # from the previous landmarks and only re-detects when tracking confidence drops.
+        return self.mp_face_mesh.FaceMesh(
+            static_image_mode=False,
+            max_num_faces=1,
+            refine_landmarks=True,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
 
-    def process_frame(self, frame):
+    def warm_up(self, frame=None) -> float:
+        """
+        Runs the detector and one mesh graph once (on the synthetic frame by default) so
+        model loading and delegate setup are not paid by the first real frame.
+        Returns the seconds spent.
+        """
+        started = time.perf_counter()
+        frame = synthetic_frame() if frame is None else frame
+        if self.use_fallback:
+            self.process_frame(frame, WARMUP_SESSION)
+        else:
+            rgb = self.preprocessor.to_rgb(frame)
+            self.face_detector.process(rgb)
+            # The mesh runs on the whole frame whatever the detector found
+            self.sessions.get(WARMUP_SESSION).face_mesh.process(rgb)
+            self.sessions.evict(WARMUP_SESSION)
+        return time.perf_counter() - started
+
+    def decode_reduction(self, student_id: str = DEFAULT_SESSION, quality: int = QUALITY_FULL) -> int:
+        """
+        JPEG decode reduction (1, 2, 4, 8) to use for this student's next frame,
+        based on the face size seen in the previous one (one step coarser from QUALITY_REDUCED).
+        """
+        if self.use_fallback:
+            reduction = 1
+        else:
+            session = self.sessions.peek(student_id)
+            reduction = self.preprocessor.choose_reduction(session.face_px if session else None)
+        if quality >= QUALITY_REDUCED:
+            reduction = min(QUALITY_MAX_REDUCTION, max(2, reduction * 2))
+        return reduction
+
+    def process_frame(self, frame, student_id: str = DEFAULT_SESSION, scale: int = 1, quality: int = QUALITY_FULL):
         """
         Main Analysis Loop.
+        Detection runs until the student's session has a confident lock; after that only
+        the (tracking) mesh runs, with a periodic detection refresh to catch extra faces.
+        The mesh runs on the padded face ROI of the previous frame when one is known.
+        A frame whose thumbnail matches the last analyzed one reuses that analysis (at most
+        STATIC_FRAME_REFRESH times in a row); the rules still run on it, so timers advance.
+        `scale` is the decode reduction applied to `frame` (2 = half resolution).
+        `quality` is the governor's level: from QUALITY_SPARSE the mesh runs on one frame in
+        QUALITY_MESH_EVERY (faces are counted in between), QUALITY_FACE_COUNT only counts faces.
         Returns:
         {
             "face_count": int,
-            "landmarks": list, 
+            "landmarks": np.ndarray,  # (478, 3) normalized to the full frame (keep_landmarks only)
+            "face_width": float,      # face width / frame width (0.0 without a mesh this frame)
+            "pixels": int,            # pixels fed to MediaPipe / Haar for this frame
+            "fallback": bool,         # analyzed by the Haar fallback
+            "static": bool,           # unchanged frame: previous analysis reused
+            "quality": int,           # quality level applied (QUALITY_FACE_COUNT in fallback)
+            "timings": dict,          # seconds per step: static_check, detection, mesh, metrics
             "metrics": {
                 "gaze": "CENTER", # LEFT, RIGHT, UP, DOWN, CENTER
                 "brow": float,    # 0.0 (open) to 1.0 (furrowed)
                 "smile": float,   # 0.0 (neutral) to 1.0 (smiling)
+                ...               # raw ratios, ear, yaw, pitch (see landmark_metrics)
             }
         }
         """
         if frame is None:
             return {"face_count": 0, "metrics": {}}
 
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         h, w, _ = frame.shape
         
         results = {
             "face_count": 0,
             "landmarks": None,
+            "face_width": 0.0,
+            "pixels": 0,
+            "fallback": self.use_fallback,
+            "static": False,
+            "quality": QUALITY_FACE_COUNT if self.use_fallback else quality,
+            "timings": {},
             "metrics": {
                 "gaze": "CENTER",
                 "brow": 0.0,
@@ -69,39 +181,224 @@ class CVPipeline:
         }
 
         try:
-            # 1. Detection
-            if self.face_detector:
-                detection = self.face_detector.process(rgb)
-                if detection.detections:
-                    results["face_count"] = len(detection.detections)
-            elif self.use_fallback and self.haar_cascade:
-                 # Fallback: OpenCV Haar Cascade
-                 gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                 faces = self.haar_cascade.detectMultiScale(gray, 1.1, 4)
-                 results["face_count"] = len(faces)
-            elif self.use_fallback:
-                 # Absolute fallback if even Haar fails (unlikely)
-                 results["face_count"] = 0 # Default to 0 so we don't assume safe
-
-            # 2. Mesh Analysis (Only if 1 face)
-            if results["face_count"] == 1 and self.face_mesh:
-                mesh_res = self.face_mesh.process(rgb)
-                if mesh_res.multi_face_landmarks:
-                    lm = mesh_res.multi_face_landmarks[0]
-                    results["landmarks"] = lm
-                    
-                    # --- COMPUTE METRICS ---
-                    results["metrics"]["gaze"] = self._detect_gaze(lm, w, h)
-                    results["metrics"]["brow"] = self._calculate_brow_furrow(lm)
-                    results["metrics"]["smile"] = self._calculate_smile(lm)
-            
+            if self.use_fallback:
+                # Fallback: OpenCV Haar Cascade (face count only, single gray conversion)
+                if self.haar_cascade:
+                    self._count_faces(results, frame, w, h)
+                else:
+                    # Absolute fallback if even Haar fails (unlikely)
+                    results["face_count"] = 0 # Default to 0 so we don't assume safe
+                return results
+
+            session = self.sessions.get(student_id)
+
+            # 0. Static frame (nothing moved since the last analysis: reuse it)
+            started = time.perf_counter()
+            key, thumbnail = self._thumbnail(session, frame, w, h, quality)
+            reused = self._reuse(session, key, thumbnail)
+            if reused is not None:
+                reused["timings"]["static_check"] = time.perf_counter() - started
+                return reused
+            if key is not None:
+                results["timings"]["static_check"] = time.perf_counter() - started
+
+            if quality >= QUALITY_FACE_COUNT:
+                # 1-3 replaced by a face count (neutral metrics: no gaze / confusion signal)
+                self._count_faces(results, frame, w, h, session)
+            elif (quality >= QUALITY_SPARSE and session.mesh_metrics is not None
+                  and session.sparse_frames < QUALITY_MESH_EVERY - 1):
+                # Between two mesh frames: fresh face count, the last mesh metrics while one face stays
+                session.sparse_frames += 1
+                self._count_faces(results, frame, w, h, session)
+                if results["face_count"] == 1:
+                    results["metrics"].update(session.mesh_metrics)
+            else:
+                self._analyze(results, session, frame, w, h, scale, thumbnail)
+                session.sparse_frames = 0
+                session.mesh_metrics = results["metrics"] if "gaze_ratio" in results["metrics"] else None
+            self._remember(session, frame, w, h, key, thumbnail, results, quality)
             return results
 
         except Exception as e:
             logger.error(f"Processing Error: {e}")
             return results
 
+    def _analyze(self, results, session, frame, w, h, scale, thumbnail=None):
+        scene = self._scene(frame, thumbnail)
+
+        # 1. Tracking (Mesh only on the ROI crop, skips detection while the lock holds). Detection still
+        #    runs every DETECTION_REFRESH_FRAMES frames, and on this frame if the scene changed away from
+        #    the face or the mesh jumped: a second face must not wait for the refresh
+        if (session.locked and session.frames_since_detection < DETECTION_REFRESH_FRAMES
+                and not self._scene_changed(session, scene)):
+            session.frames_since_detection += 1
+            previous = session.last_roi
+            box = self._mesh_box(session, w, h)
+            mesh_input = self.preprocessor.rgb_crop(frame, box) if box else self.preprocessor.to_rgb(frame)
+            results["pixels"] += mesh_input.shape[0] * mesh_input.shape[1]
+            metrics = self._run_mesh(results, session, mesh_input, box, w, h, scale)
+            if metrics is not None and not self._mesh_jumped(previous, session.last_roi):
+                results["face_count"] = 1
+                self._fill_metrics(results, session, metrics)
+                return
+            # Tracking lost or jumped -> fall through to a full detection on this frame
+            session.unlock()
+
+        # 2. Detection (full frame, converted once)
+        session.frames_since_detection = 0
+        session.scene = scene
+        started = time.perf_counter()
+        rgb = self.preprocessor.to_rgb(frame)
+        results["pixels"] += w * h
+        detection = self.face_detector.process(rgb)
+        if detection.detections:
+            results["face_count"] = len(detection.detections)
+        results["timings"]["detection"] = time.perf_counter() - started
+
+        # 3. Mesh Analysis (Only if 1 face)
+        if results["face_count"] == 1:
+            if session.last_roi is None:
+                # First box from the detection: the tracking mesh then keeps seeing the same window
+                # (fed the full frame here, it loses the face on the next frame's crop)
+                bbox = detection.detections[0].location_data.relative_bounding_box
+                session.last_roi = (bbox.xmin, bbox.ymin, bbox.width, bbox.height)
+            box = self._mesh_box(session, w, h)
+            mesh_input = self.preprocessor.rgb_crop(frame, box, rgb) if box else rgb
+            metrics = self._run_mesh(results, session, mesh_input, box, w, h, scale)
+            if metrics is not None:
+                self._fill_metrics(results, session, metrics)
+                score = detection.detections[0].score[0]
+                if score >= TRACKING_LOCK_CONFIDENCE:
+                    session.lock()
+            else:
+                session.unlock()
+        else:
+            session.unlock()
+
+    def _scene(self, frame, thumbnail):
+        # Whole-frame cells (32x24 gray) of this frame: the static-frame thumbnail's, or a fresh one
+        if DETECTION_SCENE_THRESHOLD <= 0:
+            return None
+        if thumbnail is None:
+            thumbnail = self.preprocessor.thumbnail(frame)
+        return thumbnail[:FRAME_THUMBNAIL[0] * FRAME_THUMBNAIL[1]].reshape(FRAME_THUMBNAIL[1], FRAME_THUMBNAIL[0])
+
+    def _scene_changed(self, session, scene):
+        # Largest cell change since the last detection, away from the tracked face (its own motion
+        # is the mesh's business): a face stepping into the frame changes those cells
+        if scene is None or session.scene is None or session.last_roi is None:
+            return False
+        cols, rows = FRAME_THUMBNAIL
+        x, y, rw, rh = session.last_roi
+        mx, my = rw * SCENE_FACE_MARGIN, rh * SCENE_FACE_MARGIN
+        c0, c1 = max(0, int((x - mx) * cols)), min(cols, math.ceil((x + rw + mx) * cols))
+        r0, r1 = max(0, int((y - my) * rows)), min(rows, math.ceil((y + rh + my) * rows))
+        diff = np.abs(scene - session.scene)
+        diff[r0:r1, c0:c1] = 0
+        return diff.max() > DETECTION_SCENE_THRESHOLD
+
+    @staticmethod
+    def _mesh_jumped(previous, roi):
+        # Center shift (in face sizes) / width change of the tracked mesh between two frames
+        if previous is None or roi is None:
+            return False
+        (px, py, pw, ph), (x, y, rw, rh) = previous, roi
+        return (abs(x + rw / 2 - px - pw / 2) > MESH_JUMP_SHIFT * pw
+                or abs(y + rh / 2 - py - ph / 2) > MESH_JUMP_SHIFT * ph
+                or abs(rw - pw) > MESH_JUMP_SCALE * pw)
+
+    def _count_faces(self, results, frame, w, h, session=None):
+        # Face count only: Haar on the gray frame when the cascade exists, else the MediaPipe detector
+        started = time.perf_counter()
+        cascade = self._haar() if self.use_fallback or results["quality"] >= QUALITY_FACE_COUNT else None
+        if cascade is not None:
+            results["face_count"] = len(cascade.detectMultiScale(self.preprocessor.to_gray(frame), 1.1, 4))
+        else:
+            detection = self.face_detector.process(self.preprocessor.to_rgb(frame))
+            results["face_count"] = len(detection.detections or ())
+        results["pixels"] += w * h
+        results["timings"]["detection"] = time.perf_counter() - started
+        if session is not None and results["face_count"] != 1:
+            session.unlock()
+
+    # --- STATIC FRAMES ---
+
+    def _thumbnail(self, session, frame, w, h, quality):
+        if STATIC_FRAME_THRESHOLD <= 0:
+            return None, None
+        # The face box is only comparable between frames of the same size (and analyzed at the same level)
+        box = session.crop_box if session.crop_size == (w, h) else None
+        return (w, h, box, quality), self.preprocessor.thumbnail(frame, box)
+
+    def _reuse(self, session, key, thumbnail):
+        if (key is None or session.last_result is None or key != session.thumbnail_key
+                or session.static_frames >= STATIC_FRAME_REFRESH):
+            return None
+        # Largest cell change: a local change (iris, brow) is not averaged away by the still background
+        if np.abs(thumbnail - session.thumbnail).max() > STATIC_FRAME_THRESHOLD:
+            return None
+        if session.locked:
+            # Reused frames count toward the detection refresh, which a reused frame never skips
+            if session.frames_since_detection >= DETECTION_REFRESH_FRAMES:
+                return None
+            session.frames_since_detection += 1
+        session.static_frames += 1
+        last = session.last_result
+        return {**last, "metrics": dict(last["metrics"]), "pixels": 0, "static": True, "timings": {}}
+
+    def _remember(self, session, frame, w, h, key, thumbnail, results, quality):
+        if key is None:
+            return
+        # This frame may have moved the face box: the next frame is compared with the new one
+        next_key = (w, h, session.crop_box if session.crop_size == (w, h) else None, quality)
+        if next_key != key:
+            key, thumbnail = next_key, self.preprocessor.thumbnail(frame, next_key[2])
+        session.thumbnail, session.thumbnail_key = thumbnail, key
+        session.last_result = results
+        session.static_frames = 0
+
+    def _mesh_box(self, session, w, h):
+        if not ROI_CROP_ENABLED:
+            return None
+        # Boxes are kept in full-resolution pixels; rescale when the decode reduction changes
+        session.crop_box = self.preprocessor.crop_box(session.last_roi, w, h, session.crop_box
+                                                      if session.crop_size == (w, h) else None)
+        session.crop_size = (w, h)
+        return session.crop_box
+
+    def _run_mesh(self, results, session, rgb, box, w, h, scale):
+        started = time.perf_counter()
+        mesh_res = session.face_mesh.process(rgb)
+        if not mesh_res.multi_face_landmarks:
+            results["timings"]["mesh"] = time.perf_counter() - started
+            return None
+        landmarks = mesh_res.multi_face_landmarks[0]
+        if self.keep_landmarks:
+            results["landmarks"] = self.preprocessor.to_frame_coords(landmarks_to_array(landmarks), box, w, h)
+        results["timings"]["mesh"] = time.perf_counter() - started
+
+        # --- COMPUTE METRICS ---
+        # Scalar math on the few coordinates the metrics use, in the crop's coordinates (ratios do
+        # not change with the crop; the eye aspect ratio takes the crop's aspect): gaze/brow/smile
+        # plus raw ratios, eye aspect ratio and head pose proxies (FaceMesh runs with iris points)
+        started = time.perf_counter()
+        aspect = 1.0 if box is None else (box[3] - box[1]) * w / ((box[2] - box[0]) * h)
+        metrics, (x0, y0, x1, y1) = frame_metrics(landmarks, aspect, self.gaze_left, self.gaze_right)
+        results["timings"]["metrics"] = time.perf_counter() - started
+
+        # Normalized ROI (x, y, w, h) from the face oval extremes, face width in full-resolution pixels
+        (x0, y0), (x1, y1) = self.preprocessor.to_frame_points([[x0, y0], [x1, y1]], box, w, h)
+        session.last_roi = (x0, y0, x1 - x0, y1 - y0)
+        session.face_px = session.last_roi[2] * w * scale
+        return metrics
+
+    def _fill_metrics(self, results, session, metrics):
+        results["face_width"] = session.last_roi[2]
+        results["metrics"].update(metrics)
+
     # --- METRIC HELPERS ---
+    # Per-landmark reference implementations (gaze / brow / smile only). process_frame reads
+    # the same landmarks into landmark_metrics.frame_metrics; these stay as the parity baseline.
 
     def _detect_gaze(self, landmarks, img_w, img_h):
         # ROI: Left Eye (Indices 33, 133) + Iris (468)
@@ -121,7 +418,7 @@ class CVPipeline:
             ratio = iris_dist / eye_width
 
             # Debug Ratio
-            logger.info(f"Gaze Ratio: {ratio:.3f}")
+            logger.debug("Gaze Ratio: %.3f", ratio)
 
             # Thresholds (Aggressive Tuning)
             # 0.45 / 0.55 - Extremely narrow center.
@@ -174,4 +471,13 @@ class CVPipeline:
         except:
             return 0.0
 
-cv_pipeline = CVPipeline()
+# Per-process instance, created on first use (MediaPipe graphs load in the analysis workers,
+# never at import time)
+_cv_pipeline = None
+
+
+def get_cv_pipeline() -> CVPipeline:
+    global _cv_pipeline
+    if _cv_pipeline is None:
+        _cv_pipeline = CVPipeline()
+    return _cv_pipeline
@@ -1,34 +1,75 @@
 import base64
+import struct
 import numpy as np
-import cv2
 import logging
 
 logger = logging.getLogger("FrameReceiver")
 
+# Binary WebSocket frame header (little-endian):
+#   uint32  sequence number
+#   float64 capture timestamp (ms since epoch, client clock)
+# followed directly by the encoded JPEG/WebP bytes.
+FRAME_HEADER = struct.Struct("<Id")
+
 class FrameReceiver:
     def decode_frame(self, frame_data: str) -> np.ndarray:
         """
         Decodes a Base64 string into a valid OpenCV image (numpy array).
         Returns None if decoding fails to ensure system resilience.
         """
+        img_bytes = self.extract_bytes(frame_data)
+        if img_bytes is None:
+            return None
+        return self.decode_bytes(img_bytes)
+
+    def extract_bytes(self, frame_data: str) -> bytes:
+        """
+        Strips the Data URI prefix and Base64-decodes the payload into encoded image bytes.
+        Cheap enough to run on the event loop; the expensive imdecode happens in decode_bytes.
+        """
         try:
             # 1. Sanitize Data (Remove Data URI prefix if present)
             if "," in frame_data:
                 frame_data = frame_data.split(",")[1]
 
             # 2. Decode Base64 -> Bytes
-            img_bytes = base64.b64decode(frame_data)
-            
-            # 3. Convert Bytes -> Numpy Buffer
-            np_arr = np.frombuffer(img_bytes, np.uint8)
-            
+            return base64.b64decode(frame_data)
+
+        except Exception as e:
+            logger.error(f"Frame Decoding Error: {e}")
+            return None
+
+    def parse_header(self, packet: bytes):
+        """
+        Reads the fixed header of a binary frame packet.
+        Returns (seq, timestamp_ms) or None if the packet is too short to hold an image.
+        """
+        if len(packet) <= FRAME_HEADER.size:
+            return None
+        return FRAME_HEADER.unpack_from(packet)
+
+    def decode_bytes(self, img_bytes: bytes, offset: int = 0, reduction: int = 1) -> np.ndarray:
+        """
+        Decodes encoded image bytes (JPEG/PNG/WebP) into an OpenCV image.
+        `offset` skips a packet header without slicing (no copy of the payload).
+        `reduction` (2, 4, 8) decodes JPEGs directly at 1/N resolution.
+        Returns None if decoding fails.
+        """
+        # Imported here: the API process only parses packets, OpenCV loads in the analysis workers
+        import cv2
+        from app.services.preprocessing import decode_flags
+
+        try:
+            # 3. Convert Bytes -> Numpy Buffer (zero-copy view)
+            np_arr = np.frombuffer(img_bytes, np.uint8, offset=offset)
+
             # 4. Decode Buffer -> Image
-            frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-            
+            frame = cv2.imdecode(np_arr, decode_flags(reduction))
+
             if frame is None:
                 logger.warning("Decoded frame is None (Corruption?).")
                 return None
-            
+
             return frame
 
         except Exception as e:
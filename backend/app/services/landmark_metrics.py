@@ -0,0 +1,294 @@
+import logging
+import operator
+import numpy as np
+
+logger = logging.getLogger("LandmarkMetrics")
+
+# --- FACE MESH INDICES ---
+NUM_LANDMARKS = 478          # 468 mesh + 10 iris points (refine_landmarks=True)
+LEFT_EYE_OUTER, LEFT_EYE_INNER, LEFT_IRIS = 33, 133, 468
+RIGHT_EYE_INNER, RIGHT_EYE_OUTER, RIGHT_IRIS = 362, 263, 473
+LEFT_EYE_TOP, LEFT_EYE_BOTTOM = (160, 158), (144, 153)
+BROW_INNER_LEFT, BROW_INNER_RIGHT = 107, 336
+FACE_LEFT, FACE_RIGHT = 234, 454
+MOUTH_LEFT, MOUTH_RIGHT = 61, 291
+NOSE_TIP, FOREHEAD, CHIN = 1, 10, 152
+
+# --- THRESHOLDS (same as the original per-landmark helpers) ---
+GAZE_LEFT_RATIO = 0.45
+GAZE_RIGHT_RATIO = 0.55
+BROW_BASELINE = 0.30
+BROW_GAIN = 10.0
+SMILE_RATIO = 0.45
+SMILE_ON, SMILE_OFF = 0.9, 0.1
+# Mouth ratio of a neutral mouth (continuous smile scores ramp from here to SMILE_RATIO)
+SMILE_NEUTRAL_RATIO = 0.35
+
+
+def landmarks_to_array(landmarks, out: np.ndarray = None) -> np.ndarray:
+    """
+    Converts a MediaPipe NormalizedLandmarkList into an (N, 3) float32 array (every point:
+    landmark packets, offline tools). The per-frame path reads only the coordinates the
+    metrics use (frame_metrics). `out` lets callers reuse a preallocated buffer.
+    """
+    n = len(landmarks.landmark)
+    if out is None or out.shape != (n, 3):
+        out = np.empty((n, 3), dtype=np.float32)
+    for i, p in enumerate(landmarks.landmark):
+        out[i, 0] = p.x
+        out[i, 1] = p.y
+        out[i, 2] = p.z
+    return out
+
+
+def _safe_div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    # Division that yields 0 where the denominator is 0 (degenerate faces)
+    out = np.zeros_like(num)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+# Every landmark the metrics read, gathered once into a compact (N, K, 2) block
+_USED = (
+    LEFT_EYE_OUTER, LEFT_EYE_INNER, LEFT_IRIS, *LEFT_EYE_TOP, *LEFT_EYE_BOTTOM,
+    RIGHT_EYE_INNER, RIGHT_EYE_OUTER, RIGHT_IRIS, BROW_INNER_LEFT, BROW_INNER_RIGHT, FACE_LEFT, FACE_RIGHT,
+    MOUTH_LEFT, MOUTH_RIGHT, NOSE_TIP, FOREHEAD, CHIN,
+)
+_COL = {index: col for col, index in enumerate(_USED)}
+# Without iris points (refine_landmarks=False) the irises read as the outer / inner eye corners
+_NO_IRIS = {LEFT_IRIS: LEFT_EYE_OUTER, RIGHT_IRIS: RIGHT_EYE_INNER}
+_USED_NO_IRIS = tuple(_NO_IRIS.get(i, i) for i in _USED)
+# One C call fetches every used point (a protobuf element access is the per-frame cost)
+_GET_USED = operator.itemgetter(*_USED)
+_GET_USED_NO_IRIS = operator.itemgetter(*_USED_NO_IRIS)
+
+
+def frame_metrics(landmarks, aspect: float = 1.0, gaze_left: float = GAZE_LEFT_RATIO,
+                  gaze_right: float = GAZE_RIGHT_RATIO) -> tuple:
+    """
+    Per-frame path: metrics of one MediaPipe NormalizedLandmarkList plus the face oval's
+    (x0, y0, x1, y1) bounds, in the mesh input's normalized coordinates. Reads only the
+    coordinates the metrics use (one C call fetches the 19 points, then 26 attribute reads)
+    instead of converting all 478 points; the math is inlined, as a protobuf read costs as
+    much as the arithmetic it feeds.
+    Every metric is a ratio of differences along one axis, so an affine mapping of the mesh
+    input to the frame (the crop box) leaves it unchanged, except the eye aspect ratio:
+    `aspect` is the frame-normalized height / width of one mesh-input unit (the crop's).
+    `gaze_left` / `gaze_right` are the gaze label cutoffs (offline runs tune them).
+    Same formulas (and float results) as metrics_from_points.
+    """
+    points = landmarks.landmark
+    has_iris = len(points) > LEFT_IRIS
+    (outer, inner, iris, top_1, top_2, bottom_1, bottom_2, right_inner, right_outer, right_iris,
+     brow_left, brow_right, face_left, face_right, mouth_left, mouth_right, nose, forehead, chin) = \
+        (_GET_USED if has_iris else _GET_USED_NO_IRIS)(points)
+    outer_x, inner_x, right_inner_x = outer.x, inner.x, right_inner.x
+    left_x, right_x, top_y, bottom_y = face_left.x, face_right.x, forehead.y, chin.y
+
+    # 1. Gaze
+    eye_width = inner_x - outer_x
+    right_width = right_outer.x - right_inner_x
+    gaze, gaze_ratio, gaze_ratio_right = "CENTER", 0.5, 0.5
+    if has_iris:
+        gaze_ratio = (iris.x - outer_x) / eye_width if eye_width else 0.0
+        gaze_ratio_right = (right_iris.x - right_inner_x) / right_width if right_width else 0.0
+        if eye_width:
+            if gaze_ratio < gaze_left:
+                gaze = "LEFT"
+            elif gaze_ratio > gaze_right:
+                gaze = "RIGHT"
+    widths = abs(eye_width) + abs(right_width)
+
+    # 2. Brow / 3. Smile / 5. Yaw (all over the face width)
+    face_width = abs(left_x - right_x)
+    if face_width:
+        brow_ratio = abs(brow_left.x - brow_right.x) / face_width
+        mouth_ratio = abs(mouth_left.x - mouth_right.x) / face_width
+        brow = max(0.0, min(1.0, (BROW_BASELINE - brow_ratio) * BROW_GAIN))
+        smile = SMILE_ON if mouth_ratio > SMILE_RATIO else SMILE_OFF
+        yaw = (nose.x - (left_x + right_x) / 2.0) / face_width
+    else:
+        brow_ratio = mouth_ratio = brow = smile = yaw = 0.0
+
+    # 4. Eye aspect ratio (vertical differences scaled to the frame's units)
+    dx, dy = outer_x - inner_x, (outer.y - inner.y) * aspect
+    corners = (dx * dx + dy * dy) ** 0.5
+    ear = 0.0
+    if corners:
+        dx, dy = top_1.x - bottom_1.x, (top_1.y - bottom_1.y) * aspect
+        lids = (dx * dx + dy * dy) ** 0.5
+        dx, dy = top_2.x - bottom_2.x, (top_2.y - bottom_2.y) * aspect
+        ear = (lids + (dx * dx + dy * dy) ** 0.5) / (2.0 * corners)
+
+    # 5. Pitch
+    face_height = abs(bottom_y - top_y)
+    pitch = (nose.y - (top_y + bottom_y) / 2.0) / face_height if face_height else 0.0
+
+    metrics = {
+        "gaze": gaze,
+        "gaze_ratio": gaze_ratio,
+        "gaze_ratio_right": gaze_ratio_right,
+        "eye_balance": abs(eye_width) / widths if widths else 0.0,
+        "brow": brow,
+        "brow_ratio": brow_ratio,
+        "smile": smile,
+        "mouth_ratio": mouth_ratio,
+        "ear": ear,
+        "yaw": yaw,
+        "pitch": pitch,
+    }
+    if left_x > right_x:
+        left_x, right_x = right_x, left_x
+    if top_y > bottom_y:
+        top_y, bottom_y = bottom_y, top_y
+    return metrics, (left_x, top_y, right_x, bottom_y)
+
+
+def compute_metrics_batch(stack: np.ndarray) -> dict:
+    """
+    Vectorized metrics over an (N, L, 3) landmark stack (one row per face), for offline
+    re-scoring of many faces at once; one face is cheaper with compute_metrics / frame_metrics.
+    Returns a dict of length-N arrays:
+        gaze (str labels), gaze_ratio, gaze_ratio_right, eye_balance, brow, brow_ratio,
+        smile, mouth_ratio, ear (left eye aspect ratio), yaw, pitch (normalized head pose proxies)
+    Both gaze ratios grow toward the frame's right edge; eye_balance is the left eye's share
+    of the two eye widths (0.5 facing the camera, lower as the head turns the left eye away).
+    Ratios are computed in float64 so threshold decisions match the scalar helpers exactly.
+    """
+    stack = np.asarray(stack)
+    n = stack.shape[0]
+    has_iris = stack.shape[1] > LEFT_IRIS
+
+    used = _USED if has_iris else _USED_NO_IRIS
+    pts = stack[:, used, :2].astype(np.float64)
+    x, y = pts[:, :, 0], pts[:, :, 1]
+    c = _COL
+
+    face_width = np.abs(x[:, c[FACE_LEFT]] - x[:, c[FACE_RIGHT]])
+    no_width = face_width == 0
+
+    # 1. Gaze (left eye horizontal iris ratio)
+    eye_width = x[:, c[LEFT_EYE_INNER]] - x[:, c[LEFT_EYE_OUTER]]
+    gaze_ratio = _safe_div(x[:, c[LEFT_IRIS]] - x[:, c[LEFT_EYE_OUTER]], eye_width)
+    right_width = x[:, c[RIGHT_EYE_OUTER]] - x[:, c[RIGHT_EYE_INNER]]
+    gaze_ratio_right = _safe_div(x[:, c[RIGHT_IRIS]] - x[:, c[RIGHT_EYE_INNER]], right_width)
+    eye_balance = _safe_div(np.abs(eye_width), np.abs(eye_width) + np.abs(right_width))
+    valid = eye_width != 0
+    if not has_iris:
+        gaze_ratio[:] = 0.5
+        gaze_ratio_right[:] = 0.5
+        valid[:] = False
+    gaze = np.full(n, "CENTER", dtype=object)
+    gaze[valid & (gaze_ratio < GAZE_LEFT_RATIO)] = "LEFT"
+    gaze[valid & (gaze_ratio > GAZE_RIGHT_RATIO)] = "RIGHT"
+
+    # 2. Brow furrow (inner brow distance / face width)
+    brow_ratio = _safe_div(np.abs(x[:, c[BROW_INNER_LEFT]] - x[:, c[BROW_INNER_RIGHT]]), face_width)
+    brow = np.clip((BROW_BASELINE - brow_ratio) * BROW_GAIN, 0.0, 1.0)
+    brow[no_width] = 0.0
+
+    # 3. Smile (mouth corner distance / face width)
+    mouth_ratio = _safe_div(np.abs(x[:, c[MOUTH_LEFT]] - x[:, c[MOUTH_RIGHT]]), face_width)
+    smile = np.where(mouth_ratio > SMILE_RATIO, SMILE_ON, SMILE_OFF)
+    smile[no_width] = 0.0
+
+    # 4. Eye aspect ratio (left eye): mean lid opening / eye width
+    top = pts[:, [c[i] for i in LEFT_EYE_TOP]]
+    bottom = pts[:, [c[i] for i in LEFT_EYE_BOTTOM]]
+    lids = np.sqrt(((top - bottom) ** 2).sum(axis=2)).sum(axis=1)
+    corners = pts[:, c[LEFT_EYE_OUTER]] - pts[:, c[LEFT_EYE_INNER]]
+    ear = _safe_div(lids, 2.0 * np.sqrt((corners ** 2).sum(axis=1)))
+
+    # 5. Head pose proxies: nose offset from the face center, normalized by face size
+    face_height = np.abs(y[:, c[CHIN]] - y[:, c[FOREHEAD]])
+    yaw = _safe_div(x[:, c[NOSE_TIP]] - (x[:, c[FACE_LEFT]] + x[:, c[FACE_RIGHT]]) / 2.0, face_width)
+    pitch = _safe_div(y[:, c[NOSE_TIP]] - (y[:, c[FOREHEAD]] + y[:, c[CHIN]]) / 2.0, face_height)
+
+    return {
+        "gaze": gaze,
+        "gaze_ratio": gaze_ratio,
+        "gaze_ratio_right": gaze_ratio_right,
+        "eye_balance": eye_balance,
+        "brow": brow,
+        "brow_ratio": brow_ratio,
+        "smile": smile,
+        "mouth_ratio": mouth_ratio,
+        "ear": ear,
+        "yaw": yaw,
+        "pitch": pitch,
+    }
+
+
+def compute_metrics(points: np.ndarray) -> dict:
+    """
+    Metrics for a single (L, 3) landmark array, as plain Python scalars.
+    """
+    has_iris = points.shape[0] > LEFT_IRIS
+    used = _USED if has_iris else _USED_NO_IRIS
+    return metrics_from_points(points[used, :2].astype(np.float64).tolist(), has_iris)
+
+
+def metrics_from_points(pts: list, has_iris: bool = True) -> dict:
+    """
+    Metrics from the [x, y] points the metrics use (_USED order), as plain Python scalars.
+    Same formulas as compute_metrics_batch with scalar math: for one face this avoids ~40
+    tiny NumPy ufunc dispatches.
+    """
+    # Unpacked in _USED order: one tuple unpack instead of a lookup per coordinate
+    ((outer_x, outer_y), (inner_x, inner_y), (iris_x, _), top_1, top_2, bottom_1, bottom_2,
+     (right_inner_x, _), (right_outer_x, _), (right_iris_x, _), (brow_left_x, _), (brow_right_x, _),
+     (left_x, _), (right_x, _), (mouth_left_x, _), (mouth_right_x, _),
+     (nose_x, nose_y), (_, top_y), (_, bottom_y)) = pts
+
+    # 1. Gaze
+    eye_width = inner_x - outer_x
+    right_width = right_outer_x - right_inner_x
+    gaze, gaze_ratio, gaze_ratio_right = "CENTER", 0.5, 0.5
+    if has_iris:
+        gaze_ratio = (iris_x - outer_x) / eye_width if eye_width else 0.0
+        gaze_ratio_right = (right_iris_x - right_inner_x) / right_width if right_width else 0.0
+        if eye_width:
+            if gaze_ratio < GAZE_LEFT_RATIO:
+                gaze = "LEFT"
+            elif gaze_ratio > GAZE_RIGHT_RATIO:
+                gaze = "RIGHT"
+    widths = abs(eye_width) + abs(right_width)
+
+    # 2. Brow / 3. Smile / 5. Yaw (all over the face width)
+    face_width = abs(left_x - right_x)
+    if face_width:
+        brow_ratio = abs(brow_left_x - brow_right_x) / face_width
+        mouth_ratio = abs(mouth_left_x - mouth_right_x) / face_width
+        brow = max(0.0, min(1.0, (BROW_BASELINE - brow_ratio) * BROW_GAIN))
+        smile = SMILE_ON if mouth_ratio > SMILE_RATIO else SMILE_OFF
+        yaw = (nose_x - (left_x + right_x) / 2.0) / face_width
+    else:
+        brow_ratio = mouth_ratio = brow = smile = yaw = 0.0
+
+    # 4. Eye aspect ratio: mean lid opening / eye width
+    dx, dy = outer_x - inner_x, outer_y - inner_y
+    corners = (dx * dx + dy * dy) ** 0.5
+    ear = 0.0
+    if corners:
+        dx, dy = top_1[0] - bottom_1[0], top_1[1] - bottom_1[1]
+        lids = (dx * dx + dy * dy) ** 0.5
+        dx, dy = top_2[0] - bottom_2[0], top_2[1] - bottom_2[1]
+        ear = (lids + (dx * dx + dy * dy) ** 0.5) / (2.0 * corners)
+
+    # 5. Pitch
+    face_height = abs(bottom_y - top_y)
+    pitch = (nose_y - (top_y + bottom_y) / 2.0) / face_height if face_height else 0.0
+
+    return {
+        "gaze": gaze,
+        "gaze_ratio": gaze_ratio,
+        "gaze_ratio_right": gaze_ratio_right,
+        "eye_balance": abs(eye_width) / widths if widths else 0.0,
+        "brow": brow,
+        "brow_ratio": brow_ratio,
+        "smile": smile,
+        "mouth_ratio": mouth_ratio,
+        "ear": ear,
+        "yaw": yaw,
+        "pitch": pitch,
+    }
@@ -0,0 +1,185 @@
+import math
+from typing import Dict, Optional
+
+from app.config import (
+    FUSION_ENABLED, FUSION_MIN_CUTOFF, FUSION_BETA, FUSION_GAZE_HYSTERESIS, FUSION_EYE_BLEND,
+    FUSION_HEAD_DEADZONE, FUSION_HEAD_GAIN, FUSION_OPEN_EAR, FUSION_CONFIRM_JUMPS,
+)
+from app.services.landmark_metrics import (
+    GAZE_LEFT_RATIO, GAZE_RIGHT_RATIO, BROW_BASELINE, BROW_GAIN, SMILE_RATIO, SMILE_NEUTRAL_RATIO, SMILE_ON, SMILE_OFF,
+)
+
+_TWO_PI = 2.0 * math.pi
+# Cutoff (Hz) of the speed estimate that opens the One-Euro filter
+_DERIVATIVE_CUTOFF = 1.0
+_GAZE_LABELS = {-1: "LEFT", 0: "CENTER", 1: "RIGHT"}
+# With jump confirmation on, a sample this far (gaze ratio in eye widths, brow / mouth ratios in
+# face widths) from both the estimate and the previous sample is unconfirmed: it weighs _OUTLIER_WEIGHT
+_GAZE_GATE = 0.1
+_RATIO_GATE = 0.04
+_OUTLIER_WEIGHT = 0.2
+
+
+def _alpha(dt: float, cutoff: float) -> float:
+    # Smoothing factor of a first-order low-pass at `cutoff` Hz for a sample `dt` seconds after the last
+    return 1.0 / (1.0 + 1.0 / (_TWO_PI * cutoff * dt))
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter (Casiez et al., 2012): a low-pass whose cutoff rises with the signal's
+    speed, so jitter is smoothed while the signal holds still and real moves come through
+    with little lag. Timestamps drive it, so irregular or low frame rates need no retuning.
+    `confidence` (0..1) scales how far a sample moves the estimate (0 = ignored).
+    At a low frame rate one sample moves the estimate most of the way; with a `gate`, a sample
+    more than `gate` away from both the estimate and the previous sample is damped: a glitched
+    frame barely moves it, a real change counts fully from its second frame (one frame late).
+    """
+    __slots__ = ("min_cutoff", "beta", "gate", "value", "derivative", "t", "last")
+
+    def __init__(self, min_cutoff: float = FUSION_MIN_CUTOFF, beta: float = FUSION_BETA, gate: float = 0.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.gate = gate
+        self.value: Optional[float] = None
+        self.derivative = 0.0
+        self.t = 0.0
+        self.last = 0.0
+
+    def __call__(self, x: float, t: float, confidence: float = 1.0) -> float:
+        if self.value is None:
+            self.value, self.t, self.last = x, t, x
+            return x
+        dt = t - self.t
+        if dt <= 0:
+            # Same timestamp (replayed packet): nothing new to filter
+            return self.value
+        self.t = t
+        if self.gate and abs(x - self.value) > self.gate and abs(x - self.last) > self.gate:
+            confidence *= _OUTLIER_WEIGHT
+        self.last = x
+        self.derivative += _alpha(dt, _DERIVATIVE_CUTOFF) * confidence * ((x - self.value) / dt - self.derivative)
+        cutoff = self.min_cutoff + self.beta * abs(self.derivative)
+        self.value += _alpha(dt, cutoff) * confidence * (x - self.value)
+        return self.value
+
+
+class _Track:
+    __slots__ = ("gaze", "brow", "mouth", "confidence", "away")
+
+    def __init__(self, min_cutoff: float, beta: float, confirm: bool):
+        gaze_gate, ratio_gate = (_GAZE_GATE, _RATIO_GATE) if confirm else (0.0, 0.0)
+        self.gaze = OneEuroFilter(min_cutoff, beta, gaze_gate)      # gaze ratio (eyes + head)
+        self.brow = OneEuroFilter(min_cutoff, beta, ratio_gate)     # brow_ratio
+        self.mouth = OneEuroFilter(min_cutoff, beta, ratio_gate)    # mouth_ratio
+        self.confidence = OneEuroFilter(min_cutoff, 0.0)
+        self.away = 0                                    # -1 LEFT, 0 CENTER, 1 RIGHT
+
+
+def smile_score(mouth_ratio: float) -> float:
+    """
+    Continuous smile score that keeps the per-frame decision at SMILE_RATIO: up to SMILE_OFF
+    below it (rising from a neutral mouth), from SMILE_ON above it (1.0 as far above as a
+    neutral mouth is below), so the rules' 0.3 / 0.5 smile cutoffs decide as before.
+    """
+    span = SMILE_RATIO - SMILE_NEUTRAL_RATIO
+    if mouth_ratio > SMILE_RATIO:
+        return min(1.0, SMILE_ON + (1.0 - SMILE_ON) * (mouth_ratio - SMILE_RATIO) / span)
+    return SMILE_OFF * max(0.0, (mouth_ratio - SMILE_NEUTRAL_RATIO) / span)
+
+
+class MetricFusion:
+    """
+    Streaming fusion stage between the landmark metrics and the rules, one track per student.
+    CVPipeline decides per frame (gaze from one eye's iris ratio in a 0.45-0.55 band, smile
+    as a 0.9 / 0.1 step), so one noisy frame flips a decision; at a low frame rate the rule
+    timers then hold that decision until the next frame. Here the gaze, brow and mouth ratios
+    are One-Euro filtered per student, blinks / squints (low eye aspect ratio) weighing less
+    (and unconfirmed jumps, with FUSION_CONFIRM_JUMPS), and the scores come from the filtered ratios:
+    - gaze: both eyes' iris ratios, each weighted by how frontal it is (FUSION_EYE_BLEND), plus
+      the head turn beyond a dead zone (FUSION_HEAD_GAIN), against the per-frame cutoffs
+      (gaze_left / gaze_right); a LEFT / RIGHT label clears FUSION_GAZE_HYSTERESIS back inside them
+    - brow: same formula; smile: continuous on each side of SMILE_RATIO (smile_score)
+    On a constant frontal face whose eyes agree the decisions are the per-frame ones; a turned
+    head reads as looking away even with the irises centered. The rules keep their inputs
+    ("gaze", "brow", "smile"); "gaze_offset" (filtered ratio - 0.5) and "confidence" are
+    added, raw ratios are kept. Frames without exactly one face reset the track.
+    """
+    def __init__(self, enabled: bool = FUSION_ENABLED, min_cutoff: float = FUSION_MIN_CUTOFF,
+                 beta: float = FUSION_BETA, hysteresis: float = FUSION_GAZE_HYSTERESIS,
+                 eye_blend: float = FUSION_EYE_BLEND, head_gain: float = FUSION_HEAD_GAIN,
+                 confirm_jumps: bool = FUSION_CONFIRM_JUMPS, gaze_left: float = GAZE_LEFT_RATIO,
+                 gaze_right: float = GAZE_RIGHT_RATIO):
+        self.enabled = enabled
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.hysteresis = hysteresis
+        self.eye_blend = eye_blend
+        self.head_gain = head_gain
+        self.confirm_jumps = confirm_jumps
+        # Per-frame gaze cutoffs (offline runs pass the ones their CVPipeline labels with)
+        self.gaze_left = gaze_left
+        self.gaze_right = gaze_right
+        self._tracks: Dict[str, _Track] = {}
+
+    def fuse(self, student_id: str, cv_result: dict, now: float) -> dict:
+        """
+        Metrics the rules should use for this frame (a new dict; cv_result is not modified).
+        `now` is the frame's time on the rule clock.
+        """
+        metrics = cv_result.get("metrics") or {}
+        if not self.enabled:
+            return metrics
+        if cv_result.get("face_count") != 1:
+            self._tracks.pop(student_id, None)
+            return metrics
+        if "gaze_ratio" not in metrics:
+            # Face count only (fallback, QUALITY_FACE_COUNT): neutral metrics, keep the track
+            return metrics
+        track = self._tracks.get(student_id)
+        if track is None:
+            track = self._tracks[student_id] = _Track(self.min_cutoff, self.beta, self.confirm_jumps)
+        fused = dict(metrics)
+
+        # 1. Gaze ratio: left eye, optionally blended with the right one and the head turn
+        ratio = metrics["gaze_ratio"]
+        if self.eye_blend:
+            weight = self.eye_blend * (1.0 - metrics.get("eye_balance", 0.5))
+            ratio += weight * (metrics.get("gaze_ratio_right", ratio) - ratio)
+        if self.head_gain:
+            yaw = metrics.get("yaw", 0.0)
+            ratio += math.copysign(max(0.0, abs(yaw) - FUSION_HEAD_DEADZONE), yaw) * self.head_gain
+        openness = min(1.0, max(0.0, metrics.get("ear", FUSION_OPEN_EAR) / FUSION_OPEN_EAR))
+        # CENTER outside the cutoffs: no usable iris this frame (zero eye width), not a measurement
+        measured = metrics.get("gaze") != "CENTER" or self.gaze_left <= metrics["gaze_ratio"] <= self.gaze_right
+        if measured:
+            ratio = track.gaze(ratio, now, openness)
+            fused["confidence"] = track.confidence(openness, now)
+
+            # 2. Hysteresis: the per-frame cutoffs leave CENTER, coming back takes a margin inside them
+            left, right = self.gaze_left, self.gaze_right
+            if track.away < 0:
+                left += self.hysteresis
+            elif track.away > 0:
+                right -= self.hysteresis
+            track.away = -1 if ratio < left else 1 if ratio > right else 0
+            fused["gaze_offset"] = ratio - 0.5
+        fused["gaze"] = _GAZE_LABELS[track.away]
+
+        # 3. Brow / smile from the filtered ratios (zero ratios: degenerate face, raw scores kept)
+        if metrics.get("brow_ratio") or metrics.get("mouth_ratio"):
+            brow_ratio = track.brow(metrics.get("brow_ratio", BROW_BASELINE), now)
+            mouth_ratio = track.mouth(metrics.get("mouth_ratio", SMILE_NEUTRAL_RATIO), now)
+            fused["brow"] = max(0.0, min(1.0, (BROW_BASELINE - brow_ratio) * BROW_GAIN))
+            fused["smile"] = smile_score(mouth_ratio)
+        return fused
+
+    def forget(self, student_id: str):
+        self._tracks.pop(student_id, None)
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+
+# Singleton
+metric_fusion = MetricFusion()
@@ -0,0 +1,158 @@
+import cv2
+import logging
+import numpy as np
+from typing import Optional, Tuple
+
+from app.config import DECODE_REDUCTION, MIN_FACE_PIXELS, ROI_PADDING
+
+logger = logging.getLogger("Preprocessing")
+
+# cv2.imdecode flags for each supported reduction factor
+_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Pixel box (x0, y0, x1, y1)
+Box = Tuple[int, int, int, int]
+
+# Change-detection thumbnails (w, h): whole frame, and the face box when one is known
+FRAME_THUMBNAIL = (32, 24)
+FACE_THUMBNAIL = (24, 24)
+
+
+def decode_flags(reduction: int) -> int:
+    return _DECODE_FLAGS.get(reduction, cv2.IMREAD_COLOR)
+
+
+class FramePreprocessor:
+    """
+    Pre-processing stage ahead of detection and mesh (one per worker process).
+    - Picks a reduced JPEG decode when the face stays large enough
+    - Converts colors once, into reusable preallocated buffers
+    - Crops the mesh input to the previous frame's padded face ROI
+    - Shrinks frames to gray thumbnails for static-frame detection
+    """
+    def __init__(self, max_reduction: int = DECODE_REDUCTION, min_face_pixels: int = MIN_FACE_PIXELS,
+                 padding: float = ROI_PADDING):
+        self.max_reduction = max_reduction if max_reduction in _DECODE_FLAGS else 1
+        self.min_face_pixels = min_face_pixels
+        self.padding = padding
+        self._buffers = {}
+
+    # --- DECODE ---
+
+    def choose_reduction(self, face_px: Optional[float]) -> int:
+        """
+        Largest reduction that keeps the last seen face at least min_face_pixels wide.
+        face_px is the face width in full-resolution pixels (None = unknown, decode full).
+        """
+        if not face_px:
+            return 1
+        reduction = 1
+        while reduction < self.max_reduction and face_px / (reduction * 2) >= self.min_face_pixels:
+            reduction *= 2
+        return reduction
+
+    # --- COLOR CONVERSION (reusable buffers) ---
+
+    def _buffer(self, name: str, shape) -> np.ndarray:
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._buffers[name] = buf
+        return buf
+
+    def to_rgb(self, frame: np.ndarray) -> np.ndarray:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._buffer("rgb", frame.shape))
+
+    def to_gray(self, frame: np.ndarray) -> np.ndarray:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray", frame.shape[:2]))
+
+    def rgb_crop(self, frame: np.ndarray, box: Box, rgb: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        RGB pixels of `box`. Copies from an already converted full frame when available,
+        otherwise converts only the cropped BGR pixels.
+        """
+        x0, y0, x1, y1 = box
+        out = self._buffer("crop", (y1 - y0, x1 - x0, 3))
+        if rgb is not None:
+            np.copyto(out, rgb[y0:y1, x0:x1])
+            return out
+        return cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2RGB, dst=out)
+
+    # --- CHANGE DETECTION ---
+
+    @staticmethod
+    def thumbnail(frame: np.ndarray, box: Optional[Box] = None) -> np.ndarray:
+        """
+        Gray thumbnail (int16, flat) of the frame, followed by one of the face box if given.
+        Area averaging cancels sensor / JPEG noise, while an iris or brow moving still
+        changes a few cells by tens of levels. Same size at any decode reduction.
+        """
+        parts = [cv2.resize(frame, FRAME_THUMBNAIL, interpolation=cv2.INTER_AREA)]
+        if box is not None:
+            x0, y0, x1, y1 = box
+            parts.append(cv2.resize(frame[y0:y1, x0:x1], FACE_THUMBNAIL, interpolation=cv2.INTER_AREA))
+        gray = [cv2.cvtColor(p, cv2.COLOR_BGR2GRAY).ravel() for p in parts]
+        return np.concatenate(gray).astype(np.int16)
+
+    # --- ROI ---
+
+    def crop_box(self, roi, w: int, h: int, current: Optional[Box] = None) -> Optional[Box]:
+        """
+        Padded pixel box around a normalized face ROI (x, y, w, h).
+        Keeps `current` while the face stays well inside it and about the same size, so the
+        tracking mesh sees a stable window instead of a new crop every frame.
+        """
+        if roi is None:
+            return None
+        rx, ry, rw, rh = roi[0] * w, roi[1] * h, roi[2] * w, roi[3] * h
+        if rw <= 0 or rh <= 0:
+            return None
+
+        if current is not None:
+            cx0, cy0, cx1, cy1 = current
+            margin_x, margin_y = rw * self.padding / 2, rh * self.padding / 2
+            inside = (rx - margin_x >= cx0 and ry - margin_y >= cy0 and
+                      rx + rw + margin_x <= cx1 and ry + rh + margin_y <= cy1)
+            expected = rw * (1 + 2 * self.padding)
+            if inside and 0.8 <= (cx1 - cx0) / expected <= 1.25:
+                return current
+
+        pad_x, pad_y = rw * self.padding, rh * self.padding
+        x0, y0 = max(0, int(rx - pad_x)), max(0, int(ry - pad_y))
+        x1, y1 = min(w, int(rx + rw + pad_x) + 1), min(h, int(ry + rh + pad_y) + 1)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        return (x0, y0, x1, y1)
+
+    @staticmethod
+    def to_frame_coords(points: np.ndarray, box: Optional[Box], w: int, h: int) -> np.ndarray:
+        """
+        Maps mesh landmarks normalized to `box` back to full-frame normalized coordinates (in place).
+        """
+        if box is None:
+            return points
+        x0, y0, x1, y1 = box
+        bw, bh = x1 - x0, y1 - y0
+        points[:, 0] = (points[:, 0] * bw + x0) / w
+        points[:, 1] = (points[:, 1] * bh + y0) / h
+        points[:, 2] *= bw / w
+        return points
+
+    @staticmethod
+    def to_frame_points(points: list, box: Optional[Box], w: int, h: int) -> list:
+        """
+        to_frame_coords for a short list of [x, y] points (plain floats, in place).
+        """
+        if box is None:
+            return points
+        x0, y0, x1, y1 = box
+        sx, sy, ox, oy = (x1 - x0) / w, (y1 - y0) / h, x0 / w, y0 / h
+        for point in points:
+            point[0] = point[0] * sx + ox
+            point[1] = point[1] * sy + oy
+        return points
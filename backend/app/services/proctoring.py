@@ -1,6 +1,8 @@
 from enum import Enum
 import logging
-import time
+
+from app.config import GAZE_CLEAR_SECONDS
+from app.utils.timers import Condition, TimerWheel, timer_wheel
 
 logger = logging.getLogger("ProctoringEngine")
 
@@ -11,39 +13,34 @@ class ProctoringAlert(Enum):
     GAZE_AWAY = "GAZE_AWAY_DETECTED"
 
 class ProctoringEngine:
-    def __init__(self):
-        self.gaze_start_time = None
+    def __init__(self, wheel: TimerWheel = timer_wheel, clear_seconds: float = GAZE_CLEAR_SECONDS):
         # Tuned: 3.0s (was 4.0s) to consistently trigger alert in demo
         self.GAZE_THRESHOLD_SECONDS = 3.0
+        # Per-student gaze-away timers on the shared wheel (an entry only while looking away)
+        self.gaze_away = Condition("gaze_away", wheel, self.GAZE_THRESHOLD_SECONDS, clear_seconds)
 
-    def evaluate(self, face_count: int, gaze_direction: str) -> ProctoringAlert:
+    def evaluate(self, student_id: str, face_count: int, gaze_direction: str, now: float = None) -> ProctoringAlert:
         """
         Evaluate frame data against strict proctoring rules.
+        `now` defaults to the wheel's clock (offline replays pass the frame timestamp).
         """
-        
         # 1. Face Count Rules (Immediate)
         if face_count == 0:
-            self.gaze_start_time = None
+            self.gaze_away.reset(student_id)
             return ProctoringAlert.NO_FACE
             
         if face_count > 1:
-            self.gaze_start_time = None
+            self.gaze_away.reset(student_id)
             return ProctoringAlert.MULTIPLE_FACES
             
-        # 2. Gaze Analysis (Persistence)
-        if gaze_direction != "CENTER":
-            if self.gaze_start_time is None:
-                self.gaze_start_time = time.time()
-                
-            # Check duration
-            duration = time.time() - self.gaze_start_time
-            if duration > self.GAZE_THRESHOLD_SECONDS:
-                return ProctoringAlert.GAZE_AWAY
-        else:
-            # Reset if they look back
-            self.gaze_start_time = None
+        # 2. Gaze Analysis (Persistence): reset as soon as they look back
+        if self.gaze_away.update(student_id, gaze_direction != "CENTER", now):
+            return ProctoringAlert.GAZE_AWAY
             
         return ProctoringAlert.CLEAN
 
+    def remove(self, student_id: str):
+        self.gaze_away.reset(student_id)
+
 # Singleton
 proctoring_engine = ProctoringEngine()
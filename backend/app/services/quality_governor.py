@@ -0,0 +1,107 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.config import QUALITY_MAX_LEVEL, QUALITY_TARGET_MS, QUALITY_STEP_SECONDS
+from app.utils.instrumentation import QUALITY_CHANGES
+
+logger = logging.getLogger("QualityGovernor")
+
+# Quality ladder (SessionState.quality_level). Every level still counts faces on every
+# frame, so NO_FACE / MULTIPLE_FACES stay exact; gaze and confusion get coarser.
+QUALITY_FULL = 0          # detection + mesh, decode reduction chosen by face size
+QUALITY_REDUCED = 1       # same, decoded at half (or quarter) resolution
+QUALITY_SPARSE = 2        # mesh every QUALITY_MESH_EVERY frames, face count (detector) in between
+QUALITY_FACE_COUNT = 3    # face count only (Haar, or the detector if no cascade); neutral metrics
+QUALITY_NAMES = ("full", "reduced", "sparse_mesh", "face_count")
+
+# Smoothing of the latency samples (weight of the newest frame)
+_ALPHA = 0.3
+# Back up one level once the smoothed latency is under this share of the target
+_RECOVER_RATIO = 0.5
+# Backlog (frames waiting per analysis slot) treated as overload / as idle
+_BACKLOG_HIGH, _BACKLOG_LOW = 2.0, 0.5
+
+
+class _Student:
+    __slots__ = ("level", "latency", "changed_at")
+
+    def __init__(self, now: float):
+        self.level = QUALITY_FULL
+        self.latency: Optional[float] = None
+        self.changed_at = now
+
+
+class QualityGovernor:
+    """
+    Load-aware analysis fidelity, per student (API process), fed by the admission controller.
+    A frame's latency runs from admission to CV result (slot wait + worker queue + decode +
+    CV). The per-student rate-limit wait is left out: it is pacing, not load.
+    Students are pinned to one worker, so the latency reflects that worker's load. The backlog
+    (frames waiting for an analysis slot) adds the global picture. A student over budget
+    steps one level down the ladder, at most once per step_seconds, and back up one level
+    when latency falls well under budget (after twice as long).
+    """
+    def __init__(self, max_level: int = QUALITY_MAX_LEVEL, target_ms: float = QUALITY_TARGET_MS,
+                 step_seconds: float = QUALITY_STEP_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.max_level = max(0, min(QUALITY_FACE_COUNT, max_level))
+        self.target = target_ms / 1000
+        self.step_seconds = step_seconds
+        self.clock = clock
+        self._students: Dict[str, _Student] = {}
+
+    def level(self, student_id: str) -> int:
+        """
+        Quality level for the student's next frame.
+        """
+        student = self._students.get(student_id)
+        return QUALITY_FULL if student is None else student.level
+
+    def observe(self, student_id: str, seconds: float, backlog: float) -> int:
+        """
+        Records one frame: seconds from admission (after the rate limit) to result (or to its
+        drop) and the backlog it saw. Returns the student's level for the next frame.
+        """
+        if not self.max_level:
+            return QUALITY_FULL
+        now = self.clock()
+        student = self._students.get(student_id)
+        if student is None:
+            student = self._students[student_id] = _Student(now)
+        latency = student.latency = seconds if student.latency is None else student.latency + _ALPHA * (seconds - student.latency)
+
+        waited = now - student.changed_at
+        if (latency > self.target or backlog >= _BACKLOG_HIGH) and student.level < self.max_level:
+            if waited >= self.step_seconds:
+                self._change(student_id, student, student.level + 1, now)
+        elif (latency < self.target * _RECOVER_RATIO and backlog <= _BACKLOG_LOW
+              and student.level > QUALITY_FULL and waited >= 2 * self.step_seconds):
+            self._change(student_id, student, student.level - 1, now)
+        return student.level
+
+    def _change(self, student_id: str, student: _Student, level: int, now: float):
+        QUALITY_CHANGES.inc("down" if level > student.level else "up")
+        logger.debug(f"{student_id}: quality {QUALITY_NAMES[student.level]} -> {QUALITY_NAMES[level]} "
+                    f"(analysis {1000 * (student.latency or 0.0):.0f} ms)")
+        student.level = level
+        student.changed_at = now
+
+    def forget(self, student_id: str):
+        if self._students.pop(student_id, None) is not None and not self._students:
+            self._students = {}
+
+    def counts(self) -> List[int]:
+        """
+        Students per level (full, reduced, sparse_mesh, face_count).
+        """
+        counts = [0] * len(QUALITY_NAMES)
+        for student in self._students.values():
+            counts[student.level] += 1
+        return counts
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+
+# Singleton
+quality_governor = QualityGovernor()
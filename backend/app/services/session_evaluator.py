@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.config import ANALYZER_SESSION_TTL_SECONDS, OFFLINE_TIMEOUT_SECONDS
+from app.services.proctoring import proctoring_engine, ProctoringAlert, ProctoringEngine
+from app.services.confusion import confusion_engine, ConfusionEngine
+from app.services.metric_fusion import metric_fusion, MetricFusion
+from app.models.session_state import StudentRecord, StudentStatus, AlertType, STATUS_CODES, ALERT_CODES
+from app.utils.instrumentation import STAGE_SECONDS, SampledLogger
+from app.utils.timers import TimerWheel, timer_wheel
+
+logger = logging.getLogger("SessionEvaluator")
+sampled = SampledLogger(logger)
+hints = SampledLogger(logger)
+
+_PROCTORING = STAGE_SECONDS.labels("proctoring")
+_CONFUSION = STAGE_SECONDS.labels("confusion")
+
+_OFFLINE = STATUS_CODES[StudentStatus.OFFLINE.value]
+
+class _Presence:
+    # Last inputs per student: what timer-driven re-evaluations run on
+    __slots__ = ("session_id", "face_count", "metrics", "quality", "last_seen", "offline")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.face_count = 0
+        self.metrics = None
+        self.quality = 0
+        self.last_seen = 0.0
+        self.offline = False
+
+
+class SessionEvaluator:
+    """
+    Turns CV output into a StudentRecord (the API layer serves it as a SessionState).
+    Shared by every ingestion path (HTTP frames, WebSocket frames, offline batch).
+    The rules run on the student's fused metrics (MetricFusion), not the frame's alone.
+    Time-based transitions run on the timer wheel instead of waiting for a frame:
+    - a gaze-away / confusion condition maturing (or clearing) between frames
+    - OFFLINE once a student's frames stop for offline_seconds
+    - eviction (rule state, store, timeline...) ttl_seconds after the last frame
+    States produced by timers go to `listeners`, evictions to `evict_listeners`.
+    Every per-student entry is dropped on eviction: memory follows the active students.
+    """
+    def __init__(self, ttl_seconds: float = ANALYZER_SESSION_TTL_SECONDS,
+                 offline_seconds: float = OFFLINE_TIMEOUT_SECONDS,
+                 proctoring: ProctoringEngine = proctoring_engine, confusion: ConfusionEngine = confusion_engine,
+                 wheel: TimerWheel = timer_wheel, fusion: MetricFusion = metric_fusion):
+        # Rule timers follow the same idle TTL as the analyzer sessions
+        self.ttl_seconds = ttl_seconds
+        self.offline_seconds = offline_seconds
+        self.proctoring = proctoring
+        self.confusion = confusion
+        self.wheel = wheel
+        self.fusion = fusion
+        self.proctoring.gaze_away.on_change = self._rule_timer
+        self.confusion.confused.on_change = self._rule_timer
+
+        self._students: Dict[str, _Presence] = {}
+        self.listeners: List[Callable[[StudentRecord], None]] = []
+        self.evict_listeners: List[Callable[[str], None]] = []
+        self._ticker: Optional[asyncio.Task] = None
+
+    # --- LIFECYCLE (live server: the wheel turns on the event loop) ---
+
+    def start(self):
+        if self._ticker is None:
+            self._ticker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            await asyncio.gather(self._ticker, return_exceptions=True)
+            self._ticker = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            try:
+                self.wheel.advance()
+            except Exception as e:
+                logger.error(f"Timer tick failed: {e}")
+
+    def __len__(self) -> int:
+        return len(self._students)
+
+    # --- FRAMES ---
+
+    def evaluate(self, student_id: str, session_id: str, cv_result: dict, now: float = None) -> StudentRecord:
+        """
+        `now` defaults to the wheel's clock (offline replays pass the frame timestamp).
+        cv_result["metrics"] is replaced by the fused metrics the rules ran on.
+        """
+        now = self.wheel.clock() if now is None else now
+        face_count = cv_result["face_count"]
+        # {gaze, brow, smile} smoothed over the student's recent frames
+        metrics = cv_result["metrics"] = self.fusion.fuse(student_id, cv_result, now)
+        quality = cv_result.get("quality", 0)
+        self._touch(student_id, session_id, face_count, metrics, now, quality)
+        return self._derive(student_id, session_id, face_count, metrics, now, quality)
+
+    def _touch(self, student_id: str, session_id: str, face_count: int, metrics: Optional[dict], now: float,
+               quality: int = 0):
+        presence = self._students.get(student_id)
+        if presence is None:
+            presence = self._students[student_id] = _Presence(session_id)
+        presence.session_id = session_id
+        presence.face_count = face_count
+        presence.metrics = metrics
+        presence.quality = quality
+        presence.last_seen = now
+        presence.offline = False
+        # One timer per student, pushed back by every frame (O(1) move on the wheel)
+        self.wheel.schedule(("presence", student_id), now + self.offline_seconds, self._went_offline)
+
+    def _derive(self, student_id: str, session_id: str, face_count: int, metrics: dict, now: float,
+                quality: int = 0) -> StudentRecord:
+        # 3. Proctoring Check (Includes Gaze)
+        started = time.perf_counter()
+        integrity_alert = self.proctoring.evaluate(student_id, face_count, metrics.get("gaze", "CENTER"), now)
+        proctored = time.perf_counter()
+        _PROCTORING.observe(proctored - started)
+
+        # 4. Engagement Analysis (Emotion/Confusion)
+        raw_emotion = self.confusion.calculate_state(metrics.get("brow", 0.0), metrics.get("smile", 0.0))
+        is_confused = self.confusion.update_state(student_id, raw_emotion, now)
+        _CONFUSION.observe(time.perf_counter() - proctored)
+
+        # 5. Final State Machine (Strict Priority)
+        current_status = StudentStatus.FOCUSED
+        current_alert = AlertType.NONE
+
+        # (1) DISTRACTED
+        if integrity_alert == ProctoringAlert.NO_FACE:
+            current_status = StudentStatus.DISTRACTED
+            current_alert = AlertType.NO_FACE
+        elif integrity_alert == ProctoringAlert.MULTIPLE_FACES:
+            current_status = StudentStatus.DISTRACTED
+            current_alert = AlertType.MULTIPLE_FACES
+
+        # (1.5) GAZE AWAY
+        elif integrity_alert == ProctoringAlert.GAZE_AWAY:
+            current_status = StudentStatus.DISTRACTED
+            current_alert = AlertType.GAZE_AWAY
+
+        # (2) CONFUSED (Sustained)
+        elif is_confused:
+             current_status = StudentStatus.CONFUSED
+
+        # (3) HAPPY / FOCUSED
+        elif raw_emotion == "HAPPY":
+             # Optional: Could have a HAPPY status, or just map to FOCUSED with high engagement
+             current_status = StudentStatus.FOCUSED
+        else:
+             current_status = StudentStatus.FOCUSED
+
+        # Define numeric score for dashboard compatibility
+        confusion_score = 70.0 if is_confused else 0.0
+
+        # Create Response Object (plain record; Pydantic only at the API boundary)
+        session_state = StudentRecord(
+            student_id,
+            session_id,
+            STATUS_CODES[current_status.value],
+            ALERT_CODES[current_alert.value],
+            face_count,
+            confusion_score,
+            self.wheel.wall_time(now),
+            quality
+        )
+
+        # detailed debug logging (sampled: one frame in LOG_SAMPLE_EVERY)
+        bs = metrics.get('brow', 0.0)
+        ss = metrics.get('smile', 0.0)
+        sampled.debug("Student %s | Gaze: %s | Brow: %.2f | Smile: %.2f | Confused: %s | Status: %s | Alert: %s",
+                      student_id, metrics.get('gaze'), bs, ss, is_confused, current_status.value, current_alert.value)
+
+        # User Feedback Hint (tuning aid, same sampling)
+        if bs > 0.15 and bs < 0.35:
+            hints.debug("ALMOST CONFUSED! Frown Harder! (Current: %.2f, Needed: >0.35)", bs)
+        if bs > 0.4 and ss > 0.3:
+            hints.debug("SMILE DETECTED! Stop Smiling to trigger Confusion. (Smile: %.2f)", ss)
+
+        return session_state
+
+    # --- TIMERS (fired by the wheel) ---
+
+    def _rule_timer(self, student_id: str, active: bool, now: float):
+        # A gaze-away / confusion condition changed between frames: re-derive from the last inputs
+        presence = self._students.get(student_id)
+        if presence is None or presence.offline or presence.metrics is None:
+            return
+        self._emit(self._derive(student_id, presence.session_id, presence.face_count, presence.metrics, now,
+                                presence.quality))
+
+    def _went_offline(self, key, now: float):
+        student_id = key[1]
+        presence = self._students.get(student_id)
+        if presence is None:
+            return
+        self._mark_offline(student_id, presence)
+        self._emit(StudentRecord(student_id, presence.session_id, _OFFLINE, face_count=0,
+                                 last_updated=self.wheel.wall_time(now)))
+
+    def _mark_offline(self, student_id: str, presence: _Presence):
+        presence.offline = True
+        self.proctoring.remove(student_id)
+        self.confusion.remove(student_id)
+        self.fusion.forget(student_id)
+        # Same timer key, second phase: eviction
+        if math.isfinite(self.ttl_seconds):
+            self.wheel.schedule(("presence", student_id), presence.last_seen + self.ttl_seconds, self._evict)
+        else:
+            self.wheel.cancel(("presence", student_id))
+
+    def _evict(self, key, now: float):
+        student_id = key[1]
+        if self._students.pop(student_id, None) is None:
+            return
+        if not self._students:
+            self._students = {}
+        self.proctoring.remove(student_id)
+        self.confusion.remove(student_id)
+        self.fusion.forget(student_id)
+        for listener in self.evict_listeners:
+            try:
+                listener(student_id)
+            except Exception as e:
+                logger.error(f"Eviction listener failed for {student_id}: {e}")
+
+    def _emit(self, state: StudentRecord):
+        for listener in self.listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                logger.error(f"State listener failed for {state.student_id}: {e}")
+
+    # --- RULE TIMERS (persistence / cross-process replication) ---
+
+    def timers(self, student_id: str) -> tuple:
+        """
+        (confusion_start, gaze_start) epoch timestamps, None when not running.
+        """
+        return tuple(None if since is None else self.wheel.wall_time(since)
+                     for since in (self.confusion.confused.since(student_id), self.proctoring.gaze_away.since(student_id)))
+
+    def restore(self, state: StudentRecord, confusion_start, gaze_start, owned: bool = True):
+        """
+        Resumes a student known from elsewhere (persistence log, another worker): rule
+        timers continue from their recorded start, presence from state.last_updated.
+        owned=False: another worker analyzes the student and runs its OFFLINE / eviction
+        timers; only the rule timers are kept here, for a frame that lands here next.
+        """
+        student_id = state.student_id
+        if not owned:
+            self._release(student_id)
+            if state.status == _OFFLINE:
+                self.proctoring.remove(student_id)
+                self.confusion.remove(student_id)
+                return
+        # Recorded in epoch time, the rule timers run on the wheel's clock
+        to_clock = self.wheel.clock_time
+        self.confusion.confused.restore(student_id, None if confusion_start is None else to_clock(confusion_start))
+        self.proctoring.gaze_away.restore(student_id, None if gaze_start is None else to_clock(gaze_start))
+        if not owned:
+            return
+        # No inputs to re-derive from until a frame arrives here
+        self._touch(student_id, state.session_id, state.face_count, None, to_clock(state.last_updated))
+        if state.status == _OFFLINE:
+            self._mark_offline(student_id, self._students[student_id])
+
+    def forget(self, student_id: str):
+        """
+        Drops a student evicted by another worker (no listener is called).
+        """
+        self._release(student_id)
+        self.proctoring.remove(student_id)
+        self.confusion.remove(student_id)
+
+    def _release(self, student_id: str):
+        # Presence (with its OFFLINE / eviction timer) and fused metrics follow the student's frames
+        if self._students.pop(student_id, None) is not None:
+            self.wheel.cancel(("presence", student_id))
+            self.fusion.forget(student_id)
+            if not self._students:
+                self._students = {}
+
+
+# Singleton
+session_evaluator = SessionEvaluator()
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import uuid
+from typing import Callable, Dict, Optional
+
+from app.config import STATE_BACKEND, STATE_BACKEND_URL, STATE_HASH, STATE_CHANNEL, STATE_SYNC_HZ
+from app.models.session_state import StudentRecord
+from app.state.session_store import SESSION_STORE
+from app.state.timeline_store import TIMELINE_STORE
+from app.services.connection_manager import manager
+from app.services.session_evaluator import session_evaluator
+
+logger = logging.getLogger("StateBackend")
+
+# Reconnect backoff bounds (seconds)
+_RETRY_MIN, _RETRY_MAX = 0.5, 5.0
+
+
+class InProcessBackend:
+    """
+    Single-process deployment: the module globals are the whole state, nothing to replicate.
+    """
+    shared = False
+    ready = True
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def publish(self, state: StudentRecord):
+        pass
+
+    def remove(self, student_id: str):
+        pass
+
+
+class SharedBackend:
+    """
+    Replicates session state across uvicorn workers through a Redis-compatible server
+    (Redis itself, or app.state.broker for a single machine).
+    - Each worker keeps serving from its own SESSION_STORE; only the worker that analyzed
+      a frame evaluates rules for it
+    - Changed students are coalesced per student (latest wins) and flushed STATE_SYNC_HZ
+      times per second: HSET into one hash (late joiners load it) + one PUBLISH per tick
+    - Every worker applies the other workers' updates to its store / timeline / rule timers
+      and marks them dirty, so its teacher sockets see every student of their rooms
+    - Only the worker that wrote a student's latest state (its owner) runs the student's
+      OFFLINE and eviction timers, so each transition is emitted once. A frame landing on
+      another worker moves the ownership there. A student whose owner stops without
+      evicting it is dropped locally (nothing emitted) ttl seconds after its last update
+    """
+    shared = True
+
+    def __init__(self, client_factory: Callable[[], object], hash_name: str = STATE_HASH,
+                 channel: str = STATE_CHANNEL, hz: float = STATE_SYNC_HZ,
+                 before_connect: Optional[Callable] = None, store=SESSION_STORE, timeline=TIMELINE_STORE,
+                 evaluator=session_evaluator, connections=manager):
+        self.client_factory = client_factory
+        self.hash_name = hash_name
+        self.channel = channel
+        self.interval = 1.0 / hz
+        # Called before every (re)connect, e.g. to host the local broker if nobody does
+        self.before_connect = before_connect
+        self.store = store
+        self.timeline = timeline
+        self.evaluator = evaluator
+        self.connections = connections
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._client = None
+        self._pending: Dict[str, Optional[dict]] = {}
+        # Students another worker owns -> that worker's origin
+        self._owners: Dict[str, str] = {}
+        self._tasks = []
+        self._connected = asyncio.Event()
+        self.stats = {"published": 0, "applied": 0, "reconnects": 0}
+
+    # --- LIFECYCLE ---
+
+    @property
+    def ready(self) -> bool:
+        # Connected, subscribed and the other workers' students loaded
+        return self._connected.is_set()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._run())]
+        # Serve with the other workers' students already loaded when the broker is reachable
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            logger.warning("State backend not reachable yet, retrying in the background")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            try:
+                await self._flush()
+            except Exception:
+                pass
+            await self._client.aclose()
+            self._client = None
+
+    # --- HOT PATH (event loop, never awaits) ---
+
+    def publish(self, state: StudentRecord):
+        # Analyzed (or timed out) here: this worker owns the student now
+        if self._owners.pop(state.student_id, None) is not None:
+            self.evaluator.wheel.cancel(("remote", state.student_id))
+        self._pending[state.student_id] = self._entry(state)
+
+    def remove(self, student_id: str):
+        self._pending[student_id] = None
+
+    def _entry(self, state: StudentRecord) -> dict:
+        confusion_start, gaze_start = self.evaluator.timers(state.student_id)
+        return {"state": state.to_dict(), "confusion_start": confusion_start, "gaze_start": gaze_start,
+                "owner": self._owners.get(state.student_id, self.origin)}
+
+    # --- OUTBOUND ---
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._pending and self._connected.is_set():
+                try:
+                    await self._flush()
+                except Exception as e:
+                    logger.error(f"State sync failed: {e}")
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        updated = {s: json.dumps(e) for s, e in pending.items() if e is not None}
+        removed = [s for s, e in pending.items() if e is None]
+        try:
+            if updated:
+                await self._client.hset(self.hash_name, mapping=updated)
+            if removed:
+                await self._client.hdel(self.hash_name, *removed)
+            # Entries are already serialized: embed them as strings, receivers decode once
+            await self._client.publish(self.channel, json.dumps(
+                {"origin": self.origin, "entries": updated, "removed": removed}))
+        except Exception:
+            # Keep the batch for the next tick (newer entries recorded meanwhile win)
+            self._pending = {**pending, **self._pending}
+            raise
+        self.stats["published"] += len(pending)
+
+    # --- INBOUND ---
+
+    async def _listen(self):
+        delay = _RETRY_MIN
+        while True:
+            pubsub = None
+            try:
+                if self.before_connect is not None:
+                    await self.before_connect()
+                if self._client is None:
+                    self._client = self.client_factory()
+                pubsub = self._client.pubsub()
+                # 1. Subscribe first, then load the hash: nothing falls between the two
+                await pubsub.subscribe(self.channel)
+                known = self._load(await self._client.hgetall(self.hash_name))
+                # 2. Re-send what the hash lacks (the broker may have restarted empty)
+                self._republish(known)
+                self._connected.set()
+                delay = _RETRY_MIN
+                # 3. Apply the other workers' ticks
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply(json.loads(message["data"]))
+                raise ConnectionError("State backend subscription ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"State backend connection lost ({e!r}), retrying in {delay:.1f}s")
+                self._connected.clear()
+                self.stats["reconnects"] += 1
+                if self._client is not None:
+                    await self._close_quietly(self._client)
+                    self._client = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _RETRY_MAX)
+            finally:
+                if pubsub is not None:
+                    await self._close_quietly(pubsub)
+
+    async def _close_quietly(self, closable):
+        try:
+            await closable.aclose()
+        except Exception:
+            pass
+
+    def _republish(self, known: Dict[str, float]):
+        # Every worker holds the replicated state: any of them can refill the hash
+        for state in self.store.values():
+            if known.get(state.student_id, -1.0) < state.last_updated:
+                self._pending.setdefault(state.student_id, self._entry(state))
+
+    def _load(self, table: Dict[str, str]) -> Dict[str, float]:
+        known = {}
+        for student_id, payload in table.items():
+            entry = json.loads(payload)
+            self._apply_entry(entry)
+            known[student_id] = entry["state"]["last_updated"]
+        return known
+
+    def _apply(self, message: dict):
+        if message.get("origin") == self.origin:
+            return
+        for payload in message.get("entries", {}).values():
+            self._apply_entry(json.loads(payload))
+        for student_id in message.get("removed", ()):
+            self._drop(student_id)
+
+    def _apply_entry(self, entry: dict):
+        state = StudentRecord.from_dict(entry["state"])
+        current = self.store.get(state.student_id)
+        # Frames of one student can land on several workers (POST path): newest state wins
+        if current is not None and current.last_updated >= state.last_updated:
+            return
+        moved_from = self.store.put(state)
+        self.timeline.record(state)
+        # The next frame of this student may be analyzed here: continue its rule timers.
+        # Presence (OFFLINE, eviction) stays with the owner
+        owner = entry.get("owner")
+        owned = owner == self.origin
+        if owned:
+            self._owners.pop(state.student_id, None)
+        else:
+            self._owners[state.student_id] = owner
+        self.evaluator.restore(state, entry["confusion_start"], entry["gaze_start"], owned=owned)
+        if not owned and math.isfinite(self.evaluator.ttl_seconds):
+            wheel = self.evaluator.wheel
+            wheel.schedule(("remote", state.student_id), wheel.clock_time(state.last_updated) + self.evaluator.ttl_seconds,
+                           self._expire)
+        self.connections.mark_dirty(state.session_id, state.student_id)
+        if moved_from is not None:
+            self.connections.mark_dirty(moved_from, state.student_id)
+        self.stats["applied"] += 1
+
+    def _expire(self, key, now: float):
+        # The owner stopped without evicting the student (its removal never came)
+        self._drop(key[1])
+
+    def _drop(self, student_id: str):
+        # Evicted by its owner: local copies only, nothing is published or emitted
+        self._owners.pop(student_id, None)
+        self.evaluator.wheel.cancel(("remote", student_id))
+        self.evaluator.forget(student_id)
+        room = self.store.room_of(student_id)
+        self.store.remove(student_id)
+        self.timeline.remove(student_id)
+        if room is not None:
+            self.connections.mark_dirty(room, student_id)
+
+
+def create_backend(kind: str = STATE_BACKEND, url: str = STATE_BACKEND_URL):
+    if kind == "memory":
+        return InProcessBackend()
+    if kind == "broker":
+        from app.state.broker import LocalBrokerClient, ensure_broker
+        hosted = []
+
+        async def host_if_missing():
+            # The first worker to find no broker hosts it; it lives as long as that worker
+            if not hosted:
+                broker = await ensure_broker(url)
+                if broker is not None:
+                    hosted.append(broker)
+
+        return SharedBackend(lambda: LocalBrokerClient(url), before_connect=host_if_missing)
+    if kind == "redis":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("STATE_BACKEND=redis requires the 'redis' package (pip install redis)")
+        return SharedBackend(lambda: redis.from_url(url, decode_responses=True))
+    raise ValueError(f"Unknown STATE_BACKEND {kind!r} (expected memory, broker or redis)")
+
+
+# Global instance (STATE_BACKEND selects the implementation)
+state_backend = create_backend()
@@ -0,0 +1,264 @@
+"""
+Local state broker: a Redis stand-in for multi-worker deployments on one machine.
+
+Speaks line-delimited JSON over TCP and implements the small Redis subset the state
+backend uses (HSET / HGETALL / HDEL / PUBLISH / SUBSCRIBE). LocalBrokerClient mirrors the
+redis.asyncio API for that subset, so either can sit behind SharedBackend.
+
+Run standalone (recommended with uvicorn --workers N):
+    python -m app.state.broker [--host 127.0.0.1] [--port 6390]
+Otherwise the first worker that cannot reach the broker hosts it in its own event loop.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+from typing import Dict, Optional, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger("StateBroker")
+
+# Subscribers with more unsent bytes than this are disconnected (they resync on reconnect)
+MAX_SUBSCRIBER_BUFFER = 8 * 1024 * 1024
+
+
+def parse_url(url: str):
+    parsed = urlparse(url)
+    return parsed.hostname or "127.0.0.1", parsed.port or 6390
+
+
+class LocalBroker:
+    """
+    Requests: {"id": n, "cmd": "HSET" | "HGETALL" | "HDEL" | "PUBLISH" | "SUBSCRIBE" | "UNSUBSCRIBE" | "PING", "args": [...]}
+    Replies:  {"id": n, "result": ...}
+    Pushes:   {"push": ["message", channel, data]} on connections that subscribed
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 6390):
+        self.host, self.port = host, port
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port, limit=2 ** 24)
+        # Port 0 binds a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"State broker listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        channels: Set[str] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                result = self._execute(request.get("cmd", "").upper(), request.get("args", []), writer, channels)
+                writer.write(json.dumps({"id": request.get("id"), "result": result}).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.debug(f"Broker connection closed: {e!r}")
+        finally:
+            for channel in channels:
+                self._subscribers.get(channel, set()).discard(writer)
+            writer.close()
+
+    def _execute(self, cmd: str, args: list, writer: asyncio.StreamWriter, channels: Set[str]):
+        if cmd == "HSET":
+            name, mapping = args[0], args[1]
+            table = self._hashes.setdefault(name, {})
+            added = sum(1 for key in mapping if key not in table)
+            table.update(mapping)
+            return added
+        if cmd == "HGETALL":
+            return dict(self._hashes.get(args[0], {}))
+        if cmd == "HDEL":
+            table = self._hashes.get(args[0], {})
+            return sum(1 for key in args[1:] if table.pop(key, None) is not None)
+        if cmd == "PUBLISH":
+            return self._publish(args[0], args[1])
+        if cmd == "SUBSCRIBE":
+            for channel in args:
+                self._subscribers.setdefault(channel, set()).add(writer)
+                channels.add(channel)
+            return len(channels)
+        if cmd == "UNSUBSCRIBE":
+            for channel in args or list(channels):
+                self._subscribers.get(channel, set()).discard(writer)
+                channels.discard(channel)
+            return len(channels)
+        if cmd == "PING":
+            return "PONG"
+        return {"error": f"unknown command {cmd}"}
+
+    def _publish(self, channel: str, data: str) -> int:
+        subscribers = self._subscribers.get(channel)
+        if not subscribers:
+            return 0
+        # Serialized once for every subscriber
+        message = json.dumps({"push": ["message", channel, data]}).encode() + b"\n"
+        for writer in list(subscribers):
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                logger.warning("Dropping lagging broker subscriber")
+                subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(message)
+        return len(subscribers)
+
+
+class _Connection:
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=2 ** 24)
+
+    async def send(self, request: dict):
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+
+    async def receive(self) -> dict:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("State broker closed the connection")
+        return json.loads(line)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+
+class LocalPubSub:
+    """
+    Same shape as redis.asyncio PubSub: subscribe(), listen() yielding
+    {"type": "subscribe" | "message", "channel": ..., "data": ...}, aclose().
+    """
+    def __init__(self, host: str, port: int):
+        self._conn = _Connection(host, port)
+        self._ids = itertools.count(1)
+
+    async def subscribe(self, *channels: str):
+        if self._conn.writer is None:
+            await self._conn.open()
+        await self._conn.send({"id": next(self._ids), "cmd": "SUBSCRIBE", "args": list(channels)})
+
+    async def listen(self):
+        while True:
+            message = await self._conn.receive()
+            if "push" in message:
+                kind, channel, data = message["push"]
+                yield {"type": kind, "channel": channel, "data": data}
+            else:
+                yield {"type": "subscribe", "channel": None, "data": message.get("result")}
+
+    async def aclose(self):
+        await self._conn.close()
+
+
+class LocalBrokerClient:
+    """
+    redis.asyncio-compatible client for the commands SharedBackend uses
+    (string values, like Redis with decode_responses=True).
+    """
+    def __init__(self, url: str):
+        self.host, self.port = parse_url(url)
+        self._conn = _Connection(self.host, self.port)
+        self._lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+
+    async def _call(self, cmd: str, *args):
+        async with self._lock:
+            if self._conn.writer is None:
+                await self._conn.open()
+            try:
+                await self._conn.send({"id": next(self._ids), "cmd": cmd, "args": list(args)})
+                reply = await self._conn.receive()
+            except Exception:
+                await self._conn.close()
+                raise
+        result = reply.get("result")
+        if isinstance(result, dict) and "error" in result and cmd != "HGETALL":
+            raise RuntimeError(result["error"])
+        return result
+
+    async def ping(self):
+        return await self._call("PING")
+
+    async def hset(self, name: str, key: Optional[str] = None, value: Optional[str] = None, mapping: Optional[dict] = None):
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        return await self._call("HSET", name, items)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        return await self._call("HGETALL", name)
+
+    async def hdel(self, name: str, *keys: str):
+        return await self._call("HDEL", name, *keys)
+
+    async def publish(self, channel: str, message: str):
+        return await self._call("PUBLISH", channel, message)
+
+    def pubsub(self) -> LocalPubSub:
+        return LocalPubSub(self.host, self.port)
+
+    async def aclose(self):
+        await self._conn.close()
+
+
+async def ensure_broker(url: str) -> Optional[LocalBroker]:
+    """
+    Makes sure a broker answers at `url`. Hosts one in this event loop if nobody does;
+    when several workers race, exactly one bind succeeds and the others connect to it.
+    Returns the hosted broker (None if another process hosts it).
+    """
+    host, port = parse_url(url)
+    client = LocalBrokerClient(url)
+    try:
+        await client.ping()
+        return None
+    except OSError:
+        pass
+    finally:
+        await client.aclose()
+
+    broker = LocalBroker(host, port)
+    try:
+        await broker.start()
+        return broker
+    except OSError:
+        # Another worker won the bind
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        broker = LocalBroker(args.host, args.port)
+        await broker.start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import json
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import SUMMARY_BUCKET_SECONDS
+from app.models.session_state import ALERT_NAMES, STATUS_NAMES, StudentRecord
+from app.state.session_store import SESSION_STORE
+
+# Sliding windows reported next to the current counts: label -> seconds
+SUMMARY_WINDOWS = {"1m": 60, "5m": 300, "15m": 900}
+ALERT_NONE = ALERT_NAMES.index("NONE")
+
+
+class RoomSummary:
+    """
+    Class-level aggregates of one room, updated by status / alert transitions only.
+    `counts` / `alerts` hold how many students are in each status / alert right now.
+    The history is a ring of time buckets: student-seconds spent in each status and
+    alert onsets. Time between two transitions is credited to the buckets it spans when
+    the next transition (or a read) arrives, so a transition costs O(1) whatever the
+    room size, and a read sums a fixed number of buckets.
+    """
+    __slots__ = ("bucket_seconds", "counts", "alerts", "seconds", "onsets", "bucket_ids",
+                 "last_time", "students", "version", "empty_since", "_json")
+
+    def __init__(self, now: float, bucket_seconds: float = SUMMARY_BUCKET_SECONDS,
+                 horizon: float = max(SUMMARY_WINDOWS.values())):
+        buckets = int(math.ceil(horizon / bucket_seconds)) + 1
+        self.bucket_seconds = bucket_seconds
+        self.counts = np.zeros(len(STATUS_NAMES), dtype=np.int64)
+        self.alerts = np.zeros(len(ALERT_NAMES), dtype=np.int64)
+        self.seconds = np.zeros((buckets, len(STATUS_NAMES)), dtype=np.float64)
+        self.onsets = np.zeros((buckets, len(ALERT_NAMES)), dtype=np.int64)
+        # Absolute bucket number held by each ring row (-1 = never used)
+        self.bucket_ids = np.full(buckets, -1, dtype=np.int64)
+        self.last_time = now
+        self.students = 0
+        self.version = 0
+        self.empty_since: Optional[float] = now
+        self._json = None   # (version, bucket, JSON object)
+
+    def _row(self, bucket: int) -> int:
+        row = bucket % len(self.bucket_ids)
+        if self.bucket_ids[row] != bucket:
+            # Recycled row: whatever it held is older than the longest window
+            self.bucket_ids[row] = bucket
+            self.seconds[row] = 0.0
+            self.onsets[row] = 0
+        return row
+
+    def advance(self, now: float):
+        """
+        Credits the time since the last call to the current counts.
+        """
+        t = self.last_time
+        if now <= t:
+            return
+        self.last_time = now
+        if not self.students:
+            return
+        # After a long gap only the span the ring can hold matters
+        t = max(t, now - len(self.bucket_ids) * self.bucket_seconds)
+        while t < now:
+            bucket = int(t // self.bucket_seconds)
+            end = min(now, (bucket + 1) * self.bucket_seconds)
+            self.seconds[self._row(bucket)] += self.counts * (end - t)
+            t = end
+
+    def enter(self, state: StudentRecord, onset: bool):
+        self.counts[state.status] += 1
+        self.alerts[state.alert] += 1
+        self.students += 1
+        if onset and state.alert != ALERT_NONE:
+            self.onsets[self._row(int(self.last_time // self.bucket_seconds)), state.alert] += 1
+        self.empty_since = None
+        self.version += 1
+
+    def leave(self, state: StudentRecord):
+        self.counts[state.status] -= 1
+        self.alerts[state.alert] -= 1
+        self.students -= 1
+        if not self.students:
+            self.empty_since = self.last_time
+        self.version += 1
+
+    def summary(self, session_id: str, now: float) -> str:
+        """
+        JSON object of the room's aggregates. Cached until the next transition or bucket.
+        """
+        self.advance(now)
+        current = int(now // self.bucket_seconds)
+        if self._json is not None and self._json[0] == self.version and self._json[1] == current:
+            return self._json[2]
+
+        windows = {}
+        for label, seconds in SUMMARY_WINDOWS.items():
+            # Buckets overlapping the window (to bucket resolution)
+            rows = self.bucket_ids > current - int(math.ceil(seconds / self.bucket_seconds))
+            windows[label] = {
+                "status": _percent(self.seconds[rows].sum(axis=0)),
+                "alerts": _named(ALERT_NAMES, self.onsets[rows].sum(axis=0), skip=ALERT_NONE),
+            }
+        body = json.dumps({
+            "session_id": session_id,
+            "students": self.students,
+            "status": _percent(self.counts),
+            "counts": _named(STATUS_NAMES, self.counts),
+            "alerts": _named(ALERT_NAMES, self.alerts, skip=ALERT_NONE),
+            "windows": windows,
+        })
+        self._json = (self.version, current, body)
+        return body
+
+
+def _named(names: List[str], values, skip: Optional[int] = None) -> Dict[str, int]:
+    return {name: int(value) for code, (name, value) in enumerate(zip(names, values)) if code != skip}
+
+
+def _percent(values) -> Dict[str, float]:
+    total = float(values.sum())
+    if total <= 0:
+        return {name: 0.0 for name in STATUS_NAMES}
+    return {name: round(float(value) * 100 / total, 1) for name, value in zip(STATUS_NAMES, values)}
+
+
+class ClassSummaryStore:
+    """
+    RoomSummary per session_id, fed by SessionStore.listeners: every put / remove of the
+    store (frames, timers, replication, restore) goes through apply(). Frames that change
+    neither status, alert nor room return after one comparison.
+    Emptied rooms are kept for the longest window, then dropped by an amortized sweep.
+    """
+    def __init__(self, bucket_seconds: float = SUMMARY_BUCKET_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.bucket_seconds = bucket_seconds
+        self.clock = clock
+        self.horizon = max(SUMMARY_WINDOWS.values())
+        self._rooms: Dict[str, RoomSummary] = {}
+        self._last_sweep = clock()
+
+    def apply(self, previous: Optional[StudentRecord], current: Optional[StudentRecord]):
+        if (previous is not None and current is not None and previous.status == current.status
+                and previous.alert == current.alert and previous.session_id == current.session_id):
+            return
+        now = self.clock()
+        same_room = previous is not None and current is not None and previous.session_id == current.session_id
+
+        # 1. Leave the previous status / room
+        if previous is not None:
+            room = self._rooms.get(previous.session_id)
+            if room is not None:
+                room.advance(now)
+                room.leave(previous)
+
+        # 2. Enter the new one (an alert counts as an onset unless it was already raised here)
+        if current is not None:
+            room = self._rooms.get(current.session_id)
+            if room is None:
+                room = self._rooms[current.session_id] = RoomSummary(now, self.bucket_seconds, self.horizon)
+            room.advance(now)
+            room.enter(current, onset=not (same_room and previous.alert == current.alert))
+
+        if now - self._last_sweep >= self.bucket_seconds:
+            self._sweep(now)
+
+    def _sweep(self, now: float):
+        self._last_sweep = now
+        expired = [session_id for session_id, room in self._rooms.items()
+                   if room.empty_since is not None and now - room.empty_since > self.horizon]
+        for session_id in expired:
+            del self._rooms[session_id]
+
+    def to_json(self, session_id: str, empty: bool = False) -> Optional[str]:
+        """
+        The room's summary as a JSON object. An unknown (or long empty) room gives None,
+        or an all-zero summary with `empty` (never stored: session_id comes from the client).
+        """
+        room = self._rooms.get(session_id)
+        if room is None:
+            if not empty:
+                return None
+            room = RoomSummary(self.clock(), self.bucket_seconds, self.horizon)
+        return room.summary(session_id, self.clock())
+
+    def room_ids(self) -> List[str]:
+        return list(self._rooms)
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+
+# Global class summaries, maintained from the session store's writes
+SUMMARY_STORE = ClassSummaryStore()
+SESSION_STORE.listeners.append(SUMMARY_STORE.apply)
@@ -0,0 +1,228 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+from app.config import (
+    PERSISTENCE_PATH, PERSISTENCE_COMMIT_MS, PERSISTENCE_SNAPSHOT_EVENTS, PERSISTENCE_SNAPSHOT_SECONDS,
+)
+from app.models.session_state import StudentRecord
+from app.state.session_store import SESSION_STORE
+from app.services.session_evaluator import session_evaluator
+
+logger = logging.getLogger("Persistence")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY,
+    student_id TEXT NOT NULL,
+    payload TEXT            -- NULL = student removed
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    last_seq INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    payload BLOB NOT NULL   -- zlib(JSON {student_id: entry})
+);
+"""
+
+
+def _key(state: StudentRecord, confusion_start, gaze_start) -> tuple:
+    # What makes a new event worth writing (last_updated alone does not)
+    return (state.session_id, state.status, state.alert,
+            state.face_count, confusion_start, gaze_start)
+
+
+class StatePersistence:
+    """
+    Optional durability for the session store and the rule timers (confusion / gaze-away).
+    - Hot path (`record`) only compares against the last written key and parks the entry
+      in a per-student pending slot: no I/O, repeated changes within a commit interval coalesce
+    - A writer thread group-commits pending entries into a SQLite WAL event log
+    - Periodic compact snapshots truncate the log, so recovery = latest snapshot + short log tail
+    """
+    def __init__(self, path: str = PERSISTENCE_PATH, commit_ms: float = PERSISTENCE_COMMIT_MS,
+                 snapshot_events: int = PERSISTENCE_SNAPSHOT_EVENTS,
+                 snapshot_seconds: float = PERSISTENCE_SNAPSHOT_SECONDS, store=SESSION_STORE,
+                 evaluator=session_evaluator):
+        self.path = path
+        self.enabled = bool(path)
+        self.commit_interval = commit_ms / 1000.0
+        self.snapshot_events = snapshot_events
+        self.snapshot_seconds = snapshot_seconds
+        self.store = store
+        self.evaluator = evaluator
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Optional[dict]] = {}
+        self._last_key: Dict[str, tuple] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._final_snapshot = True
+        self._conn: Optional[sqlite3.Connection] = None
+
+        # Writer-thread view of everything committed so far (what a snapshot contains)
+        self._mirror: Dict[str, dict] = {}
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._last_snapshot = time.time()
+        self.stats = {"recorded": 0, "events": 0, "commits": 0, "snapshots": 0}
+
+    # --- LIFECYCLE ---
+
+    def open(self) -> dict:
+        """
+        Opens the log, restores store + timers from snapshot and log tail, starts the writer.
+        Returns recovery stats.
+        """
+        started = time.perf_counter()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+        replayed = self._load()
+        self._restore()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+        self._thread.start()
+
+        recovery = {"students": len(self._mirror), "replayed": replayed,
+                    "seconds": round(time.perf_counter() - started, 4)}
+        logger.info(f"Persistence recovered {recovery['students']} students "
+                    f"({replayed} log events) in {recovery['seconds']}s from {self.path}")
+        return recovery
+
+    def close(self, snapshot: bool = True):
+        """
+        Final commit (+ snapshot unless snapshot=False) on the writer thread, then closes the log.
+        """
+        if self._thread:
+            self._final_snapshot = snapshot
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    # --- HOT PATH (event loop) ---
+
+    def record(self, state: StudentRecord):
+        if self._thread is None:
+            return
+        student_id = state.student_id
+        confusion_start, gaze_start = self.evaluator.timers(student_id)
+
+        key = _key(state, confusion_start, gaze_start)
+        if self._last_key.get(student_id) == key:
+            return
+        self._last_key[student_id] = key
+
+        entry = {"state": state.to_dict(), "confusion_start": confusion_start, "gaze_start": gaze_start}
+        with self._lock:
+            self._pending[student_id] = entry
+        self.stats["recorded"] += 1
+
+    def remove(self, student_id: str):
+        if self._thread is None:
+            return
+        self._last_key.pop(student_id, None)
+        with self._lock:
+            self._pending[student_id] = None
+
+    # --- WRITER THREAD ---
+
+    def _run(self):
+        while not self._stop.wait(self.commit_interval):
+            self._safely(self._commit)
+            if (self._seq - self._snapshot_seq >= self.snapshot_events or
+                    (self._seq > self._snapshot_seq and time.time() - self._last_snapshot >= self.snapshot_seconds)):
+                self._safely(self._snapshot)
+        self._safely(self._commit)
+        if self._final_snapshot and self._seq > self._snapshot_seq:
+            self._safely(self._snapshot)
+
+    def _safely(self, step):
+        try:
+            step()
+        except Exception as e:
+            logger.error(f"Persistence {step.__name__} failed: {e}")
+
+    def _commit(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        rows = []
+        for i, (student_id, entry) in enumerate(pending.items(), start=self._seq + 1):
+            payload = None if entry is None else json.dumps(entry)
+            rows.append((i, student_id, payload))
+
+        # Group commit: one transaction (one WAL fsync point) for the whole batch
+        try:
+            with self._conn:
+                self._conn.executemany("INSERT INTO events (seq, student_id, payload) VALUES (?, ?, ?)", rows)
+        except sqlite3.Error:
+            # Keep the batch for the next attempt (newer entries recorded meanwhile win)
+            with self._lock:
+                self._pending = {**pending, **self._pending}
+            raise
+        self._seq += len(rows)
+
+        for student_id, entry in pending.items():
+            if entry is None:
+                self._mirror.pop(student_id, None)
+            else:
+                self._mirror[student_id] = entry
+        self.stats["events"] += len(rows)
+        self.stats["commits"] += 1
+
+    def _snapshot(self):
+        payload = zlib.compress(json.dumps(self._mirror).encode())
+        with self._conn:
+            self._conn.execute("INSERT INTO snapshots (last_seq, created, payload) VALUES (?, ?, ?)",
+                               (self._seq, time.time(), payload))
+            # Everything up to last_seq now lives in the snapshot
+            self._conn.execute("DELETE FROM events WHERE seq <= ?", (self._seq,))
+            self._conn.execute("DELETE FROM snapshots WHERE last_seq < ?", (self._seq,))
+        # Fold the WAL back into the database file so it does not grow between snapshots
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._snapshot_seq = self._seq
+        self._last_snapshot = time.time()
+        self.stats["snapshots"] += 1
+
+    # --- RECOVERY ---
+
+    def _load(self) -> int:
+        row = self._conn.execute("SELECT last_seq, payload FROM snapshots ORDER BY last_seq DESC LIMIT 1").fetchone()
+        if row:
+            self._snapshot_seq = row[0]
+            self._mirror = json.loads(zlib.decompress(row[1]))
+        self._seq = self._snapshot_seq
+
+        replayed = 0
+        for seq, student_id, payload in self._conn.execute(
+                "SELECT seq, student_id, payload FROM events WHERE seq > ? ORDER BY seq", (self._snapshot_seq,)):
+            if payload is None:
+                self._mirror.pop(student_id, None)
+            else:
+                self._mirror[student_id] = json.loads(payload)
+            self._seq = seq
+            replayed += 1
+        return replayed
+
+    def _restore(self):
+        for student_id, entry in self._mirror.items():
+            state = StudentRecord.from_dict(entry["state"])
+            self.store.put(state)
+            self.evaluator.restore(state, entry["confusion_start"], entry["gaze_start"])
+            self._last_key[student_id] = _key(state, entry["confusion_start"], entry["gaze_start"])
+
+
+# Global instance (enabled when PERSISTENCE_PATH is set)
+persistence = StatePersistence()
@@ -1,5 +1,165 @@
-from typing import Dict
-from app.models.session_state import SessionState
+import os
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import STORE_TOMBSTONES
+from app.models.session_state import StudentRecord
+
+
+class SessionStore:
+    """
+    In-memory session store partitioned by session_id (one room per class).
+    Keeps a student_id -> session_id index so lookups by student stay O(1).
+    Every change bumps `version` (and the room's version); snapshot() returns the
+    pre-encoded JSON list, rebuilt only on the first read after a change, and changes()
+    the students changed / removed since a version the client already has.
+    Versions restart with the process: `epoch` tells clients which counter they hold.
+    `listeners` are called with (previous, new) on put and (previous, None) on remove.
+    """
+    def __init__(self, tombstones: int = STORE_TOMBSTONES):
+        self._rooms: Dict[str, Dict[str, StudentRecord]] = {}
+        self._student_room: Dict[str, str] = {}
+        self.epoch = os.urandom(4).hex()
+        self.version = 0
+        self._room_versions: Dict[str, int] = {}
+        # student_id -> version of its last put
+        self._student_versions: Dict[str, int] = {}
+        # (version, student_id, session_id) of students that left a room, oldest first
+        self._tombstones = deque()
+        self._tombstone_limit = max(1, tombstones)
+        # Deltas from before this version can no longer be answered (tombstones dropped)
+        self._horizon = 0
+        # session_id (None = every room) -> (version, JSON list)
+        self._snapshots: Dict[Optional[str], Tuple[int, str]] = {}
+        self.listeners: List[Callable[[Optional[StudentRecord], Optional[StudentRecord]], None]] = []
+
+    def put(self, state: StudentRecord) -> Optional[str]:
+        """
+        Inserts/updates a student's state.
+        Returns the previous session_id if the student moved rooms, else None.
+        """
+        previous_room = self._student_room.get(state.student_id)
+        previous = None if previous_room is None else self._rooms[previous_room].get(state.student_id)
+        moved_from = None
+        if previous_room is not None and previous_room != state.session_id:
+            self._remove_from_room(previous_room, state.student_id)
+            moved_from = previous_room
+
+        self._rooms.setdefault(state.session_id, {})[state.student_id] = state
+        self._student_room[state.student_id] = state.session_id
+        self._changed(state.session_id)
+        self._student_versions[state.student_id] = self.version
+        for listener in self.listeners:
+            listener(previous, state)
+        return moved_from
+
+    def remove(self, student_id: str) -> Optional[StudentRecord]:
+        room = self._student_room.pop(student_id, None)
+        if room is None:
+            return None
+        self._student_versions.pop(student_id, None)
+        state = self._remove_from_room(room, student_id)
+        if state is not None:
+            for listener in self.listeners:
+                listener(state, None)
+        return state
+
+    def _remove_from_room(self, session_id: str, student_id: str) -> Optional[StudentRecord]:
+        room = self._rooms.get(session_id)
+        if room is None:
+            return None
+        state = room.pop(student_id, None)
+        self._changed(session_id)
+        self._tombstones.append((self.version, student_id, session_id))
+        if len(self._tombstones) > self._tombstone_limit:
+            self._horizon, _, dropped_room = self._tombstones.popleft()
+            # An emptied room keeps its version (for deltas / ETags) until its last tombstone goes
+            if dropped_room not in self._rooms and self._room_versions.get(dropped_room) == self._horizon:
+                del self._room_versions[dropped_room]
+        if not room:
+            del self._rooms[session_id]
+            self._snapshots.pop(session_id, None)
+        return state
+
+    def _changed(self, session_id: str):
+        self.version += 1
+        self._room_versions[session_id] = self.version
+
+    def room_version(self, session_id: str) -> int:
+        """
+        Version of the room's last change (0 if the session is unknown or long gone).
+        """
+        return self._room_versions.get(session_id, 0)
+
+    def snapshot(self, session_id: Optional[str] = None) -> Tuple[int, str]:
+        """
+        (version, JSON list of the room's states, or of every state if session_id is None).
+        Records cache their own encoding, so a rebuild re-encodes only the changed students.
+        """
+        if session_id is not None and session_id not in self._rooms:
+            # Empty / unknown rooms are not cached (session_id comes from the client)
+            return self._room_versions.get(session_id, 0), "[]"
+        version = self.version if session_id is None else self._room_versions[session_id]
+        cached = self._snapshots.get(session_id)
+        if cached is None or cached[0] != version:
+            states = self.values() if session_id is None else self.room(session_id).values()
+            cached = self._snapshots[session_id] = (version, "[" + ", ".join(s.to_json() for s in states) + "]")
+        return cached
+
+    def changes(self, since: int, session_id: Optional[str] = None) -> Tuple[int, bool, str, List[str]]:
+        """
+        (version, full, JSON list of the students changed after `since`, removed student_ids)
+        for one room, or every room if session_id is None. `full` means `since` is too old
+        (or from another counter) and the list is the whole snapshot.
+        """
+        version = self.version if session_id is None else self._room_versions.get(session_id, 0)
+        if since < self._horizon or since > self.version:
+            return version, True, self.snapshot(session_id)[1], []
+        if since >= version:
+            return version, False, "[]", []
+
+        states = self.values() if session_id is None else self.room(session_id).values()
+        changed = ", ".join(s.to_json() for s in states if self._student_versions[s.student_id] > since)
+        removed = []
+        # Newest first: stop at the first tombstone the client already saw
+        for tomb_version, student_id, room in reversed(self._tombstones):
+            if tomb_version <= since:
+                break
+            if (session_id is None or room == session_id) and self.room_of(student_id) != (session_id or room):
+                removed.append(student_id)
+        if session_id is None:
+            # A student that moved between rooms is still listed: not removed from the whole store
+            removed = [s for s in removed if s not in self._student_room]
+        return version, False, "[" + changed + "]", list(dict.fromkeys(removed))
+
+    def get(self, student_id: str) -> Optional[StudentRecord]:
+        room = self._student_room.get(student_id)
+        if room is None:
+            return None
+        return self._rooms[room].get(student_id)
+
+    def room(self, session_id: str) -> Dict[str, StudentRecord]:
+        """
+        Read-only view of one room (empty if the session is unknown).
+        """
+        return self._rooms.get(session_id, {})
+
+    def room_ids(self) -> List[str]:
+        return list(self._rooms)
+
+    def room_of(self, student_id: str) -> Optional[str]:
+        return self._student_room.get(student_id)
+
+    def values(self) -> Iterator[StudentRecord]:
+        for room in self._rooms.values():
+            yield from room.values()
+
+    def __contains__(self, student_id: str) -> bool:
+        return student_id in self._student_room
+
+    def __len__(self) -> int:
+        return len(self._student_room)
+
 
 # Global in-memory session store (shared across routes)
-SESSION_STORE: Dict[str, SessionState] = {}
+SESSION_STORE = SessionStore()
@@ -0,0 +1,146 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.config import TIMELINE_CAPACITY, TIMELINE_SAMPLE_SECONDS
+from app.models.session_state import StudentRecord
+
+
+class StudentTimeline:
+    """
+    Fixed-capacity ring buffer of one student's history (struct-of-arrays).
+    Rows are kept in time order (a record older than the newest row is dropped), so a
+    `since` query is a binary search plus a copy of the returned rows.
+    Memory: capacity * 16 bytes, allocated once.
+    """
+    __slots__ = ("capacity", "ts", "status", "alert", "face_count", "confusion",
+                 "head", "size", "last_key", "last_sample")
+
+    def __init__(self, capacity: int = TIMELINE_CAPACITY):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.status = np.zeros(capacity, dtype=np.int8)
+        self.alert = np.zeros(capacity, dtype=np.int8)
+        self.face_count = np.zeros(capacity, dtype=np.int16)
+        self.confusion = np.zeros(capacity, dtype=np.float32)
+        self.head = 0       # next write position
+        self.size = 0
+        self.last_key = None
+        self.last_sample = 0.0
+
+    def record(self, state: StudentRecord, sample_seconds: float = TIMELINE_SAMPLE_SECONDS) -> bool:
+        """
+        Appends a row on a state transition or when the periodic sample is due.
+        Returns True if a row was written.
+        """
+        key = (state.status, state.alert, state.face_count)
+        ts = state.last_updated
+        if key == self.last_key and ts - self.last_sample < sample_seconds:
+            return False
+        # Late (another worker's older state, a wall-clock step): the ring stays sorted
+        if self.size and ts < self.last_sample:
+            return False
+
+        i = self.head
+        self.ts[i] = ts
+        self.status[i] = state.status
+        self.alert[i] = state.alert
+        self.face_count[i] = state.face_count
+        self.confusion[i] = state.confusion_score
+
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.last_key = key
+        self.last_sample = ts
+        return True
+
+    def query(self, since: float = 0.0) -> dict:
+        """
+        Rows with timestamp > since, oldest first, as columns.
+        """
+        start = (self.head - self.size) % self.capacity
+        # The ring is at most two time-ordered segments: [start:end1] then [0:end2]
+        if start + self.size <= self.capacity:
+            segments = [(start, start + self.size)]
+        else:
+            segments = [(start, self.capacity), (0, self.head)]
+
+        parts = []
+        for lo, hi in segments:
+            first = lo + int(np.searchsorted(self.ts[lo:hi], since, side="right"))
+            if first < hi:
+                parts.append(slice(first, hi))
+
+        def column(arr):
+            if not parts:
+                return []
+            return np.concatenate([arr[p] for p in parts]).tolist()
+
+        return {
+            "t": column(self.ts),
+            "status": column(self.status),
+            "alert": column(self.alert),
+            "face_count": column(self.face_count),
+            "confusion_score": column(self.confusion),
+        }
+
+
+class TimelineStore:
+    """
+    student_id -> StudentTimeline, indexed by the session_id the student last reported.
+    Rows are recorded from the publish path.
+    """
+    def __init__(self, capacity: int = TIMELINE_CAPACITY, sample_seconds: float = TIMELINE_SAMPLE_SECONDS):
+        self.capacity = capacity
+        self.sample_seconds = sample_seconds
+        self._timelines: Dict[str, StudentTimeline] = {}
+        self._rooms: Dict[str, Dict[str, StudentTimeline]] = {}
+        self._student_room: Dict[str, str] = {}
+
+    def record(self, state: StudentRecord) -> bool:
+        timeline = self._timelines.get(state.student_id)
+        if timeline is None:
+            timeline = self._timelines[state.student_id] = StudentTimeline(self.capacity)
+
+        previous_room = self._student_room.get(state.student_id)
+        if previous_room != state.session_id:
+            if previous_room is not None:
+                self._leave(previous_room, state.student_id)
+            self._rooms.setdefault(state.session_id, {})[state.student_id] = timeline
+            self._student_room[state.student_id] = state.session_id
+
+        return timeline.record(state, self.sample_seconds)
+
+    def get(self, student_id: str) -> Optional[StudentTimeline]:
+        return self._timelines.get(student_id)
+
+    def query(self, session_id: str, since: float = 0.0) -> Dict[str, dict]:
+        """
+        Columns per student of one room, rows newer than `since`. Students without new rows are omitted.
+        """
+        result = {}
+        for student_id, timeline in self._rooms.get(session_id, {}).items():
+            columns = timeline.query(since)
+            if columns["t"]:
+                result[student_id] = columns
+        return result
+
+    def remove(self, student_id: str):
+        self._timelines.pop(student_id, None)
+        room = self._student_room.pop(student_id, None)
+        if room is not None:
+            self._leave(room, student_id)
+
+    def _leave(self, session_id: str, student_id: str):
+        room = self._rooms.get(session_id)
+        if room is not None:
+            room.pop(student_id, None)
+            if not room:
+                del self._rooms[session_id]
+
+    def __len__(self) -> int:
+        return len(self._timelines)
+
+
+# Global instance (shared across routes)
+TIMELINE_STORE = TimelineStore()
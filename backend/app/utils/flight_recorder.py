@@ -0,0 +1,183 @@
+import io
+import json
+import math
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import FLIGHT_RECORDER_FRAMES
+from app.models.session_state import StudentRecord, STATUS_NAMES, ALERT_NAMES
+
+# Code tables of the integer columns
+OUTCOME_NAMES = ("PROCESSED", "COALESCED", "DROPPED", "INVALID")
+SOURCE_NAMES = ("frames", "landmarks")
+SOURCE_FRAMES, SOURCE_LANDMARKS = 0, 1
+GAZE_NAMES = ("CENTER", "LEFT", "RIGHT", "UP", "DOWN")
+_OUTCOME_CODES = {name: code for code, name in enumerate(OUTCOME_NAMES)}
+_GAZE_CODES = {name: code for code, name in enumerate(GAZE_NAMES)}
+_NAMES = {"outcome": OUTCOME_NAMES, "source": SOURCE_NAMES, "gaze": GAZE_NAMES,
+          "status": STATUS_NAMES, "alert": ALERT_NAMES}
+
+_NAN = float("nan")
+# Integer columns of frames that were not analyzed (coalesced / dropped): no face count, decision...
+ABSENT = 255
+_OPTIONAL = {"face_count", "quality", "gaze", "status", "alert"}
+# Metrics (raw ratios; gaze / brow / smile as fused for the rules) and worker stage timings (missing = NaN)
+_METRICS = ("gaze_ratio", "brow_ratio", "mouth_ratio", "brow", "smile", "ear", "yaw", "pitch")
+_STAGES = ("decode", "static_check", "detection", "mesh", "metrics", "analysis")
+# .npz key prefix of the per-student arrays
+_STUDENT_KEY = "s/"
+
+# One row per frame (88 bytes). Times in ms, float32; NaN where a stage did not run.
+FLIGHT_DTYPE = np.dtype([
+    ("t", "<f8"),               # wall clock when recorded (s since epoch)
+    ("seq", "<u4"),             # client sequence number (0 over HTTP)
+    ("outcome", "u1"), ("source", "u1"),
+    ("face_count", "u1"), ("quality", "u1"), ("static", "u1"),
+    ("gaze", "u1"), ("status", "u1"), ("alert", "u1"),   # codes into the tables above (ABSENT = none)
+    ("confusion", "<f4"),
+    *((name, "<f4") for name in _METRICS),
+    ("wait_ms", "<f4"),         # admission: enqueue -> analysis start (or -> coalesced / dropped)
+    *((f"{stage}_ms", "<f4") for stage in _STAGES),      # analysis_ms: engine round trip
+    ("request_ms", "<f4"),      # packet received -> state published
+])
+
+
+class FlightRing:
+    """
+    Preallocated ring of a student's last frames (one structured array).
+    """
+    __slots__ = ("session_id", "rows", "head", "size")
+
+    def __init__(self, session_id: str, capacity: int):
+        self.session_id = session_id
+        self.rows = np.zeros(capacity, dtype=FLIGHT_DTYPE)
+        self.head = 0
+        self.size = 0
+
+    def ordered(self) -> np.ndarray:
+        """
+        Copy of the recorded rows, oldest first.
+        """
+        if self.size < len(self.rows):
+            return self.rows[:self.size].copy()
+        return np.concatenate((self.rows[self.head:], self.rows[:self.head]))
+
+
+class FlightRecorder:
+    """
+    Always-on per-frame flight recorder for latency outliers and wrong decisions
+    (a false GAZE_AWAY, a spike): each student keeps a fixed ring of its last
+    FLIGHT_RECORDER_FRAMES frames with stage timings, queue wait, raw metrics and the
+    rule outcome, so nothing has to be logged per frame. A record is one tuple store
+    into the ring (a few microseconds); memory is capacity * 88 bytes per student,
+    allocated on its first frame and released when it is evicted.
+    Dumped on demand by GET /admin/flight-recorder (NDJSON or .npz).
+    """
+    def __init__(self, capacity: int = FLIGHT_RECORDER_FRAMES):
+        self.capacity = max(0, capacity)
+        self._rings: Dict[str, FlightRing] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def record(self, student_id: str, session_id: str, seq: int, outcome: str, source: int,
+               wait: float, cv_result: Optional[dict] = None, state: Optional[StudentRecord] = None,
+               request: float = _NAN):
+        if not self.capacity:
+            return
+        ring = self._rings.get(student_id)
+        if ring is None:
+            ring = self._rings[student_id] = FlightRing(session_id, self.capacity)
+        ring.session_id = session_id
+
+        if cv_result:
+            metrics, timings = cv_result["metrics"], cv_result["timings"]
+            frame = (cv_result["face_count"], cv_result.get("quality", 0), cv_result.get("static", False),
+                     _GAZE_CODES.get(metrics.get("gaze"), 0))
+        else:
+            metrics, timings, frame = {}, {}, (ABSENT, ABSENT, 0, ABSENT)
+        decision = (ABSENT, ABSENT, _NAN) if state is None else (state.status, state.alert, state.confusion_score)
+
+        ring.rows[ring.head] = (
+            time.time(), seq, _OUTCOME_CODES[outcome], source, *frame, *decision,
+            *(metrics.get(name, _NAN) for name in _METRICS),
+            wait * 1000, *(timings.get(stage, _NAN) * 1000 for stage in _STAGES), request * 1000,
+        )
+        ring.head = (ring.head + 1) % self.capacity
+        ring.size = min(ring.size + 1, self.capacity)
+
+    def snapshot(self, student_id: Optional[str] = None,
+                 session_id: Optional[str] = None) -> List[Tuple[str, str, np.ndarray]]:
+        """
+        (student_id, session_id, rows oldest first) per matching student, copied so the
+        dump can be serialized while frames keep being recorded.
+        """
+        if student_id is not None:
+            ring = self._rings.get(student_id)
+            rings = [] if ring is None else [(student_id, ring)]
+        else:
+            rings = [(s, r) for s, r in self._rings.items() if session_id is None or r.session_id == session_id]
+        return [(s, r.session_id, r.ordered()) for s, r in rings]
+
+    def forget(self, student_id: str):
+        self._rings.pop(student_id, None)
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+
+def to_ndjson(snapshot: List[Tuple[str, str, np.ndarray]]) -> Iterator[str]:
+    """
+    One JSON object per frame; codes as names, NaN / ABSENT as null.
+    """
+    fields = FLIGHT_DTYPE.names
+    for student_id, session_id, rows in snapshot:
+        prefix = '{"student_id": %s, "session_id": %s, ' % (json.dumps(student_id), json.dumps(session_id))
+        for row in rows.tolist():
+            values = {}
+            for name, value in zip(fields, row):
+                if name in _OPTIONAL and value == ABSENT:
+                    value = None
+                elif name in _NAMES:
+                    value = _NAMES[name][value]
+                elif name == "static":
+                    value = bool(value)
+                elif isinstance(value, float) and math.isnan(value):
+                    value = None
+                values[name] = value
+            yield prefix + json.dumps(values)[1:] + "\n"
+
+
+def to_npz(snapshot: List[Tuple[str, str, np.ndarray]]) -> bytes:
+    """
+    NumPy archive: one structured array per student under "s/<student_id>", plus "_sessions"
+    (JSON student_id -> session_id) and "_tables" (JSON code tables of the integer columns).
+    The prefix keeps student ids out of the metadata keys; from_npz reads it back.
+    """
+    arrays = {_STUDENT_KEY + student_id: rows for student_id, _, rows in snapshot}
+    arrays["_sessions"] = np.array(json.dumps({student_id: session_id for student_id, session_id, _ in snapshot}))
+    arrays["_tables"] = np.array(json.dumps(_NAMES))
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def from_npz(data: bytes) -> List[Tuple[str, str, np.ndarray]]:
+    """
+    The (student_id, session_id, rows) snapshot a to_npz archive holds.
+    """
+    with np.load(io.BytesIO(data)) as archive:
+        sessions = json.loads(archive["_sessions"].item())
+        snapshot = []
+        for key in archive.files:
+            if key.startswith(_STUDENT_KEY):
+                student_id = key[len(_STUDENT_KEY):]
+                snapshot.append((student_id, sessions[student_id], archive[key]))
+    return snapshot
+
+
+# Singleton
+flight_recorder = FlightRecorder()
@@ -0,0 +1,154 @@
+import bisect
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from app.config import LOG_SAMPLE_EVERY
+
+# Latency buckets (seconds): sub-millisecond kernels up to multi-second stalls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Hot paths keep the child returned by labels(...) and call
+    observe(): one bisect and three additions, no locks (event loop only).
+    """
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.bounds = tuple(buckets)
+        self._children: Dict[tuple, _HistogramChild] = {}
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.bounds)
+        return child
+
+    def observe(self, value: float, *values: str):
+        self.labels(*values).observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {child.sum}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {child.count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *values: str, amount: float = 1):
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {value}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read at scrape time from a callback, so connection counts and queue depths
+    cost nothing on the hot path.
+    """
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        self.name, self.help, self.fn = name, help, fn
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, fn))
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format (0.0.4).
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class SampledLogger:
+    """
+    Debug logging for per-frame events: emits one call out of `every`, and formats the
+    message only when it is emitted (lazy %-style args).
+    """
+    def __init__(self, logger: logging.Logger, every: int = LOG_SAMPLE_EVERY):
+        self.logger = logger
+        self.every = max(1, every)
+        self._calls = 0
+
+    def debug(self, msg: str, *args):
+        self._calls += 1
+        if self._calls % self.every == 0 and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(msg, *args)
+
+
+# Global registry, exposed at /metrics
+registry = Registry()
+
+# --- HOT PATH METRICS ---
+STAGE_SECONDS = registry.histogram(
+    "smartsession_stage_seconds", "Latency of each frame processing stage", ("stage",))
+FRAMES = registry.counter(
+    "smartsession_frames_total", "Frames by outcome (processed, coalesced, dropped, invalid, failed)", ("outcome",))
+FALLBACK_FRAMES = registry.counter(
+    "smartsession_fallback_frames_total", "Frames analyzed by the OpenCV Haar fallback instead of MediaPipe")
+QUALITY_CHANGES = registry.counter(
+    "smartsession_quality_changes_total", "Per-student analysis quality level changes (down = coarser)", ("direction",))
+STATIC_FRAMES = registry.counter(
+    "smartsession_static_frames_total", "Unchanged frames answered with the previous analysis (detection + mesh skipped)")
+BROADCAST_MESSAGES = registry.counter(
+    "smartsession_broadcast_messages_total", "Messages queued for teachers by type (delta, resync)", ("type",))
@@ -1,4 +1,275 @@
-# Utility functions for time-based logic.
-# TODO: Track continuous conditions (e.g., gaze away).
-# TODO: Reset timers when conditions change.
-# TODO: Provide reusable time-window helpers.
+# Utility classes for time-based logic: a hierarchical timer wheel and persistent
+# (min-duration / hysteresis) conditions built on it.
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+from app.config import TIMER_TICK_SECONDS
+
+
+class ManualClock:
+    """
+    Injectable clock for replays and benchmarks: returns the last time set.
+    """
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def set(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _Timer:
+    __slots__ = ("key", "tick", "callback", "slot")
+
+    def __init__(self, key, tick, callback):
+        self.key, self.tick, self.callback = key, tick, callback
+        self.slot = None
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel (Varghese & Lauck). Level 0 has one slot per tick; each
+    higher level covers a whole turn of the level below. A timer sits in the level whose
+    range covers its delay and is cascaded down as the wheel turns.
+    - schedule / reschedule / cancel: O(1) (slots are dicts keyed by timer key)
+    - advance: O(1) amortized per expiry; idle ticks cost one slot lookup
+    Timers fire at or up to one tick after their deadline. One timer per key: scheduling
+    an existing key moves it (the per-frame "push the deadline back" pattern).
+    The live wheel runs on time.monotonic, so wall-clock steps (NTP, DST) neither fire nor
+    hold back timers; wall_time / clock_time convert at the edges (records, persistence).
+    """
+    def __init__(self, tick: float = TIMER_TICK_SECONDS, bits=(8, 6, 6, 6),
+                 clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self._bits = bits
+        self._shifts = [sum(bits[:i]) for i in range(len(bits))]
+        self._levels = [[{} for _ in range(1 << b)] for b in bits]
+        self._timers: Dict[Hashable, _Timer] = {}
+        self._now_tick = int(clock() / tick)
+        self._advancing = False
+
+    def schedule(self, key: Hashable, deadline: float, callback: Callable[[Hashable, float], None]):
+        """
+        Calls callback(key, now) once `deadline` (clock time) has passed.
+        """
+        tick = max(-int(-deadline // self.tick), self._now_tick + 1)
+        timer = self._timers.get(key)
+        if timer is None:
+            timer = self._timers[key] = _Timer(key, tick, callback)
+        else:
+            timer.callback = callback
+            if timer.tick == tick:
+                return
+            del timer.slot[key]
+            timer.tick = tick
+        self._place(timer)
+
+    def cancel(self, key: Hashable) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        del timer.slot[key]
+        if not self._timers:
+            self._compact()
+        return True
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def wall_time(self, t: float) -> float:
+        """
+        Epoch seconds of clock time `t` (unchanged unless the clock is time.monotonic).
+        """
+        if self.clock is time.monotonic:
+            return t + (time.time() - time.monotonic())
+        return t
+
+    def clock_time(self, wall: float) -> float:
+        """
+        Clock time of epoch seconds `wall` (inverse of wall_time).
+        """
+        if self.clock is time.monotonic:
+            return wall - (time.time() - time.monotonic())
+        return wall
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def _compact(self):
+        # Emptied dicts keep their peak capacity: drop them so memory follows the live timers
+        self._timers = {}
+        self._levels = [[{} for _ in range(1 << b)] for b in self._bits]
+
+    def _place(self, timer: _Timer):
+        delay = timer.tick - self._now_tick
+        last = len(self._bits) - 1
+        for level, (bits, shift) in enumerate(zip(self._bits, self._shifts)):
+            if delay < (1 << (shift + bits)) or level == last:
+                if level == last and delay >= (1 << (shift + bits)):
+                    # Beyond the wheel's horizon: park in the farthest slot, re-placed on cascade
+                    index = ((self._now_tick >> shift) - 1) & ((1 << bits) - 1)
+                else:
+                    index = (timer.tick >> shift) & ((1 << bits) - 1)
+                slot = self._levels[level][index]
+                slot[timer.key] = timer
+                timer.slot = slot
+                return
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """
+        Turns the wheel up to `now` (default: clock) and fires every expired timer.
+        Returns the number fired. Callbacks may schedule or cancel timers.
+        """
+        if self._advancing:
+            return 0
+        target = int((self.clock() if now is None else now) / self.tick)
+        fired = 0
+        self._advancing = True
+        try:
+            if not self._timers:
+                self._now_tick = max(self._now_tick, target)
+                return 0
+            while self._now_tick < target:
+                self._now_tick += 1
+                tick = self._now_tick
+                # 1. Cascade: when a level wraps, redistribute the next level's current slot
+                for level in range(1, len(self._bits)):
+                    below = self._shifts[level]
+                    if tick & ((1 << below) - 1):
+                        break
+                    index = (tick >> below) & ((1 << self._bits[level]) - 1)
+                    slot = self._levels[level][index]
+                    if slot:
+                        self._levels[level][index] = {}
+                        for timer in slot.values():
+                            self._place(timer)
+                # 2. Fire this tick's slot
+                slot = self._levels[0][tick & ((1 << self._bits[0]) - 1)]
+                if slot:
+                    due = list(slot.values())
+                    slot.clear()
+                    for timer in due:
+                        del self._timers[timer.key]
+                    now_time = tick * self.tick
+                    for timer in due:
+                        timer.callback(timer.key, now_time)
+                        fired += 1
+                if not self._timers:
+                    self._now_tick = target
+                    self._compact()
+        finally:
+            self._advancing = False
+        return fired
+
+
+class _ConditionState:
+    __slots__ = ("since", "active", "clear_since")
+
+    def __init__(self):
+        self.since = None        # start of the current run of `True` updates
+        self.active = False
+        self.clear_since = None  # start of the current run of `False` updates while active
+
+
+class Condition:
+    """
+    Per-key persistent condition: becomes active once it has held for `on_seconds`
+    (min-duration) and inactive once it has been clear for `off_seconds` (hysteresis,
+    0 = immediately). A pending condition resets on the first clear update.
+    update() answers synchronously from the update time; the wheel only fires the
+    transitions that happen between updates (on_change(key, active, now)).
+    """
+    def __init__(self, name: str, wheel: TimerWheel, on_seconds: float, off_seconds: float = 0.0,
+                 on_change: Optional[Callable[[Hashable, bool, float], None]] = None):
+        self.name = name
+        self.wheel = wheel
+        self.on_seconds = on_seconds
+        self.off_seconds = off_seconds
+        self.on_change = on_change
+        self._states: Dict[Hashable, _ConditionState] = {}
+
+    def update(self, key: Hashable, value: bool, now: Optional[float] = None) -> bool:
+        now = self.wheel.clock() if now is None else now
+        state = self._states.get(key)
+        if state is None:
+            if not value:
+                return False
+            state = self._states[key] = _ConditionState()
+
+        if value:
+            state.clear_since = None
+            if state.since is None:
+                state.since = now
+            if not state.active:
+                if now - state.since >= self.on_seconds:
+                    state.active = True
+                    self.wheel.cancel((self.name, key))
+                else:
+                    self.wheel.schedule((self.name, key), state.since + self.on_seconds, self._fire)
+            elif self.off_seconds > 0:
+                self.wheel.cancel((self.name, key))
+            return state.active
+
+        if state.active and self.off_seconds > 0:
+            if state.clear_since is None:
+                state.clear_since = now
+            if now - state.clear_since < self.off_seconds:
+                self.wheel.schedule((self.name, key), state.clear_since + self.off_seconds, self._fire)
+                return True
+        # Cleared: nothing left to remember for this key
+        self.reset(key)
+        return False
+
+    def _fire(self, wheel_key, now: float):
+        key = wheel_key[1]
+        state = self._states.get(key)
+        if state is None:
+            return
+        if not state.active and state.since is not None:
+            # Held for on_seconds without a frame in between
+            state.active = True
+        elif state.active and state.clear_since is not None:
+            # Clear for off_seconds
+            self.reset(key)
+            state.active = False
+        else:
+            return
+        if self.on_change is not None:
+            self.on_change(key, state.active, now)
+
+    def active(self, key: Hashable) -> bool:
+        state = self._states.get(key)
+        return state is not None and state.active
+
+    def since(self, key: Hashable) -> Optional[float]:
+        """
+        When the current run started (None if the condition is clear).
+        """
+        state = self._states.get(key)
+        return None if state is None else state.since
+
+    def restore(self, key: Hashable, since: Optional[float], now: Optional[float] = None):
+        """
+        Resumes a run that started at `since` (persistence / other workers).
+        """
+        self.reset(key)
+        if since is not None:
+            self._states[key] = _ConditionState()
+            self._states[key].since = since
+            self.update(key, True, now)
+
+    def reset(self, key: Hashable):
+        if self._states.pop(key, None) is not None:
+            self.wheel.cancel((self.name, key))
+            if not self._states:
+                self._states = {}
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+# Global wheel shared by the rule engines and the student presence timers
+timer_wheel = TimerWheel()
@@ -0,0 +1,126 @@
+"""
+Benchmark: fixed client capture vs the server-negotiated capture profile.
+
+Run from backend/:
+    python -m benchmarks.bench_capture [--seconds 120] [--zoom 1.6] [--noise 3]
+
+One student on a simulated clock: attentive most of the time, with a gaze-away, an empty
+seat and a second face at fixed times. The "fixed" client sends 640 px JPEGs (quality 0.6)
+every 200 ms, as the browser did before; the "negotiated" client follows the profile
+CaptureAdvisor returns with each state (width, quality, interval). `zoom` crops the
+scenario frames around the face (a student close to the camera has a larger face).
+Frames are decoded and analyzed in-process; the rules run on the capture timestamps.
+Reports frames, bytes, decode and CV time, and how long each event took to be flagged.
+"""
+import argparse
+import logging
+import time
+
+import cv2
+import numpy as np
+
+from app.services.capture_profile import CaptureAdvisor
+from app.services.cv_pipeline import CVPipeline
+from app.services.frame_receiver import frame_receiver
+from app.services.session_evaluator import SessionEvaluator
+from benchmarks.frames import default_face, render_scenarios
+
+FIXED = {"interval_ms": 200, "width": 640, "quality": 0.6}
+# (start, seconds, scenario, alert expected)
+EVENTS = ((40, 6, "gaze_away", "GAZE_AWAY"), (75, 5, "no_face", "NO_FACE"), (100, 4, "multi_face", "MULTIPLE_FACES"))
+
+
+def scenario_at(t: float) -> str:
+    for start, length, name, _ in EVENTS:
+        if start <= t < start + length:
+            return name
+    return "one_face"
+
+
+def zoomed(image: np.ndarray, zoom: float) -> np.ndarray:
+    if zoom <= 1:
+        return image
+    h, w = image.shape[:2]
+    ch, cw = int(h / zoom), int(w / zoom)
+    y, x = (h - ch) // 2, (w - cw) // 2
+    return cv2.resize(image[y:y + ch, x:x + cw], (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def run(images, seconds: float, noise: float, negotiated: bool, label: str):
+    rng = np.random.default_rng(7)
+    pipeline = CVPipeline()
+    evaluator = SessionEvaluator()
+    clock = [0.0]
+    advisor = CaptureAdvisor(governor=None, enabled=True, clock=lambda: clock[0])
+    profile = dict(FIXED)
+    stats = {"frames": 0, "bytes": 0, "decode": 0.0, "cv": 0.0, "flagged": {}}
+
+    t = 0.0
+    while t < seconds:
+        clock[0] = t
+        name = scenario_at(t)
+        # 1. Client: capture at the profile's width and quality
+        image = images[name]
+        width = min(profile["width"], image.shape[1])
+        if width != image.shape[1]:
+            image = cv2.resize(image, (width, image.shape[0] * width // image.shape[1]), interpolation=cv2.INTER_AREA)
+        noisy = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+        _, jpeg = cv2.imencode(".jpg", noisy, [cv2.IMWRITE_JPEG_QUALITY, int(profile["quality"] * 100)])
+        packet = jpeg.tobytes()
+
+        # 2. Server: decode + analyze + rules
+        started = time.perf_counter()
+        frame = frame_receiver.decode_bytes(packet, 0, pipeline.decode_reduction(label))
+        decoded = time.perf_counter()
+        result = pipeline.process_frame(frame, label, 1)
+        stats["cv"] += time.perf_counter() - decoded
+        stats["decode"] += decoded - started
+        state = evaluator.evaluate(label, "ROOM", result, now=t)
+        stats["frames"] += 1
+        stats["bytes"] += len(packet)
+
+        for start, length, _, alert in EVENTS:
+            if start <= t < start + length + 5 and state.alert_name == alert and alert not in stats["flagged"]:
+                stats["flagged"][alert] = t - start
+
+        # 3. Next capture
+        if negotiated:
+            profile = advisor.advise(label, {"interval_ms": 0}, state, result)
+        t += profile["interval_ms"] / 1000
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=120.0)
+    parser.add_argument("--zoom", type=float, default=1.6, help="crop factor around the face (1 = as rendered)")
+    parser.add_argument("--noise", type=float, default=3.0, help="sensor noise (gray levels, std)")
+    parser.add_argument("--face", help="base portrait (default: matplotlib sample portrait)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    face = args.face or default_face()
+    if not face:
+        raise SystemExit("No base portrait: pass --face (or install matplotlib for its sample portrait)")
+    images = {name: zoomed(image, args.zoom) for name, image in render_scenarios(face).items()}
+
+    print(f"{args.seconds:g}s, zoom {args.zoom:g}, events: "
+          + ", ".join(f"{name} at {start}s for {length}s" for start, length, name, _ in EVENTS) + "\n")
+    print(f"{'client':<11} {'frames':>7} {'KiB':>8} {'decode ms':>10} {'cv ms':>9}   time to flag (s)")
+    results = {}
+    for label, negotiated in (("fixed", False), ("negotiated", True)):
+        stats = results[label] = run(images, args.seconds, args.noise, negotiated, label)
+        flagged = ", ".join(f"{alert} {stats['flagged'][alert]:.1f}" if alert in stats["flagged"] else f"{alert} missed"
+                            for *_, alert in EVENTS)
+        print(f"{label:<11} {stats['frames']:>7} {stats['bytes'] / 1024:>8.0f} {stats['decode'] * 1000:>10.0f} "
+              f"{stats['cv'] * 1000:>9.0f}   {flagged}")
+
+    fixed, negotiated = results["fixed"], results["negotiated"]
+    print(f"\nIngest bytes -{1 - negotiated['bytes'] / fixed['bytes']:.0%}, "
+          f"decode + CV time -{1 - (negotiated['decode'] + negotiated['cv']) / (fixed['decode'] + fixed['cv']):.0%}")
+    if len(negotiated["flagged"]) < len(fixed["flagged"]):
+        raise SystemExit("FAIL: the negotiated profile missed an event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: cost of the flight recorder per frame, against logging the same fields.
+
+Run from backend/:
+    python -m benchmarks.bench_flight [--students 30] [--frames 2000] [--capacity 256]
+
+Each frame records a full row (CV result + rule decision) for one of `students` students,
+as the frame routes do. The comparison is one INFO log line per frame with the same
+metrics to a null handler, i.e. what raising the log verbosity cost before. Also dumps
+the rings as NDJSON and .npz and reports their sizes.
+"""
+import argparse
+import logging
+import time
+
+from app.models.session_state import StudentRecord
+from app.utils.flight_recorder import FlightRecorder, SOURCE_FRAMES, FLIGHT_DTYPE, to_ndjson, to_npz
+
+CV_RESULT = {
+    "face_count": 1, "quality": 0, "static": False,
+    "metrics": {"gaze": "CENTER", "gaze_ratio": 0.47, "brow_ratio": 0.2, "mouth_ratio": 0.48, "brow": 0.96,
+                "smile": 0.9, "ear": 0.3, "yaw": 0.04, "pitch": 0.06},
+    "timings": {"decode": 0.002, "static_check": 0.0006, "detection": 0.004, "mesh": 0.006, "metrics": 0.0002,
+                "analysis": 0.014},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=2000, help="frames per student")
+    parser.add_argument("--capacity", type=int, default=256, help="frames kept per student")
+    args = parser.parse_args()
+
+    states = [StudentRecord(f"S{i}", "ROOM", 0, 0) for i in range(args.students)]
+    total = args.students * args.frames
+
+    recorder = FlightRecorder(args.capacity)
+    started = time.perf_counter()
+    for seq in range(args.frames):
+        for state in states:
+            recorder.record(state.student_id, "ROOM", seq, "PROCESSED", SOURCE_FRAMES, 0.001, CV_RESULT, state, 0.02)
+    recorded = time.perf_counter() - started
+
+    logger = logging.getLogger("bench_flight")
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    metrics, timings = CV_RESULT["metrics"], CV_RESULT["timings"]
+    started = time.perf_counter()
+    for seq in range(args.frames):
+        for state in states:
+            logger.info(f"{state.student_id} seq={seq} gaze={metrics['gaze']} ratio={metrics['gaze_ratio']:.3f} "
+                        f"brow={metrics['brow_ratio']:.4f} mouth={metrics['mouth_ratio']:.3f} "
+                        f"status={state.status} alert={state.alert} "
+                        + " ".join(f"{stage}={ms * 1000:.1f}ms" for stage, ms in timings.items()))
+    logged = time.perf_counter() - started
+
+    snapshot = recorder.snapshot()
+    ndjson = sum(len(line) for line in to_ndjson(snapshot))
+    npz = len(to_npz(snapshot))
+    print(f"record:   {recorded / total * 1e6:.2f} us/frame")
+    print(f"INFO log: {logged / total * 1e6:.2f} us/frame (null handler)")
+    print(f"memory:   {FLIGHT_DTYPE.itemsize} B/frame, {FLIGHT_DTYPE.itemsize * args.capacity / 1024:.0f} KiB/student")
+    print(f"dump of {args.students} x {args.capacity} frames: NDJSON {ndjson / 1024:.0f} KiB, npz {npz / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Benchmark: alert quality of the raw per-frame metrics vs MetricFusion at lower frame rates.
+
+Run from backend/:
+    python -m benchmarks.bench_fusion [--seconds 180] [--fps 5] [--steps 1 2 3 5] [--sway 1] [--jitter 0.05]
+
+One student on a simulated clock: attentive, with gaze-away, frown and head-turn episodes at
+fixed times. Each frame is the scenario frame with head sway (random shift / rotation / scale,
+scaled by `sway`) and sensor noise, JPEG round-tripped and analyzed once by the CV pipeline
+at `fps`. Rendered frames lack most of a webcam's landmark jitter (lighting, blur, codec),
+so `jitter` adds it to the measured ratios (std in eye widths; a quarter of it on the ratios
+over the face width) and the raw labels / scores are re-derived with the pipeline's
+thresholds. Rendered frames cannot turn the head either: a head-turn episode is the attentive
+frame with the yaw proxy offset by HEAD_TURN_YAW (the irises stay centered in the eyes, as when
+the eyes follow the head), which the per-frame gaze label cannot see. The recorded CV results are then replayed through the rules at fps / step (every
+step-th frame), once on the raw metrics and once through MetricFusion, and the alert
+timeline (sampled every 0.1 s, rule timers included) is scored against the script:
+seconds of GAZE_AWAY / CONFUSED outside an episode, time to flag each episode, misses.
+Time to flag never counts below the rule's own duration (3 s gaze away, 1 s confusion) after
+the episode's first frame: a sooner flag means noisy labels had started the rule timer early.
+"""
+import argparse
+import logging
+import math
+
+import cv2
+import numpy as np
+
+from app.services.confusion import ConfusionEngine
+from app.services.cv_pipeline import CVPipeline
+from app.services.frame_receiver import frame_receiver
+from app.services.landmark_metrics import (
+    GAZE_LEFT_RATIO, GAZE_RIGHT_RATIO, BROW_BASELINE, BROW_GAIN, SMILE_RATIO, SMILE_ON, SMILE_OFF,
+)
+from app.services.metric_fusion import MetricFusion
+from app.services.proctoring import ProctoringEngine
+from app.services.session_evaluator import SessionEvaluator
+from app.utils.timers import ManualClock, TimerWheel
+from benchmarks.frames import default_face, render_scenarios
+
+# (start, seconds, scenario): gaze away / head turn -> GAZE_AWAY alert, frown -> CONFUSED status
+EPISODES = ((30, 8, "gaze_away"), (60, 6, "frown"), (95, 5, "gaze_away"), (125, 4, "frown"), (150, 6, "gaze_away"),
+            (168, 6, "head_turn"))
+FLAGS = {"gaze_away": "GAZE_AWAY", "frown": "CONFUSED", "head_turn": "GAZE_AWAY"}
+# Yaw proxy (nose offset / face width) of the head-turn episode: a turn of about 35 degrees
+HEAD_TURN_YAW = 0.3
+# An episode's flag may clear this long after it ends (next frame + filter lag)
+GRACE = 2.0
+SAMPLE = 0.1
+
+
+def scenario_at(t: float) -> str:
+    for start, length, name in EPISODES:
+        if start <= t < start + length:
+            return name
+    return "one_face"
+
+
+def add_jitter(metrics: dict, rng, jitter: float):
+    # Landmark noise on the ratios, then the single-frame decisions of landmark_metrics again
+    if "gaze_ratio" not in metrics:
+        return
+    for name in ("gaze_ratio", "gaze_ratio_right"):
+        metrics[name] += rng.normal(0, jitter)
+    for name in ("brow_ratio", "mouth_ratio", "yaw"):
+        metrics[name] += rng.normal(0, jitter / 4)
+    ratio = metrics["gaze_ratio"]
+    metrics["gaze"] = "LEFT" if ratio < GAZE_LEFT_RATIO else "RIGHT" if ratio > GAZE_RIGHT_RATIO else "CENTER"
+    metrics["brow"] = max(0.0, min(1.0, (BROW_BASELINE - metrics["brow_ratio"]) * BROW_GAIN))
+    metrics["smile"] = SMILE_ON if metrics["mouth_ratio"] > SMILE_RATIO else SMILE_OFF
+
+
+def record(images, seconds: float, fps: float, sway: float, noise: float, jitter: float, seed: int = 11):
+    """
+    (t, cv_result) per frame at `fps`, landmarks dropped (as the workers send them).
+    """
+    rng = np.random.default_rng(seed)
+    pipeline = CVPipeline()
+    results = []
+    for n in range(int(seconds * fps)):
+        t = n / fps
+        scenario = scenario_at(t)
+        image = images["one_face" if scenario == "head_turn" else scenario]
+        h, w = image.shape[:2]
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), rng.normal(0, 1.5 * sway), 1 + rng.normal(0, 0.02 * sway))
+        matrix[:, 2] += rng.normal(0, 4 * sway, 2)
+        moved = cv2.warpAffine(image, matrix, (w, h), borderMode=cv2.BORDER_REPLICATE)
+        noisy = np.clip(moved + rng.normal(0, noise, moved.shape), 0, 255).astype(np.uint8)
+        _, jpeg = cv2.imencode(".jpg", noisy, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        result = pipeline.process_frame(frame_receiver.decode_bytes(jpeg.tobytes()), "bench")
+        result.pop("landmarks", None)
+        if scenario == "head_turn" and "yaw" in result["metrics"]:
+            result["metrics"]["yaw"] += HEAD_TURN_YAW
+        if jitter > 0:
+            add_jitter(result["metrics"], rng, jitter)
+        results.append((t, result))
+    return results
+
+
+def replay(results, step: int, seconds: float, fused: bool):
+    """
+    Flag name ("GAZE_AWAY" / "CONFUSED" / None) every SAMPLE seconds, every (t, flag) onset
+    (an alert raised by a timer and cleared by the next frame counts too) and the frame times.
+    """
+    clock = ManualClock(0.0)
+    wheel = TimerWheel(clock=clock)
+    evaluator = SessionEvaluator(ttl_seconds=math.inf, proctoring=ProctoringEngine(wheel),
+                                 confusion=ConfusionEngine(wheel), wheel=wheel, fusion=MetricFusion(enabled=fused))
+    current, onsets = [None], []
+
+    def flag(state):
+        name = "GAZE_AWAY" if state.alert_name == "GAZE_AWAY" else "CONFUSED" if state.status_name == "CONFUSED" else None
+        if name is not None and name != current[0]:
+            onsets.append((state.last_updated, name))
+        current[0] = name
+
+    evaluator.listeners.append(flag)
+    frames = results[::step]
+    timeline, index = [], 0
+    for tick in range(int(seconds / SAMPLE)):
+        now = tick * SAMPLE
+        clock.set(now)
+        wheel.advance()
+        while index < len(frames) and frames[index][0] <= now + 1e-9:
+            t, result = frames[index]
+            # A copy: evaluate() replaces the metrics, the same results are replayed again
+            flag(evaluator.evaluate("bench", "ROOM", dict(result), now=t))
+            index += 1
+        timeline.append(current[0])
+    return timeline, onsets, [t for t, _ in frames]
+
+
+def expected(name: str, t: float) -> bool:
+    return any(FLAGS[scenario] == name and start <= t < start + length + GRACE for start, length, scenario in EPISODES)
+
+
+def score(timeline, onsets, times):
+    """
+    ({flag: false alerts}, {flag: false seconds}, seconds to flag each episode or None).
+    """
+    alerts = {name: 0 for name in FLAGS.values()}
+    false = {name: 0.0 for name in FLAGS.values()}
+    flagged = []
+    for t, name in onsets:
+        if not expected(name, t):
+            alerts[name] += 1
+    for tick, name in enumerate(timeline):
+        if name is not None and not expected(name, tick * SAMPLE):
+            false[name] += SAMPLE
+    minimum = rule_seconds()
+    for start, length, scenario in EPISODES:
+        first = next((tick * SAMPLE - start for tick in range(int(start / SAMPLE), int((start + length + GRACE) / SAMPLE))
+                      if tick < len(timeline) and timeline[tick] == FLAGS[scenario]), None)
+        # The rule can only flag its duration after the episode's first frame
+        seen = next((t for t in times if t >= start - 1e-9), start) - start
+        flagged.append(None if first is None else max(first, seen + minimum[FLAGS[scenario]]))
+    return alerts, false, flagged
+
+
+def rule_seconds() -> dict:
+    # Shortest time the rules take to raise each flag after an episode starts
+    wheel = TimerWheel(clock=ManualClock(0.0))
+    return {"GAZE_AWAY": ProctoringEngine(wheel).GAZE_THRESHOLD_SECONDS,
+            "CONFUSED": ConfusionEngine(wheel).TIME_WINDOW_SECONDS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=180.0)
+    parser.add_argument("--fps", type=float, default=5.0, help="capture rate of the recorded stream")
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 2, 3, 5], help="replay every step-th frame")
+    parser.add_argument("--sway", type=float, default=1.0, help="head sway scale (0 = still head)")
+    parser.add_argument("--noise", type=float, default=4.0, help="sensor noise (gray levels, std)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="landmark jitter (eye widths, std; 0 = none)")
+    parser.add_argument("--face", help="base portrait (default: matplotlib sample portrait)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    face = args.face or default_face()
+    if not face:
+        raise SystemExit("No base portrait: pass --face (or install matplotlib for its sample portrait)")
+    results = record(render_scenarios(face), args.seconds, args.fps, args.sway, args.noise, args.jitter)
+
+    print(f"{args.seconds:g}s at {args.fps:g} FPS, jitter {args.jitter:g}, episodes: "
+          + ", ".join(f"{name} at {start}s for {length}s" for start, length, name in EPISODES) + "\n")
+    print(f"{'':<13} {'false alerts':^17} {'false seconds':^17}")
+    print(f"{'fps':>5} {'metrics':<7} {'GAZE':>8} {'CONFUSED':>8} {'GAZE':>8} {'CONFUSED':>8} {'missed':>7}   time to flag (s)")
+    scores = {}
+    for step in args.steps:
+        for label, fused in (("raw", False), ("fused", True)):
+            alerts, false, flagged = scores[step, label] = score(*replay(results, step, args.seconds, fused))
+            times = ", ".join("-" if first is None else f"{first:.1f}" for first in flagged)
+            print(f"{args.fps / step:>5.2f} {label:<7} {alerts['GAZE_AWAY']:>8} {alerts['CONFUSED']:>8} "
+                  f"{false['GAZE_AWAY']:>8.1f} {false['CONFUSED']:>8.1f} "
+                  f"{sum(first is None for first in flagged):>7}   {times}")
+
+    # Per rate: fused vs raw delay on the episodes both flag
+    def delay(step):
+        pairs = [(fused, raw) for fused, raw in zip(scores[step, "fused"][2], scores[step, "raw"][2])
+                 if fused is not None and raw is not None]
+        return sum(fused - raw for fused, raw in pairs) / len(pairs) if pairs else math.nan
+
+    print()
+    for step in args.steps:
+        print(f"{args.fps / step:>5.2f} FPS: fused flags {delay(step):+.1f} s vs raw on the episodes both flag")
+
+    # Lowest rate at which the fused metrics do at least as well as the raw ones at full rate
+    def quality(step, label):
+        alerts, _, flagged = scores[step, label]
+        return sum(alerts.values()), sum(first is None for first in flagged)
+
+    base = quality(args.steps[0], "raw")
+    matching = [step for step in args.steps
+                if all(fused <= raw for fused, raw in zip(quality(step, "fused"), base))]
+    if matching:
+        step = max(matching)
+        print(f"\nFused at {args.fps / step:.2f} FPS matches raw at {args.fps / args.steps[0]:.2f} FPS on false alerts "
+              f"and missed episodes")
+    else:
+        print("\nFused metrics never match the raw ones at full rate")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: server cost of a landmark packet (client-side face mesh) vs a JPEG frame.
+
+Run from backend/:
+    python -m benchmarks.bench_landmarks [--variants 2000] [--repeat 20] [--recorded DIR]
+
+1. Server time per packet: decode + CVPipeline.process_frame vs LandmarkReceiver.parse + analyze,
+   and bytes on the wire (JPEG vs header + float16 landmarks).
+2. Parity: the meshes the pipeline finds on the scenario frames, jittered into `variants`
+   faces, go through the metric kernel as float32 and as a float16 packet. Reports how
+   often the labels (gaze, smile) differ and the largest brow score difference.
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from app.services.cv_pipeline import CVPipeline
+from app.services.frame_receiver import frame_receiver
+from app.services.landmark_metrics import compute_metrics
+from app.services.landmark_receiver import LANDMARK_HEADER, LANDMARK_VERSION, landmark_receiver
+from benchmarks.frames import build_frames
+
+
+def encode_packet(seq: int, face_count: int, points) -> bytes:
+    count = 0 if points is None else len(points)
+    header = LANDMARK_HEADER.pack(seq, time.time() * 1000, face_count, LANDMARK_VERSION, count)
+    return header if points is None else header + points.astype("<f2").tobytes()
+
+
+def server_costs(frames, repeat: int):
+    print(f"{'scenario':<12} {'faces':>5} {'jpeg B':>7} {'cv ms':>8} {'packet B':>9} {'landmarks us':>13}")
+    meshes = []
+    for name, encoded in frames.items():
+        jpeg = encoded[0]
+        pipeline = CVPipeline()
+        # The full mesh for the packet; the timed frames take the worker path
+        pipeline.keep_landmarks = True
+        result = pipeline.process_frame(frame_receiver.decode_bytes(jpeg), name)
+        pipeline.keep_landmarks = False
+        started = time.perf_counter()
+        for _ in range(repeat):
+            pipeline.process_frame(frame_receiver.decode_bytes(jpeg), name)
+        cv = (time.perf_counter() - started) / repeat
+
+        packet = encode_packet(0, result["face_count"], result["landmarks"])
+        started = time.perf_counter()
+        for _ in range(repeat * 100):
+            landmark_receiver.analyze(landmark_receiver.parse(packet))
+        landmarks = (time.perf_counter() - started) / (repeat * 100)
+
+        print(f"{name:<12} {result['face_count']:>5} {len(jpeg):>7} {cv * 1000:>8.2f} {len(packet):>9} "
+              f"{landmarks * 1e6:>13.1f}")
+        if result["landmarks"] is not None:
+            meshes.append(result["landmarks"])
+    return meshes
+
+
+def parity(meshes, variants: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    labels = {"gaze": 0, "smile": 0}
+    brow_error = 0.0
+    for i in range(variants):
+        mesh = meshes[i % len(meshes)]
+        # Small per-point jitter + a global shift: lands ratios on both sides of the thresholds
+        points = (mesh + rng.normal(0, 0.004, mesh.shape) + rng.normal(0, 0.02, 3)).astype(np.float32)
+        exact = compute_metrics(points)
+        sent = landmark_receiver.analyze(landmark_receiver.parse(encode_packet(i, 1, points)))["metrics"]
+        for key in labels:
+            labels[key] += exact[key] != sent[key]
+        brow_error = max(brow_error, abs(exact["brow"] - sent["brow"]))
+    print(f"\nfloat16 parity over {variants} faces: gaze labels differ {labels['gaze']}x, "
+          f"smile labels differ {labels['smile']}x, max brow difference {brow_error:.4f}")
+    return labels, brow_error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--face", help="base portrait (default: matplotlib sample portrait)")
+    parser.add_argument("--recorded", help="directory of recorded frames instead of the synthetic scenarios")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    frames = build_frames(args.face, args.recorded)
+    meshes = server_costs(frames, args.repeat)
+    if not meshes:
+        raise SystemExit("No face found in the frames: nothing to check parity on")
+    labels, brow_error = parity(meshes, args.variants)
+
+    # float16 keeps ~3 significant digits: only faces sitting on a threshold may flip
+    if brow_error > 0.05 or sum(labels.values()) > args.variants * 0.02:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Micro-benchmark: per-landmark metric helpers vs the per-frame metric path and the
+vectorized landmark kernel.
+
+Run from backend/:
+    python -m benchmarks.bench_metrics [--faces 2000] [--batch 32]
+
+Per face, the worker path (frame_metrics: the coordinates the metrics use, inlined scalar
+math) is timed against the helpers; the vectorized kernel against the helpers face by face
+on a batch. Times are the best of several rounds (the least disturbed by the rest of the
+machine). Also checks parity: every gaze label / brow / smile value of every path must
+match the helpers.
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from app.services.cv_pipeline import get_cv_pipeline
+from app.services.landmark_metrics import (
+    NUM_LANDMARKS, landmarks_to_array, frame_metrics, compute_metrics, compute_metrics_batch,
+)
+
+
+def make_faces(count: int, seed: int = 7):
+    """
+    Random landmark sets (uniform in [0, 1]) so ratios land on both sides of every
+    threshold, plus a few degenerate faces (zero face / eye width).
+    """
+    rng = np.random.default_rng(seed)
+    arrays = rng.random((count, NUM_LANDMARKS, 3), dtype=np.float32)
+    arrays[0, 234, 0] = arrays[0, 454, 0]   # zero face width
+    arrays[1, 133, 0] = arrays[1, 33, 0]    # zero eye width
+
+    protos = []
+    for arr in arrays:
+        lm = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z in arr:
+            lm.landmark.add(x=x, y=y, z=z)
+        protos.append(lm)
+    return protos
+
+
+def reference(lm):
+    cv_pipeline = get_cv_pipeline()
+    return (
+        cv_pipeline._detect_gaze(lm, 640, 480),
+        cv_pipeline._calculate_brow_furrow(lm),
+        cv_pipeline._calculate_smile(lm),
+    )
+
+
+def check_parity(protos):
+    """
+    Per-frame, single-array and batched paths must agree with the helpers (and with each other).
+    """
+    arrays = [landmarks_to_array(lm) for lm in protos]
+    batch = compute_metrics_batch(np.stack(arrays))
+    mismatches = 0
+    for i, lm in enumerate(protos):
+        gaze, brow, smile = reference(lm)
+        m = compute_metrics(arrays[i])
+        live = frame_metrics(lm)[0]
+        if m["gaze"] != gaze or abs(m["brow"] - brow) > 1e-9 or m["smile"] != smile:
+            mismatches += 1
+        elif live != m:
+            mismatches += 1
+        elif any(abs(m[k] - batch[k][i]) > 1e-9 for k in m if k != "gaze") or batch["gaze"][i] != gaze:
+            mismatches += 1
+    return mismatches
+
+
+def bench(label, fn, repeat: int, rounds: int = 20):
+    fn()  # warm-up
+    elapsed = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = min(elapsed, (time.perf_counter() - start) / repeat)
+    print(f"{label:<44} {elapsed * 1e6:10.1f} us")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # The reference helpers log every gaze ratio; keep the benchmark about compute
+    logging.disable(logging.INFO)
+
+    protos = make_faces(args.faces)
+    mismatches = check_parity(protos)
+    print(f"Parity: {args.faces - mismatches}/{args.faces} faces match the reference helpers")
+
+    lm = protos[2]
+    arr = landmarks_to_array(lm)
+    stack = np.stack([landmarks_to_array(p) for p in protos[:args.batch]])
+
+    print(f"\n{'Per face':<44} {'time':>13}")
+    t_helpers = bench("helpers (gaze + brow + smile)", lambda: reference(lm), args.repeat * 50)
+    t_live = bench("worker path (all metrics, from protobuf)", lambda: frame_metrics(lm), args.repeat * 50)
+    bench("protobuf -> (478, 3) array (every point)", lambda: landmarks_to_array(lm, arr), args.repeat * 50)
+    bench("compute_metrics (all metrics, from array)", lambda: compute_metrics(arr), args.repeat * 50)
+    print(f"Worker path vs helpers: {t_live / t_helpers:.2f}x")
+
+    print(f"\n{f'Batch of {args.batch} faces':<44} {'time':>13}")
+    t_ref = bench("helpers, face by face", lambda: [reference(p) for p in protos[:args.batch]], args.repeat)
+    t_vec = bench("kernel, one (N, 478, 3) call", lambda: compute_metrics_batch(stack), args.repeat)
+    print(f"\nBatched kernel speed-up over helpers: {t_ref / t_vec:.1f}x ({t_vec / args.batch * 1e6:.1f} us/face)")
+
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
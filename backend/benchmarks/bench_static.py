@@ -0,0 +1,90 @@
+"""
+Benchmark: static-frame detection on a quiet classroom stream.
+
+Run from backend/:
+    python -m benchmarks.bench_static [--seconds 60] [--fps 5] [--change-every 8] [--noise 3]
+
+Builds one student's stream from the scenario frames (benchmarks.frames): mostly the
+attentive face with sensor noise (re-encoded JPEG every frame), switching to gaze away /
+frown / no face for a few seconds every `change-every` seconds. The same frames go
+through two pipelines, one analyzing every frame and one with static-frame detection.
+Reports CV time per frame, the share of frames reused and how often the reused answer
+disagrees with a full analysis (face count, gaze label, brow above the confusion threshold).
+"""
+import argparse
+import logging
+import time
+
+import cv2
+import numpy as np
+
+import app.services.cv_pipeline as cv_module
+from app.services.cv_pipeline import CVPipeline
+from app.services.frame_receiver import frame_receiver
+from benchmarks.frames import build_frames
+
+BROW_CONFUSED = 0.35
+CHANGES = ("gaze_away", "frown", "no_face")
+
+
+def make_stream(frames, seconds: float, fps: float, change_every: float, noise: float, seed: int = 9):
+    rng = np.random.default_rng(seed)
+    images = {name: frame_receiver.decode_bytes(encoded[0]) for name, encoded in frames.items()}
+    stream = []
+    for n in range(int(seconds * fps)):
+        t = n / fps
+        period = int(t // change_every)
+        # Last 2 seconds of each period: something happens
+        name = CHANGES[period % len(CHANGES)] if t % change_every >= change_every - 2 else "one_face"
+        noisy = np.clip(images[name] + rng.normal(0, noise, images[name].shape), 0, 255).astype(np.uint8)
+        _, jpeg = cv2.imencode(".jpg", noisy, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        stream.append((name, jpeg.tobytes()))
+    return stream
+
+
+def decision(result):
+    m = result["metrics"]
+    return result["face_count"], m.get("gaze"), m.get("brow", 0.0) > BROW_CONFUSED
+
+
+def run(stream, threshold: float):
+    cv_module.STATIC_FRAME_THRESHOLD = threshold
+    pipeline = CVPipeline()
+    results, seconds = [], 0.0
+    for _, jpeg in stream:
+        frame = frame_receiver.decode_bytes(jpeg)
+        started = time.perf_counter()
+        results.append(pipeline.process_frame(frame, "S1"))
+        seconds += time.perf_counter() - started
+    return results, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--change-every", type=float, default=8.0)
+    parser.add_argument("--noise", type=float, default=3.0, help="sensor noise (gray levels, std)")
+    parser.add_argument("--threshold", type=float, default=cv_module.STATIC_FRAME_THRESHOLD)
+    parser.add_argument("--face", help="base portrait (default: matplotlib sample portrait)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    stream = make_stream(build_frames(args.face), args.seconds, args.fps, args.change_every, args.noise)
+    full, full_seconds = run(stream, 0)
+    skip, skip_seconds = run(stream, args.threshold)
+
+    static = sum(r["static"] for r in skip)
+    wrong = [i for i, (a, b) in enumerate(zip(full, skip)) if decision(a) != decision(b)]
+    print(f"{len(stream)} frames, {args.fps:g} FPS, a change every {args.change_every:g}s, noise {args.noise:g}")
+    print(f"every frame   {full_seconds / len(stream) * 1000:>8.2f} ms/frame")
+    print(f"static skip   {skip_seconds / len(stream) * 1000:>8.2f} ms/frame "
+          f"({static / len(stream):.0%} reused, threshold {args.threshold:g})")
+    print(f"CV time saved {1 - skip_seconds / full_seconds:>8.0%}")
+    print(f"Decisions differing from a full analysis: {len(wrong)}"
+          + (f" (frames {wrong[:10]}{'...' if len(wrong) > 10 else ''}, "
+             f"scenarios {sorted({stream[i][0] for i in wrong})})" if wrong else ""))
+
+
+if __name__ == "__main__":
+    main()
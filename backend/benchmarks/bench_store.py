@@ -0,0 +1,141 @@
+"""
+Benchmark: per-frame cost of the session state path, Pydantic models vs slot records.
+
+Run from backend/:
+    python -m benchmarks.bench_store [--students 500] [--frames 20] [--reads 5]
+
+For each frame the "pydantic" path does what the server used to do: build a SessionState,
+store it, `.dict()` + json.dumps for the teacher delta and validate + serialize it for
+the HTTP response (response_model). The "records" path builds a StudentRecord and reuses
+its cached encoding for the delta and the response. Teacher reads (GET /teacher/sessions)
+re-validate the whole list vs return the store's cached snapshot.
+Reports time and transient allocation peak per frame, and retained memory per student.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+import warnings
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.models.session_state import (
+    SessionState, StudentRecord, STATUS_NAMES, ALERT_NAMES, STATUS_CODES, ALERT_CODES,
+)
+from app.state.session_store import SessionStore
+
+_LIST = TypeAdapter(List[SessionState])
+
+
+def make_frames(students: int, frames: int, seed: int = 11):
+    rng = random.Random(seed)
+    rows = []
+    for frame in range(frames):
+        for i in range(students):
+            rows.append((f"S{i}", f"ROOM{i % 10}", rng.choice(STATUS_NAMES[:3]), rng.choice(ALERT_NAMES),
+                         rng.choice((0, 1, 1, 1, 2)), rng.choice((0.0, 70.0)), 1_000_000.0 + frame * 0.2 + i * 1e-4))
+    return rows
+
+
+def pydantic_frame(store: dict, row):
+    student_id, session_id, status, alert, faces, score, ts = row
+    state = SessionState(student_id=student_id, session_id=session_id, status=status, alert=alert,
+                         face_count=faces, confusion_score=score, last_updated=ts)
+    store[student_id] = state
+    delta = json.dumps({"type": "delta", "session_id": session_id, "students": [state.dict()], "removed": []})
+    response = SessionState.model_validate(state.dict()).model_dump_json()
+    return delta, response
+
+
+def record_frame(store: SessionStore, row):
+    student_id, session_id, status, alert, faces, score, ts = row
+    state = StudentRecord(student_id, session_id, STATUS_CODES[status], ALERT_CODES[alert], faces, score, ts)
+    store.put(state)
+    delta = '{"type": "delta", "session_id": %s, "students": [%s], "removed": []}' % (
+        json.dumps(session_id), state.to_json())
+    response = state.to_json().encode()
+    return delta, response
+
+
+def pydantic_read(store: dict):
+    return _LIST.dump_json(_LIST.validate_python([s.dict() for s in store.values()]))
+
+
+def record_read(store: SessionStore):
+    return store.snapshot()[1].encode()
+
+
+def measure(label, frame_fn, read_fn, store, rows, students: int, reads_per_frame: int):
+    # 1. Time (no tracing)
+    started = time.perf_counter()
+    for n, row in enumerate(rows):
+        frame_fn(store, row)
+        if reads_per_frame and n % students == 0:
+            for _ in range(reads_per_frame):
+                read_fn(store)
+    elapsed = time.perf_counter() - started
+
+    # 2. Transient allocations of one frame (peak above the current heap)
+    tracemalloc.start()
+    peaks = []
+    for row in rows[-students:]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        frame_fn(store, row)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    # 3. One teacher read of the whole store, after a change
+    frame_fn(store, rows[-1])
+    started = time.perf_counter()
+    body = read_fn(store)
+    read = time.perf_counter() - started
+
+    print(f"{label:<10} {elapsed / len(rows) * 1e6:>10.2f} us/frame {sum(peaks) / len(peaks):>10.0f} B peak/frame"
+          f" {read * 1000:>10.2f} ms/read ({len(body) / 1024:.0f} KiB)")
+    return elapsed
+
+
+def retained(make_store, put, rows, students: int) -> float:
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    store = make_store()
+    for row in rows[:students]:
+        put(store, row)
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return size / students
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=5, help="teacher reads per frame interval")
+    args = parser.parse_args()
+
+    # The old path is measured as it was written (.dict())
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    rows = make_frames(args.students, args.frames)
+    print(f"{args.students} students x {args.frames} frames, {args.reads} teacher reads per frame interval\n")
+    t_old = measure("pydantic", pydantic_frame, pydantic_read, {}, rows, args.students, args.reads)
+    t_new = measure("records", record_frame, record_read, SessionStore(), rows, args.students, args.reads)
+
+    old = retained(dict, lambda s, row: pydantic_frame(s, row), rows, args.students)
+    new = retained(SessionStore, lambda s, row: record_frame(s, row), rows, args.students)
+    print(f"\nRetained per student: pydantic {old:.0f} B, records {new:.0f} B")
+    print(f"Speed-up (frames + reads): {t_old / t_new:.1f}x")
+
+    # Same wire format
+    a = json.loads(pydantic_frame({}, rows[0])[1])
+    b = json.loads(record_frame(SessionStore(), rows[0])[1])
+    if a != b:
+        print(f"\nFAIL: wire formats differ\n{a}\n{b}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: cost of the class summary (GET /teacher/sessions/{id}/summary, WS "summary").
+
+Run from backend/:
+    python -m benchmarks.bench_summary [--sizes 30 300 3000] [--frames 20] [--transitions 0.05]
+
+For each class size, `frames` rounds of one frame per student go through SessionStore.put,
+with and without the ClassSummaryStore listener; `transitions` is the share of frames that
+change status or alert. Then a summary read (1 / 5 / 15 minute windows) is compared with
+recounting the room from the store (current percentages only, no windows).
+Time advances 1 s per round on a manual clock, so the windows fill like a live class.
+"""
+import argparse
+import random
+import time
+
+from app.models.session_state import StudentRecord, STATUS_NAMES, ALERT_NAMES
+from app.state.class_summary import ClassSummaryStore
+from app.state.session_store import SessionStore
+
+
+def make_rounds(students: int, frames: int, transitions: float, seed: int = 5):
+    rng = random.Random(seed)
+    current = [(0, 0)] * students
+    rounds = []
+    for _ in range(frames):
+        rows = []
+        for i in range(students):
+            if rng.random() < transitions:
+                current[i] = (rng.randrange(len(STATUS_NAMES)), rng.choice((0, 0, 0, rng.randrange(len(ALERT_NAMES)))))
+            rows.append((f"S{i}", *current[i]))
+        rounds.append(rows)
+    return rounds
+
+
+def run(rounds, summaries: bool):
+    clock = [0.0]
+    store = SessionStore()
+    summary = ClassSummaryStore(clock=lambda: clock[0])
+    if summaries:
+        store.listeners.append(summary.apply)
+    seconds = 0.0
+    for rows in rounds:
+        clock[0] += 1.0
+        records = [StudentRecord(student_id, "ROOM", status, alert) for student_id, status, alert in rows]
+        started = time.perf_counter()
+        for record in records:
+            store.put(record)
+        seconds += time.perf_counter() - started
+    return store, summary, seconds
+
+
+def recount(store: SessionStore) -> dict:
+    counts = [0] * len(STATUS_NAMES)
+    room = store.room("ROOM")
+    for state in room.values():
+        counts[state.status] += 1
+    return {name: round(count * 100 / len(room), 1) for name, count in zip(STATUS_NAMES, counts)}
+
+
+def timed(fn, repeat: int = 200) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 3000])
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--transitions", type=float, default=0.05, help="share of frames changing state")
+    args = parser.parse_args()
+
+    print(f"{'students':>8} {'put us':>8} {'+summary us':>12} {'summary read us':>16} {'recount us':>11}")
+    for students in args.sizes:
+        rounds = make_rounds(students, args.frames, args.transitions)
+        _, _, plain = run(rounds, summaries=False)
+        store, summary, with_summary = run(rounds, summaries=True)
+        frames = students * args.frames
+
+        room = summary._rooms["ROOM"]
+        # A fresh read per call (cached reads would be a dict lookup)
+        read = timed(lambda: (setattr(room, "_json", None), summary.to_json("ROOM")))
+        naive = timed(lambda: recount(store))
+        print(f"{students:>8} {plain / frames * 1e6:>8.2f} {with_summary / frames * 1e6:>12.2f} "
+              f"{read * 1e6:>16.1f} {naive * 1e6:>11.1f}")
+
+        # The incremental counts match a recount of the store
+        counts = {name: 0 for name in STATUS_NAMES}
+        for state in store.room("ROOM").values():
+            counts[STATUS_NAMES[state.status]] += 1
+        if counts != {name: int(room.counts[code]) for code, name in enumerate(STATUS_NAMES)}:
+            raise SystemExit(f"FAIL: summary counts {room.counts} != store {counts}")
+
+
+if __name__ == "__main__":
+    main()
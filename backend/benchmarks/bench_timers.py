@@ -0,0 +1,122 @@
+"""
+Benchmark: rule-timer cost per frame and timer bookkeeping for a large class.
+
+Run from backend/:
+    python -m benchmarks.bench_timers [--students 5000] [--seconds 60] [--fps 5]
+
+Streams `students` on a simulated clock (ManualClock, no sleeping): every frame goes
+through SessionEvaluator.evaluate and the wheel turns every tick, as on the event loop.
+Then every student stops sending: OFFLINE and eviction must fire for all of them and
+leave no timer or rule state behind.
+"""
+import argparse
+import logging
+import random
+import time
+import tracemalloc
+
+from app.models.session_state import STATUS_CODES
+from app.services.confusion import ConfusionEngine
+from app.services.proctoring import ProctoringEngine
+from app.services.session_evaluator import SessionEvaluator
+from app.utils.timers import ManualClock, TimerWheel
+
+
+def make_results(rng: random.Random, count: int):
+    # Mix of centered / away gaze and frowns so both conditions keep starting and clearing
+    results = []
+    for _ in range(count):
+        results.append({"face_count": 1, "metrics": {
+            "gaze": rng.choice(("CENTER", "CENTER", "CENTER", "LEFT", "RIGHT")),
+            "brow": rng.choice((0.1, 0.1, 0.5)),
+            "smile": 0.0,
+        }})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--offline", type=float, default=10.0)
+    parser.add_argument("--ttl", type=float, default=120.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rng = random.Random(5)
+    results = make_results(rng, 64)
+
+    clock = ManualClock(1_000_000.0)
+    wheel = TimerWheel(clock=clock)
+    evaluator = SessionEvaluator(ttl_seconds=args.ttl, offline_seconds=args.offline,
+                                 proctoring=ProctoringEngine(wheel), confusion=ConfusionEngine(wheel), wheel=wheel)
+    # Count only: keeping the states would show up in the memory figures
+    fired = {"states": 0, "offline": 0, "evicted": 0}
+
+    offline_code = STATUS_CODES["OFFLINE"]
+
+    def on_state(state):
+        fired["offline" if state.status == offline_code else "states"] += 1
+
+    def on_evict(student_id):
+        fired["evicted"] += 1
+
+    evaluator.listeners.append(on_state)
+    evaluator.evict_listeners.append(on_evict)
+    ids = [f"S{i}" for i in range(args.students)]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    # 1. Streaming: students spread evenly over each frame interval
+    start = clock()
+    interval = 1.0 / args.fps
+    step = interval / args.students
+    frames = 0
+    evaluate_seconds = 0.0
+    advance_seconds = 0.0
+    for n in range(int(args.seconds * args.fps)):
+        for i, sid in enumerate(ids):
+            now = start + n * interval + i * step
+            if now - clock() >= wheel.tick:
+                clock.set(now)
+                t0 = time.perf_counter()
+                wheel.advance()
+                advance_seconds += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            evaluator.evaluate(sid, "BENCH", results[(i * 7 + n) % len(results)], now=now)
+            evaluate_seconds += time.perf_counter() - t0
+            frames += 1
+    streaming = tracemalloc.get_traced_memory()[0]
+    live_timers = len(wheel)
+
+    # 2. Everyone stops: tick through OFFLINE and eviction
+    end = clock() + args.ttl + 2 * interval + 1.0
+    t0 = time.perf_counter()
+    while clock() < end:
+        clock.set(clock() + wheel.tick)
+        wheel.advance()
+    drain_seconds = time.perf_counter() - t0
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"Students                  {args.students:>12}")
+    print(f"Frames evaluated          {frames:>12}")
+    print(f"evaluate() (tracemalloc on) {evaluate_seconds / frames * 1e6:>10.2f} us/frame")
+    print(f"Wheel ticks (streaming)   {advance_seconds / (args.seconds / wheel.tick) * 1e6:>12.2f} us/tick")
+    print(f"States fired by timers    {fired['states']:>12}")
+    print(f"Live timers while streaming {live_timers:>10}")
+    print(f"Memory while streaming    {(streaming - baseline) / 1024:>12.1f} KiB")
+    print(f"OFFLINE / evicted         {fired['offline']:>6} / {fired['evicted']:<5}")
+    print(f"Drain ({args.ttl:g}s simulated)  {drain_seconds * 1000:>11.1f} ms")
+    print(f"Memory after eviction     {(after - baseline) / 1024:>12.1f} KiB "
+          f"(timers {len(wheel)}, students {len(evaluator)})")
+
+    leftovers = len(wheel) + len(evaluator) + len(evaluator.proctoring.gaze_away) + len(evaluator.confusion.confused)
+    if fired["offline"] != args.students or fired["evicted"] != args.students or leftovers:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Synthetic frame generator for the load benchmarks.
+
+Renders the classroom scenarios from one real portrait with landmark-guided edits:
+    no_face     background only
+    one_face    attentive face (mouth corners widened into a smile -> FOCUSED)
+    multi_face  two faces side by side (MULTIPLE_FACES)
+    gaze_away   irises moved toward the eye corner (GAZE_AWAY after the threshold)
+    frown       inner brows pinched, mouth flattened (CONFUSED after the window)
+
+Recorded frames can be used instead: a directory whose sub-directories are named after
+scenarios (recorded/frown/*.jpg, ...); loose images become a "recorded" scenario.
+
+Run from backend/ to write the JPEGs and check what the pipeline measures on each:
+    python -m benchmarks.frames --out /tmp/frames [--face portrait.jpg]
+"""
+import argparse
+import logging
+import os
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from app.services.landmark_metrics import (
+    LEFT_EYE_OUTER, LEFT_EYE_INNER, LEFT_IRIS, RIGHT_EYE_INNER, RIGHT_EYE_OUTER, RIGHT_IRIS,
+    BROW_INNER_LEFT, BROW_INNER_RIGHT, MOUTH_LEFT, MOUTH_RIGHT, landmarks_to_array,
+)
+
+SCENARIOS = ("no_face", "one_face", "multi_face", "gaze_away", "frown")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def default_face() -> Optional[str]:
+    """
+    Portrait bundled with matplotlib's sample data, when matplotlib is installed.
+    """
+    try:
+        from matplotlib import cbook
+        return cbook.get_sample_data("grace_hopper.jpg", asfileobj=False)
+    except Exception:
+        return None
+
+
+def _landmarks(image: np.ndarray) -> np.ndarray:
+    import mediapipe as mp
+    with mp.solutions.face_mesh.FaceMesh(static_image_mode=True, refine_landmarks=True) as mesh:
+        results = mesh.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    if not results.multi_face_landmarks:
+        raise ValueError("No face found in the base portrait")
+    h, w = image.shape[:2]
+    return landmarks_to_array(results.multi_face_landmarks[0])[:, :2] * [w, h]
+
+
+def _warp(image: np.ndarray, moves, sigma: float) -> np.ndarray:
+    """
+    Smoothly drags the pixels around each (center, (dx, dy)) by the displacement (Gaussian falloff).
+    """
+    h, w = image.shape[:2]
+    x, y = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+    map_x, map_y = x.copy(), y.copy()
+    for (cx, cy), (dx, dy) in moves:
+        weight = np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * sigma ** 2))
+        map_x -= dx * weight
+        map_y -= dy * weight
+    return cv2.remap(image, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT)
+
+
+def _shift_irises(image: np.ndarray, pts: np.ndarray, fraction: float) -> np.ndarray:
+    # Cut each iris disc, inpaint the hole, paste it `fraction` of the eye width sideways
+    out = image.copy()
+    for iris, outer, inner in ((LEFT_IRIS, LEFT_EYE_OUTER, LEFT_EYE_INNER),
+                               (RIGHT_IRIS, RIGHT_EYE_INNER, RIGHT_EYE_OUTER)):
+        cx, cy = int(pts[iris][0]), int(pts[iris][1])
+        r = int(np.linalg.norm(pts[iris] - pts[iris + 1]) * 1.1) + 1
+        dx = int(fraction * abs(pts[inner][0] - pts[outer][0]))
+
+        patch = image[cy - r:cy + r, cx - r:cx + r].copy()
+        hole = np.zeros(image.shape[:2], np.uint8)
+        cv2.circle(hole, (cx, cy), r, 255, -1)
+        out = cv2.inpaint(out, hole, 3, cv2.INPAINT_TELEA)
+
+        disc = np.zeros(patch.shape[:2], np.uint8)
+        cv2.circle(disc, (r, r), r, 255, -1)
+        target = out[cy - r:cy + r, cx - r + dx:cx + r + dx]
+        target[disc > 0] = patch[disc > 0]
+    return out
+
+
+def render_scenarios(face_path: str, width: int = 640) -> Dict[str, np.ndarray]:
+    """
+    One BGR frame per scenario, all `width` pixels wide (4:3 canvas).
+    """
+    base = cv2.imread(face_path)
+    if base is None:
+        raise ValueError(f"Cannot read {face_path}")
+    pts = _landmarks(base)
+    mouth = abs(pts[MOUTH_LEFT][0] - pts[MOUTH_RIGHT][0])
+    brows = abs(pts[BROW_INNER_LEFT][0] - pts[BROW_INNER_RIGHT][0])
+
+    smiling = _warp(base, [(pts[MOUTH_LEFT], (-0.25 * mouth, 0)), (pts[MOUTH_RIGHT], (0.25 * mouth, 0))], mouth * 0.3)
+    frowning = _warp(base, [
+        (pts[MOUTH_LEFT], (0.2 * mouth, 0)), (pts[MOUTH_RIGHT], (-0.2 * mouth, 0)),
+        (pts[BROW_INNER_LEFT], (0.2 * brows, 0)), (pts[BROW_INNER_RIGHT], (-0.2 * brows, 0)),
+    ], brows * 0.35)
+    # Edits only move pixels near the landmarks, so the smiling face keeps the same points
+    gazing = _shift_irises(smiling, pts, 0.35)
+
+    def canvas(image):
+        h = width * 3 // 4
+        scale = min(width / image.shape[1], h / image.shape[0])
+        resized = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)))
+        out = np.full((h, width, 3), 90, np.uint8)
+        y, x = (h - resized.shape[0]) // 2, (width - resized.shape[1]) // 2
+        out[y:y + resized.shape[0], x:x + resized.shape[1]] = resized
+        return out
+
+    one = canvas(smiling)
+    half = cv2.resize(one, (width // 2, one.shape[0] // 2))
+    multi = np.full_like(one, 90)
+    top = one.shape[0] // 4
+    multi[top:top + half.shape[0], :half.shape[1]] = half
+    multi[top:top + half.shape[0], half.shape[1]:half.shape[1] * 2] = half
+
+    # Empty room: a blurred, noisy wall in the portrait's background tones
+    rng = np.random.default_rng(5)
+    wall = cv2.resize(base[:base.shape[0] // 8, :base.shape[1] // 8], (width, one.shape[0]))
+    empty = np.clip(cv2.GaussianBlur(wall, (0, 0), 15) + rng.normal(0, 4, wall.shape), 0, 255).astype(np.uint8)
+
+    return {"no_face": empty, "one_face": one, "multi_face": multi,
+            "gaze_away": canvas(gazing), "frown": canvas(frowning)}
+
+
+def load_recorded(directory: str) -> Dict[str, List[np.ndarray]]:
+    """
+    Frames per scenario from a directory of recordings (sub-directory name = scenario).
+    """
+    frames: Dict[str, List[np.ndarray]] = {}
+    for root, _, files in os.walk(directory):
+        name = os.path.relpath(root, directory)
+        scenario = "recorded" if name == "." else name.split(os.sep)[0]
+        for file in sorted(files):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                image = cv2.imread(os.path.join(root, file))
+                if image is not None:
+                    frames.setdefault(scenario, []).append(image)
+    return frames
+
+
+def encode(image: np.ndarray, quality: int = 80) -> bytes:
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def build_frames(face: Optional[str] = None, recorded: Optional[str] = None,
+                 width: int = 640, quality: int = 80) -> Dict[str, List[bytes]]:
+    """
+    JPEG frames per scenario: recorded ones when given, otherwise rendered from `face`.
+    """
+    if recorded:
+        images = load_recorded(recorded)
+        if not images:
+            raise ValueError(f"No images found in {recorded}")
+    else:
+        face = face or default_face()
+        if not face:
+            raise ValueError("No base portrait: pass --face (or install matplotlib for its sample portrait)")
+        images = {name: [image] for name, image in render_scenarios(face, width).items()}
+    return {name: [encode(image, quality) for image in frames] for name, frames in images.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="directory for the JPEGs")
+    parser.add_argument("--face", help="base portrait (default: matplotlib sample portrait)")
+    parser.add_argument("--width", type=int, default=640)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    from app.services.cv_pipeline import CVPipeline
+    from app.services.frame_receiver import frame_receiver
+
+    frames = build_frames(args.face, width=args.width)
+    os.makedirs(args.out, exist_ok=True)
+    print(f"{'scenario':<12} {'bytes':>7} {'faces':>6} {'gaze':>7} {'brow':>6} {'smile':>6}")
+    for name, encoded in frames.items():
+        with open(os.path.join(args.out, f"{name}.jpg"), "wb") as f:
+            f.write(encoded[0])
+        # Fresh pipeline per scenario so tracking state does not leak between them
+        result = CVPipeline().process_frame(frame_receiver.decode_bytes(encoded[0]), name)
+        m = result["metrics"]
+        print(f"{name:<12} {len(encoded[0]):>7} {result['face_count']:>6} {m.get('gaze', '-'):>7} "
+              f"{m.get('brow', 0.0):>6.2f} {m.get('smile', 0.0):>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
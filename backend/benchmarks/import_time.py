@@ -0,0 +1,67 @@
+"""
+Import-time budget for the API process.
+
+Run from backend/:
+    python -m benchmarks.import_time [--module app.main] [--budget-ms 1500] [--top 10]
+
+Imports the module in a fresh interpreter with -X importtime, prints the slowest imports
+and exits with status 1 when the total exceeds --budget-ms or when a model runtime that
+belongs to the analysis workers (mediapipe, tensorflow, OpenCV) gets imported: those load in the
+workers, after the app already answers /health.
+"""
+import argparse
+import subprocess
+import sys
+
+# Must never be imported by the API process at import time
+FORBIDDEN = ("mediapipe", "tensorflow", "cv2")
+
+
+def measure(module: str):
+    """
+    [(module, self_us, cumulative_us)] in import order, from one fresh interpreter.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=3, help="best of N (first run warms the file cache)")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    rows = min(runs, key=lambda r: next(c for n, _, c in r if n == args.module))
+    total_ms = next(c for n, _, c in rows if n == args.module) / 1000
+
+    print(f"import {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:g} ms, best of {len(runs)})\n")
+    print(f"{'cumulative':>10} {'self':>8}  module (ms)")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2])[1:args.top + 1]:
+        print(f"{cumulative_us / 1000:>10.1f} {self_us / 1000:>8.1f}  {name}")
+
+    failures = []
+    forbidden = sorted({n for n, _, _ in rows if n.split(".")[0] in FORBIDDEN})
+    if forbidden:
+        failures.append(f"model runtimes imported at import time: {', '.join(forbidden[:5])}")
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.0f} ms over budget ({args.budget_ms:g} ms)")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Load benchmark for the frame-to-dashboard path, against an in-process server.
+
+Run from backend/:
+    python -m benchmarks.load [--students 20] [--teachers 3] [--fps 5] [--duration 20]
+                              [--transport ws|post|mixed] [--recorded DIR] [--budget-ms 200]
+
+Starts the app with uvicorn on a local port (same process, own thread), then drives
+N students sending synthetic scenario frames (benchmarks.frames) at a fixed FPS over the
+binary WebSocket and/or POST /student/process-frame, plus M teachers on /teacher/ws.
+
+Reports throughput and p50/p95/p99 latency per stage:
+    request      student send -> state reply
+    analysis     admission -> CV result (worker queue + IPC + decode + cv)
+      decode     JPEG decode inside the worker
+      cv         CVPipeline.process_frame inside the worker
+    rules        SessionEvaluator.evaluate
+    broadcast    state created -> received by a teacher
+    end-to-end   student send -> received by a teacher
+Exits with status 1 when the end-to-end p95 exceeds --budget-ms.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+STAGES = ("request", "analysis", "decode", "cv", "rules", "broadcast", "end-to-end")
+
+
+class Recorder:
+    """
+    Latency samples (seconds) per stage plus outcome counters. Appends are thread-safe
+    (server-side probes run on the server thread).
+    """
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.outcomes = Counter()
+        self.static = 0         # analyzed frames answered from the previous analysis (unchanged)
+        self.sent = {}          # (student_id, last_updated) -> send time, for end-to-end joins
+        self.received = []      # (student_id, last_updated, receive time) seen by teachers
+
+    def add(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def summary(self, elapsed: float) -> dict:
+        for student_id, last_updated, received in self.received:
+            self.add("broadcast", received - last_updated)
+            sent = self.sent.get((student_id, last_updated))
+            if sent is not None:
+                self.add("end-to-end", received - sent)
+
+        stages = {}
+        for stage in STAGES:
+            values = np.array(self.samples.get(stage, ())) * 1000
+            if len(values):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                stages[stage] = {"n": len(values), "p50": p50, "p95": p95, "p99": p99, "max": values.max()}
+        return {
+            "elapsed": elapsed,
+            "outcomes": dict(self.outcomes),
+            "static": self.static,
+            "throughput": self.outcomes["PROCESSED"] / elapsed if elapsed else 0.0,
+            "stages": stages,
+        }
+
+
+def install_probes(recorder: Recorder):
+    """
+    Wraps the analysis engine and rule evaluator singletons (benchmark only).
+    """
+    from app.services.analysis_engine import analysis_engine
+    from app.services.session_evaluator import session_evaluator
+
+    analyze, evaluate = analysis_engine.analyze, session_evaluator.evaluate
+
+    async def timed_analyze(*args, **kwargs):
+        started = time.perf_counter()
+        result = await analyze(*args, **kwargs)
+        recorder.add("analysis", time.perf_counter() - started)
+        if result and "timings" in result:
+            recorder.add("decode", result["timings"]["decode"])
+            recorder.add("cv", result["timings"]["cv"])
+            recorder.static += bool(result.get("static"))
+        return result
+
+    def timed_evaluate(*args, **kwargs):
+        started = time.perf_counter()
+        state = evaluate(*args, **kwargs)
+        recorder.add("rules", time.perf_counter() - started)
+        return state
+
+    analysis_engine.analyze = timed_analyze
+    session_evaluator.evaluate = timed_evaluate
+
+
+def start_server(port: int):
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def wait_ready(port: int, timeout: float = 120.0):
+    import httpx
+
+    deadline = time.time() + timeout
+    while httpx.get(f"http://127.0.0.1:{port}/ready").status_code != 200:
+        if time.time() > deadline:
+            raise RuntimeError("Server not ready (analysis warm-up did not finish)")
+        time.sleep(0.1)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# --- CLIENTS ---
+
+async def ws_student(base: str, student_id: str, session_id: str, frames, fps: float, stop: float, rec: Recorder):
+    import websockets
+    from app.services.frame_receiver import FRAME_HEADER
+
+    sends = {}
+    async with websockets.connect(f"ws://{base}/student/ws", max_size=None) as ws:
+        await ws.send(json.dumps({"studentId": student_id, "sessionId": session_id}))
+
+        async def receive():
+            async for message in ws:
+                reply = json.loads(message)
+                rec.outcomes["PROCESSED" if reply.get("type") == "STATE" else reply.get("type")] += 1
+                sent = sends.pop(reply.get("seq"), None)
+                if reply.get("type") == "STATE" and sent is not None:
+                    rec.add("request", time.time() - sent)
+                    rec.sent[(student_id, reply["state"]["last_updated"])] = sent
+
+        receiver = asyncio.create_task(receive())
+        seq = 0
+        while time.time() < stop:
+            jpeg = frames[seq % len(frames)]
+            sends[seq] = time.time()
+            await ws.send(FRAME_HEADER.pack(seq, sends[seq] * 1000) + jpeg)
+            seq += 1
+            await asyncio.sleep(1.0 / fps)
+        await asyncio.sleep(1.0)  # drain the last replies
+        receiver.cancel()
+
+
+async def post_student(client, student_id: str, session_id: str, frames, fps: float, stop: float, rec: Recorder):
+    payloads = [f"data:image/jpeg;base64,{base64.b64encode(f).decode()}" for f in frames]
+
+    async def send(frame_data: str):
+        sent = time.time()
+        try:
+            response = await client.post("/student/process-frame",
+                                         json={"studentId": student_id, "sessionId": session_id, "frameData": frame_data})
+        except Exception:
+            rec.outcomes["ERROR"] += 1
+            return
+        outcome = response.headers.get("X-Frame-Status", "ERROR" if response.status_code >= 400 else "PROCESSED")
+        rec.outcomes[outcome] += 1
+        if outcome == "PROCESSED" and response.status_code == 200:
+            rec.add("request", time.time() - sent)
+            rec.sent[(student_id, response.json()["last_updated"])] = sent
+
+    # Like the browser client: capture on a timer, never wait for the previous reply
+    tasks, i = [], 0
+    while time.time() < stop:
+        tasks.append(asyncio.create_task(send(payloads[i % len(payloads)])))
+        i += 1
+        await asyncio.sleep(1.0 / fps)
+    await asyncio.gather(*tasks)
+
+
+async def teacher(base: str, session_id: str, stop: float, rec: Recorder):
+    import websockets
+
+    async with websockets.connect(f"ws://{base}/teacher/ws?session_id={session_id}", max_size=None) as ws:
+        while time.time() < stop + 1.0:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=max(0.1, stop + 1.0 - time.time()))
+            except asyncio.TimeoutError:
+                break
+            received = time.time()
+            update = json.loads(message)
+            if update.get("type") == "delta":
+                for state in update["students"]:
+                    rec.received.append((state["student_id"], state["last_updated"], received))
+
+
+async def drive(args, frames, rec: Recorder, base: str):
+    import httpx
+
+    scenarios = sorted(frames)
+    rng = random.Random(11)
+    stop = time.time() + args.duration
+    tasks = [asyncio.create_task(teacher(base, args.session, stop, rec)) for _ in range(args.teachers)]
+    await asyncio.sleep(0.2)
+
+    async with httpx.AsyncClient(base_url=f"http://{base}", timeout=30) as client:
+        for i in range(args.students):
+            student_id = f"BENCH{i}"
+            scenario = scenarios[i % len(scenarios)]
+            transport = args.transport if args.transport != "mixed" else ("ws" if i % 2 == 0 else "post")
+            # Stagger start so students do not capture in lockstep
+            await asyncio.sleep(rng.random() / args.fps / max(1, args.students))
+            if transport == "ws":
+                tasks.append(asyncio.create_task(
+                    ws_student(base, student_id, args.session, frames[scenario], args.fps, stop, rec)))
+            else:
+                tasks.append(asyncio.create_task(
+                    post_student(client, student_id, args.session, frames[scenario], args.fps, stop, rec)))
+        await asyncio.gather(*tasks)
+
+
+def report(summary: dict, args):
+    outcomes = summary["outcomes"]
+    frames = sum(v for k, v in outcomes.items() if k != "ERROR")
+    print(f"{args.students} students ({args.transport}, {args.fps:g} FPS), {args.teachers} teachers, "
+          f"{summary['elapsed']:.1f}s")
+    print(f"Frames answered {frames}  processed {outcomes.get('PROCESSED', 0)}  "
+          f"coalesced {outcomes.get('COALESCED', 0)}  dropped {outcomes.get('DROPPED', 0)}  "
+          f"errors {outcomes.get('ERROR', 0)}")
+    processed = outcomes.get("PROCESSED", 0)
+    print(f"Static frames   {summary['static']} ({summary['static'] / max(1, processed):.0%} of processed, "
+          f"CV skipped; STATIC_FRAME_THRESHOLD=0 disables)")
+    print(f"Throughput      {summary['throughput']:.1f} frames/s analyzed\n")
+    print(f"{'stage':<12} {'n':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)")
+    for stage, s in summary["stages"].items():
+        print(f"{stage:<12} {s['n']:>7} {s['p50']:>9.1f} {s['p95']:>9.1f} {s['p99']:>9.1f} {s['max']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--teachers", type=int, default=3)
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--transport", choices=("ws", "post", "mixed"), default="ws")
+    parser.add_argument("--session", default="BENCH_SESSION")
+    parser.add_argument("--workers", type=int, help="ANALYSIS_WORKERS for the server (default: config)")
+    parser.add_argument("--face", help="base portrait for the synthetic frames")
+    parser.add_argument("--recorded", help="directory of recorded frames (sub-directory = scenario)")
+    parser.add_argument("--json", help="also write the summary to this file")
+    parser.add_argument("--budget-ms", type=float, help="fail if the end-to-end p95 exceeds this")
+    args = parser.parse_args()
+
+    # Server settings are read at import time
+    if args.workers is not None:
+        os.environ["ANALYSIS_WORKERS"] = str(args.workers)
+    # Per-frame rule hints are warnings; keep the output to the report
+    logging.disable(logging.WARNING)
+
+    from benchmarks.frames import build_frames
+    frames = build_frames(args.face, args.recorded)
+
+    rec = Recorder()
+    install_probes(rec)
+    port = _free_port()
+    server, thread = start_server(port)
+    # Measure warm workers only: wait for the startup warm-up (/ready)
+    wait_ready(port)
+    rec.samples.clear()
+
+    started = time.time()
+    try:
+        asyncio.run(drive(args, frames, rec, f"127.0.0.1:{port}"))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+    summary = rec.summary(time.time() - started)
+    report(summary, args)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    end_to_end = summary["stages"].get("end-to-end")
+    if args.budget_ms is not None and (end_to_end is None or end_to_end["p95"] > args.budget_ms):
+        print(f"\nEnd-to-end p95 over budget ({args.budget_ms:g} ms)")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
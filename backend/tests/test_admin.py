@@ -0,0 +1,31 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import admin
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app)
+
+
+def test_no_admin_token_configured_hides_the_dump(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    assert client.get("/admin/flight-recorder").status_code == 404
+    assert client.get("/admin/flight-recorder", headers={"X-Admin-Token": ""}).status_code == 404
+
+
+def test_wrong_or_missing_token_is_forbidden(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/admin/flight-recorder").status_code == 403
+    assert client.get("/admin/flight-recorder", headers={"X-Admin-Token": "s3cre"}).status_code == 403
+
+
+def test_matching_token_dumps(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+    response = client.get("/admin/flight-recorder", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
@@ -0,0 +1,33 @@
+import asyncio
+
+from app.services.admission import AdmissionController, PROCESSED
+
+
+class RecordingGovernor:
+    def __init__(self):
+        self.latencies = []
+
+    def observe(self, student_id, seconds, backlog):
+        self.latencies.append(seconds)
+        return 0
+
+
+def test_governor_latency_leaves_out_the_rate_limit_wait():
+    governor = RecordingGovernor()
+    # 4 FPS: the second frame sits 0.25 s in the rate limit, its analysis takes 0.02 s
+    admission = AdmissionController(max_fps=4, max_frame_age_ms=1000, governor=governor)
+
+    async def job():
+        await asyncio.sleep(0.02)
+        return {"face_count": 1}
+
+    async def run():
+        first = await admission.submit("S1", job)
+        second = await admission.submit("S1", job)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.status == second.status == PROCESSED
+    assert second.waited >= 0.2
+    assert len(governor.latencies) == 2
+    assert all(0.015 < latency < 0.15 for latency in governor.latencies)
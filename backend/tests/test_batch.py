@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from app import batch
+from app.models.session_state import STATUS_CODES
+from app.services import landmark_metrics
+
+CONFUSED = STATUS_CODES["CONFUSED"]
+DISTRACTED = STATUS_CODES["DISTRACTED"]
+
+
+class FakePipeline:
+    """
+    CVPipeline stand-in: reports `metrics` for every frame; a frame's gray level is its index,
+    and an odd frame asks for half resolution on the next one (as a small face would).
+    """
+    sessions = None
+
+    def __init__(self, metrics: dict):
+        self.metrics = metrics
+        self.next_reduction = 1
+        self.frames = []
+
+    def decode_reduction(self, student_id: str) -> int:
+        return self.next_reduction
+
+    def process_frame(self, frame, student_id: str, scale: int = 1):
+        index = int(frame[0, 0, 0])
+        self.frames.append((index, scale, frame.shape[0]))
+        self.next_reduction = 2 if index % 2 else 1
+        return {"face_count": 1, "metrics": dict(self.metrics)}
+
+
+@pytest.fixture
+def recording(tmp_path):
+    # 25 frames at 5 FPS: 5 s of one student
+    path = tmp_path / "S1"
+    path.mkdir()
+    for index in range(25):
+        cv2.imwrite(str(path / f"{index:03d}.png"), np.full((64, 64, 3), index, np.uint8))
+    return str(path)
+
+
+def analyze(monkeypatch, recording, metrics: dict, thresholds: dict = None):
+    pipeline = FakePipeline(metrics)
+    cutoffs = []
+
+    def batch_pipeline(gaze_left, gaze_right):
+        cutoffs.append((gaze_left, gaze_right))
+        return pipeline
+    monkeypatch.setattr(batch, "_batch_pipeline", batch_pipeline)
+    record = batch.analyze_recording(recording, fps=5.0, thresholds=thresholds)
+    return record, pipeline, cutoffs
+
+
+def test_reduction_follows_the_frame_analyzed_before(monkeypatch, recording):
+    record, pipeline, _ = analyze(monkeypatch, recording, {"gaze": "CENTER", "brow": 0.0, "smile": 0.0})
+    assert [index for index, _, _ in pipeline.frames] == list(range(25))
+    for (previous, _, _), (_, scale, height) in zip(pipeline.frames, pipeline.frames[1:]):
+        # The reader runs frames ahead; the reduction is still the one the previous analysis asked for
+        assert scale == (2 if previous % 2 else 1) and height == 64 // scale
+    assert len(record["columns"]["t"]) == 25
+
+
+def test_thresholds_reach_this_recordings_rules_only(monkeypatch, recording):
+    saved = landmark_metrics.GAZE_LEFT_RATIO, landmark_metrics.GAZE_RIGHT_RATIO
+    looking_right = {"gaze": "RIGHT", "gaze_ratio": 0.6, "brow": 0.0, "smile": 0.0}
+    record, _, cutoffs = analyze(monkeypatch, recording, looking_right)
+    assert cutoffs == [saved] and record["columns"]["status"][-1] == DISTRACTED
+
+    # A wider gaze band: the fusion keeps 0.6 inside it
+    record, _, cutoffs = analyze(monkeypatch, recording, looking_right, {"gaze_left": 0.3, "gaze_right": 0.7})
+    assert cutoffs == [(0.3, 0.7)] and DISTRACTED not in record["columns"]["status"]
+
+    frowning = {"gaze": "CENTER", "brow": 0.5, "smile": 0.0}
+    assert analyze(monkeypatch, recording, frowning)[0]["columns"]["status"][-1] == CONFUSED
+    record = analyze(monkeypatch, recording, frowning, {"brow": 0.6, "gaze_left": None})[0]
+    assert CONFUSED not in record["columns"]["status"]
+    # Nothing process-wide changed
+    assert (landmark_metrics.GAZE_LEFT_RATIO, landmark_metrics.GAZE_RIGHT_RATIO) == saved
@@ -0,0 +1,43 @@
+from app.config import CAPTURE_INTERVAL_MS, CAPTURE_MAX_WIDTH, CAPTURE_JPEG_QUALITY
+from app.services.capture_profile import CaptureAdvisor
+from app.services.confusion import ConfusionEngine
+from app.services.metric_fusion import MetricFusion
+from app.services.proctoring import ProctoringEngine
+from app.services.session_evaluator import SessionEvaluator
+from app.utils.timers import ManualClock, TimerWheel
+
+FACE = {"face_count": 1, "face_width": 0.4, "metrics": {"gaze": "CENTER", "brow": 0.0, "smile": 0.1}}
+DEFAULT = {"interval_ms": round(CAPTURE_INTERVAL_MS), "width": CAPTURE_MAX_WIDTH, "quality": CAPTURE_JPEG_QUALITY}
+
+
+def test_unanalyzed_packets_leave_no_entry():
+    advisor = CaptureAdvisor(governor=None, enabled=True)
+    for n in range(100):
+        assert advisor.advise(f"S{n}", {"interval_ms": 0}) == DEFAULT
+        assert advisor.advise(f"L{n}", {"interval_ms": 0}, frames=False) == {"interval_ms": DEFAULT["interval_ms"]}
+    assert len(advisor) == 0
+
+
+def test_backoff_still_applies_without_an_entry():
+    advisor = CaptureAdvisor(governor=None, enabled=True)
+    assert advisor.advise("S1", {"interval_ms": 900})["interval_ms"] == 900
+    assert len(advisor) == 0
+
+
+def test_evaluated_students_are_kept_until_evicted():
+    clock = ManualClock(0.0)
+    wheel = TimerWheel(tick=0.5, clock=clock)
+    evaluator = SessionEvaluator(ttl_seconds=30.0, offline_seconds=10.0, proctoring=ProctoringEngine(wheel),
+                                 confusion=ConfusionEngine(wheel), wheel=wheel, fusion=MetricFusion(enabled=False))
+    advisor = CaptureAdvisor(governor=None, enabled=True, clock=clock)
+    evaluator.evict_listeners.append(advisor.forget)
+
+    state = evaluator.evaluate("S1", "ROOM", dict(FACE))
+    assert advisor.advise("S1", {"interval_ms": 0}, state, FACE)["width"] < CAPTURE_MAX_WIDTH
+    # Later dropped frames see the kept face width
+    assert advisor.advise("S1", {"interval_ms": 0})["width"] < CAPTURE_MAX_WIDTH
+    assert len(advisor) == 1
+
+    clock.set(31.0)
+    wheel.advance()
+    assert len(evaluator) == 0 and len(advisor) == 0
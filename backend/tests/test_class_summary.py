@@ -0,0 +1,101 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from app.models.session_state import ALERT_NAMES, STATUS_NAMES
+from app.services.confusion import ConfusionEngine
+from app.services.metric_fusion import MetricFusion
+from app.services.proctoring import ProctoringEngine
+from app.services.session_evaluator import SessionEvaluator
+from app.state.class_summary import ClassSummaryStore
+from app.state.session_store import SessionStore
+from app.utils.timers import ManualClock, TimerWheel
+
+ROOMS = ("A", "B")
+NONE = ALERT_NAMES.index("NONE")
+FRAMES = [
+    {"face_count": 1, "metrics": {"gaze": "CENTER", "brow": 0.0, "smile": 0.1}},
+    {"face_count": 1, "metrics": {"gaze": "LEFT", "brow": 0.0, "smile": 0.1}},
+    {"face_count": 1, "metrics": {"gaze": "CENTER", "brow": 0.8, "smile": 0.0}},
+    {"face_count": 0, "metrics": {}},
+    {"face_count": 2, "metrics": {"gaze": "CENTER", "brow": 0.0, "smile": 0.1}},
+]
+
+
+def recomputed(store: SessionStore, session_id: str) -> dict:
+    # What the room's current aggregates should be, straight from the store
+    students = list(store.room(session_id).values())
+    statuses = np.bincount([s.status for s in students], minlength=len(STATUS_NAMES))
+    alerts = np.bincount([s.alert for s in students], minlength=len(ALERT_NAMES))
+    return {
+        "students": len(students),
+        "counts": {name: int(n) for name, n in zip(STATUS_NAMES, statuses)},
+        "alerts": {name: int(n) for code, (name, n) in enumerate(zip(ALERT_NAMES, alerts)) if code != NONE},
+    }
+
+
+def percent(values) -> dict:
+    total = sum(values)
+    return {name: value * 100 / total for name, value in zip(STATUS_NAMES, values)}
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_summary_matches_the_store_after_mixed_transitions(seed):
+    rng = random.Random(seed)
+    clock = ManualClock(0.0)
+    wheel = TimerWheel(tick=0.5, clock=clock)
+    evaluator = SessionEvaluator(ttl_seconds=30.0, offline_seconds=10.0, proctoring=ProctoringEngine(wheel),
+                                 confusion=ConfusionEngine(wheel), wheel=wheel, fusion=MetricFusion(enabled=False))
+    store = SessionStore(tombstones=64)
+    summaries = ClassSummaryStore(bucket_seconds=5.0, clock=clock)
+    store.listeners.append(summaries.apply)
+    # Timer states (gaze-away / confusion maturing, OFFLINE) and evictions, as in student.py
+    evaluator.listeners.append(store.put)
+    evaluator.evict_listeners.append(store.remove)
+    evicted = []
+    evaluator.evict_listeners.append(evicted.append)
+
+    rooms = {}
+    # Student-seconds per room and status, and alert onsets per room
+    seconds = {room: np.zeros(len(STATUS_NAMES)) for room in ROOMS}
+    onsets = {room: 0 for room in ROOMS}
+
+    def count_onsets(previous, current):
+        if current is not None and current.alert != NONE and (
+                previous is None or previous.session_id != current.session_id or previous.alert != current.alert):
+            onsets[current.session_id] += 1
+    store.listeners.append(count_onsets)
+
+    seen = set()
+    for _ in range(300):
+        dt = rng.uniform(0.5, 3.0)
+        for room in ROOMS:
+            seconds[room] += np.array(list(recomputed(store, room)["counts"].values())) * dt
+        clock.set(clock() + dt)
+        wheel.advance()
+
+        student_id = f"S{rng.randrange(6)}"
+        if rng.random() < 0.7:
+            if student_id not in rooms or rng.random() < 0.1:
+                rooms[student_id] = rng.choice(ROOMS)
+            frame = rng.choice(FRAMES)
+            store.put(evaluator.evaluate(student_id, rooms[student_id], {**frame, "metrics": dict(frame["metrics"])}))
+
+        for room in ROOMS:
+            summary = json.loads(summaries.to_json(room, empty=True))
+            assert {key: summary[key] for key in ("students", "counts", "alerts")} == recomputed(store, room)
+            seen.update(s.status for s in store.room(room).values())
+
+    # Windows are cached within a bucket: read them at the start of the next one
+    dt = 5.0 - clock() % 5.0
+    for room in ROOMS:
+        seconds[room] += np.array(list(recomputed(store, room)["counts"].values())) * dt
+    clock.set(clock() + dt)
+    for room in ROOMS:
+        window = json.loads(summaries.to_json(room))["windows"]["15m"]
+        assert window["status"] == pytest.approx(percent(seconds[room]), abs=0.051)
+        assert sum(window["alerts"].values()) == onsets[room]
+    # The run went through every status, OFFLINE and evictions included
+    assert seen == set(range(len(STATUS_NAMES))) and evicted
@@ -0,0 +1,250 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models.session_state import StudentRecord, STATUS_CODES
+from app.routes import teacher
+from app.services.connection_manager import ConnectionManager
+from app.state.class_summary import ClassSummaryStore
+from app.state.session_store import SessionStore
+
+CONFUSED = STATUS_CODES["CONFUSED"]
+
+
+class FakeWebSocket:
+    """Teacher socket stand-in: records what it is sent. A cleared `gate` holds every send."""
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await self.gate.wait()
+        self.sent.append(json.loads(message))
+
+    async def close(self):
+        pass
+
+    def take(self) -> list:
+        sent, self.sent = self.sent, []
+        return sent
+
+
+def record(student_id: str, session_id: str, status: int = 0) -> StudentRecord:
+    return StudentRecord(student_id, session_id, status, last_updated=1000.0)
+
+
+def students(message: dict) -> list:
+    return sorted(s["student_id"] for s in message["students"])
+
+
+async def settle():
+    # Lets the sender tasks drain their queues
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def store():
+    return SessionStore(tombstones=8)
+
+
+def new_manager(store, queue_size: int = 8, send_timeout: float = 1.0) -> ConnectionManager:
+    # The ticker never fires during a test: flush() is called explicitly
+    return ConnectionManager(store, hz=0.001, queue_size=queue_size, send_timeout=send_timeout,
+                             summaries=ClassSummaryStore(), summary_seconds=1000.0)
+
+
+def put(manager: ConnectionManager, state: StudentRecord):
+    manager.store.put(state)
+    manager.mark_dirty(state.session_id, state.student_id)
+
+
+# --- subscriptions ---
+
+def test_deltas_reach_only_the_subscribed_rooms(store):
+    async def run():
+        manager = new_manager(store)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, ["A"])
+        await settle()
+        assert websocket.take() == [{"type": "snapshot", "students": []}]
+
+        put(manager, record("X", "A"))
+        put(manager, record("Y", "B"))
+        manager.flush()
+        await settle()
+        [delta] = websocket.take()
+        assert (delta["type"], delta["session_id"], students(delta), delta["removed"]) == ("delta", "A", ["X"], [])
+        await manager.stop()
+    asyncio.run(run())
+
+
+def test_subscribe_resyncs_with_the_added_rooms(store):
+    async def run():
+        manager = new_manager(store)
+        store.put(record("X", "A"))
+        store.put(record("Y", "B"))
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, ["A"])
+        await settle()
+        assert students(websocket.take()[0]) == ["X"]
+
+        manager.subscribe(websocket, ["B"])
+        await settle()
+        [snapshot] = websocket.take()
+        assert snapshot["type"] == "snapshot" and students(snapshot) == ["X", "Y"]
+        await manager.stop()
+    asyncio.run(run())
+
+
+def test_leaving_the_last_room_follows_none(store):
+    async def run():
+        manager = new_manager(store)
+        store.put(record("X", "A"))
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, ["A", "B"])
+        await settle()
+        websocket.take()
+
+        manager.unsubscribe(websocket, ["A"])
+        manager.unsubscribe(websocket, ["B"])
+        await settle()
+        assert websocket.take()[-1] == {"type": "snapshot", "students": []}
+        assert manager.active_connections[websocket].subscriptions == set()
+
+        put(manager, record("X", "A", CONFUSED))
+        put(manager, record("Z", "C"))
+        manager.flush()
+        await settle()
+        assert websocket.take() == []
+        await manager.stop()
+    asyncio.run(run())
+
+
+def test_subscribe_without_rooms_follows_every_room(store):
+    async def run():
+        manager = new_manager(store)
+        store.put(record("X", "A"))
+        store.put(record("Y", "B"))
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, ["A"])
+        manager.unsubscribe(websocket, ["A"])
+        manager.subscribe(websocket, [])
+        await settle()
+        assert students(websocket.take()[-1]) == ["X", "Y"]
+        assert manager.active_connections[websocket].subscriptions is None
+
+        put(manager, record("Z", "C"))
+        manager.flush()
+        await settle()
+        assert [m["session_id"] for m in websocket.take()] == ["C"]
+        await manager.stop()
+    asyncio.run(run())
+
+
+# --- delta ticks ---
+
+def test_changes_between_ticks_coalesce_into_one_delta(store):
+    async def run():
+        manager = new_manager(store)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        put(manager, record("S3", "ROOM"))
+        manager.flush()
+        await settle()
+        websocket.take()
+
+        put(manager, record("S1", "ROOM"))
+        put(manager, record("S1", "ROOM", CONFUSED))
+        put(manager, record("S2", "ROOM"))
+        store.remove("S3")
+        manager.mark_dirty("ROOM", "S3")
+        manager.flush()
+        await settle()
+        [delta] = websocket.take()
+        assert students(delta) == ["S1", "S2"] and delta["removed"] == ["S3"]
+        assert [s["status"] for s in delta["students"] if s["student_id"] == "S1"] == ["CONFUSED"]
+        # Nothing dirty: no message
+        manager.flush()
+        await settle()
+        assert websocket.take() == []
+        await manager.stop()
+    asyncio.run(run())
+
+
+def test_queue_overflow_resyncs_with_one_snapshot(store):
+    async def run():
+        manager = new_manager(store, queue_size=2)
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        await manager.connect(websocket)
+        await settle()
+        # The sender holds the first snapshot; five ticks overflow the queue of two
+        for n in range(5):
+            put(manager, record(f"S{n}", "ROOM"))
+            manager.flush()
+        conn = manager.active_connections[websocket]
+        assert conn.resyncing and conn.queue.qsize() == 1
+
+        websocket.gate.set()
+        await settle()
+        first, second = websocket.take()
+        assert (first, second["type"]) == ({"type": "snapshot", "students": []}, "snapshot")
+        assert students(second) == ["S0", "S1", "S2", "S3", "S4"]
+        # Back to deltas after the resync
+        put(manager, record("S0", "ROOM", CONFUSED))
+        manager.flush()
+        await settle()
+        assert [m["type"] for m in websocket.take()] == ["delta"]
+        await manager.stop()
+    asyncio.run(run())
+
+
+def test_a_stuck_teacher_does_not_hold_back_the_others(store):
+    async def run():
+        manager = new_manager(store, send_timeout=0.05)
+        fast, stuck = FakeWebSocket(), FakeWebSocket()
+        stuck.gate.clear()
+        await manager.connect(fast)
+        await manager.connect(stuck)
+        await settle()
+        for n in range(3):
+            put(manager, record(f"S{n}", "ROOM"))
+            manager.flush()
+            await settle()
+        assert [m["type"] for m in fast.take()] == ["snapshot", "delta", "delta", "delta"]
+
+        # The stuck socket times out and is dropped; the other one keeps its deltas
+        await asyncio.sleep(0.1)
+        assert list(manager.active_connections) == [fast]
+        put(manager, record("S0", "ROOM", CONFUSED))
+        manager.flush()
+        await settle()
+        assert [m["type"] for m in fast.take()] == ["delta"] and stuck.sent == []
+        await manager.stop()
+    asyncio.run(run())
+
+
+# --- /teacher/ws commands ---
+
+def test_malformed_session_ids_are_ignored(store, monkeypatch):
+    manager = new_manager(store)
+    monkeypatch.setattr(teacher, "manager", manager)
+    app = FastAPI()
+    app.include_router(teacher.router)
+    with TestClient(app).websocket_connect("/teacher/ws?session_id=A") as websocket:
+        assert websocket.receive_json()["type"] == "snapshot"
+        # A bare string would otherwise be taken as one room per character
+        websocket.send_text(json.dumps({"action": "subscribe", "session_ids": "ROOM"}))
+        websocket.send_text(json.dumps({"action": "subscribe", "session_ids": ["B", 7]}))
+        websocket.send_text(json.dumps({"action": "subscribe", "session_ids": ["B"]}))
+        assert websocket.receive_json()["type"] == "snapshot"
+        [conn] = manager.active_connections.values()
+        assert conn.subscriptions == {"A", "B"}
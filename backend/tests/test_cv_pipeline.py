@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from app.config import ROI_PADDING
+from app.services import cv_pipeline
+from app.services.analyzer_session import AnalyzerSessionRegistry
+from app.services.cv_pipeline import CVPipeline, synthetic_frame
+from app.services.landmark_metrics import (
+    NUM_LANDMARKS, FACE_LEFT, FACE_RIGHT, FOREHEAD, CHIN, GAZE_LEFT_RATIO, GAZE_RIGHT_RATIO,
+)
+from app.services.preprocessing import FramePreprocessor
+
+# Face box (normalized x, y, w, h) of synthetic_frame()'s face
+FACE = (0.35, 0.25, 0.3, 0.5)
+
+
+class FakeDetector:
+    """FaceDetection stand-in: reports `faces` boxes, the first one being FACE."""
+    def __init__(self):
+        self.faces = 1
+        self.calls = 0
+
+    def process(self, rgb):
+        self.calls += 1
+        box = SimpleNamespace(xmin=FACE[0], ymin=FACE[1], width=FACE[2], height=FACE[3])
+        detection = SimpleNamespace(score=[0.9], location_data=SimpleNamespace(relative_bounding_box=box))
+        return SimpleNamespace(detections=[detection] * self.faces)
+
+
+class FakeMesh:
+    """Tracking FaceMesh stand-in: a face filling the middle of its input (the padded face box)."""
+    def __init__(self):
+        self.shift = 0.0
+        self.inputs = []
+
+    def process(self, rgb):
+        self.inputs.append(rgb.shape[:2])
+        lo, hi = ROI_PADDING / (1 + 2 * ROI_PADDING), (1 + ROI_PADDING) / (1 + 2 * ROI_PADDING)
+        mid = (lo + hi) / 2
+        points = [SimpleNamespace(x=mid + self.shift, y=mid, z=0.0) for _ in range(NUM_LANDMARKS)]
+        points[FACE_LEFT].x, points[FACE_RIGHT].x = lo + self.shift, hi + self.shift
+        points[FOREHEAD].y, points[CHIN].y = lo, hi
+        return SimpleNamespace(multi_face_landmarks=[SimpleNamespace(landmark=points)])
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pipeline():
+    # The pipeline minus MediaPipe: fake detector and mesh graphs
+    pipeline = CVPipeline.__new__(CVPipeline)
+    pipeline.use_fallback = False
+    pipeline.keep_landmarks = False
+    pipeline.gaze_left, pipeline.gaze_right = GAZE_LEFT_RATIO, GAZE_RIGHT_RATIO
+    pipeline.preprocessor = FramePreprocessor()
+    pipeline.face_detector = FakeDetector()
+    pipeline.mesh = FakeMesh()
+    pipeline.sessions = AnalyzerSessionRegistry(lambda: pipeline.mesh)
+    return pipeline
+
+
+def with_second_face(frame):
+    frame = frame.copy()
+    cv2.ellipse(frame, (60, 120), (40, 55), 0, 0, 360, (150, 180, 225), -1)
+    return frame
+
+
+def with_face_change(frame):
+    # A change inside the tracked face only (an eye closing)
+    frame = frame.copy()
+    cv2.rectangle(frame, (266, 196), (294, 224), (150, 180, 225), -1)
+    return frame
+
+
+def test_tracking_mesh_sees_the_detection_window(pipeline):
+    frame = synthetic_frame()
+    assert pipeline.process_frame(frame, "S")["face_count"] == 1
+    assert pipeline.sessions.get("S").locked
+    pipeline.process_frame(with_face_change(frame), "S")
+    assert pipeline.face_detector.calls == 1
+    assert pipeline.mesh.inputs[0] == pipeline.mesh.inputs[1] != frame.shape[:2]
+
+
+def test_face_stepping_in_forces_a_detection(pipeline):
+    frame = synthetic_frame()
+    pipeline.process_frame(frame, "S")
+    pipeline.face_detector.faces = 2
+    results = pipeline.process_frame(with_second_face(frame), "S")
+    assert pipeline.face_detector.calls == 2
+    assert results["face_count"] == 2 and not pipeline.sessions.get("S").locked
+
+
+def test_scene_check_can_be_turned_off(pipeline, monkeypatch):
+    monkeypatch.setattr(cv_pipeline, "DETECTION_SCENE_THRESHOLD", 0)
+    frame = synthetic_frame()
+    pipeline.process_frame(frame, "S")
+    pipeline.face_detector.faces = 2
+    assert pipeline.process_frame(with_second_face(frame), "S")["face_count"] == 1
+    assert pipeline.face_detector.calls == 1
+
+
+def test_mesh_jump_forces_a_detection(pipeline):
+    frame = synthetic_frame()
+    pipeline.process_frame(frame, "S")
+    pipeline.mesh.shift = 0.3
+    pipeline.process_frame(with_face_change(frame), "S")
+    assert pipeline.face_detector.calls == 2
+
+
+def test_reused_frames_count_toward_the_detection_refresh(pipeline, monkeypatch):
+    monkeypatch.setattr(cv_pipeline, "DETECTION_REFRESH_FRAMES", 3)
+    frame = synthetic_frame()
+    static = [pipeline.process_frame(frame, "S").get("static", False) for _ in range(9)]
+    # Detection on frames 1, 5 and 9; the frames in between reuse the last analysis
+    assert pipeline.face_detector.calls == 3
+    assert static == [False, True, True, True, False, True, True, True, False]
@@ -0,0 +1,35 @@
+import io
+import json
+
+import numpy as np
+
+from app.utils.flight_recorder import FlightRecorder, SOURCE_FRAMES, from_npz, to_npz
+
+
+def cv_result(gaze_ratio: float) -> dict:
+    return {"face_count": 1, "metrics": {"gaze": "CENTER", "gaze_ratio": gaze_ratio}, "timings": {"mesh": 0.004}}
+
+
+def test_npz_keeps_students_apart_from_the_metadata():
+    recorder = FlightRecorder(capacity=4)
+    # Student ids that are also the archive's metadata keys
+    for n, student_id in enumerate(("_sessions", "_tables", "S1")):
+        for frame in range(n + 1):
+            recorder.record(student_id, f"ROOM{n}", frame, "PROCESSED", SOURCE_FRAMES, 0.001, cv_result(0.5 + frame / 10))
+    snapshot = recorder.snapshot()
+
+    data = to_npz(snapshot)
+    with np.load(io.BytesIO(data)) as archive:
+        assert sorted(archive.files) == ["_sessions", "_tables", "s/S1", "s/_sessions", "s/_tables"]
+        assert json.loads(archive["_tables"].item())["outcome"][0] == "PROCESSED"
+
+    loaded = {student_id: (session_id, rows) for student_id, session_id, rows in from_npz(data)}
+    assert sorted(loaded) == ["S1", "_sessions", "_tables"]
+    for student_id, session_id, rows in snapshot:
+        assert loaded[student_id][0] == session_id
+        assert loaded[student_id][1].dtype == rows.dtype and loaded[student_id][1].tobytes() == rows.tobytes()
+    assert loaded["S1"][1]["gaze_ratio"].tolist() == np.float32([0.5, 0.6, 0.7]).tolist()
+
+
+def test_empty_dump_loads_empty():
+    assert from_npz(to_npz([])) == []
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time import FORBIDDEN
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Same budget as `python -m benchmarks.import_time`
+BUDGET_MS = 1500.0
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import app.main
+print((time.perf_counter() - started) * 1000)
+print("loaded:" + ",".join(sorted({{m.split(".")[0] for m in sys.modules}} & {forbidden!r})))
+"""
+
+
+def import_app(probe: str):
+    proc = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    elapsed, loaded = proc.stdout.splitlines()[-2:]
+    return float(elapsed), loaded[len("loaded:"):]
+
+
+def test_app_main_imports_within_budget_without_model_runtimes():
+    probe = PROBE.format(forbidden=set(FORBIDDEN))
+    # Best of three fresh interpreters: the first one warms the file cache
+    runs = [import_app(probe) for _ in range(3)]
+    assert all(loaded == "" for _, loaded in runs), runs[0][1]
+    assert "mediapipe" in FORBIDDEN and "cv2" in FORBIDDEN
+    assert min(elapsed for elapsed, _ in runs) < BUDGET_MS
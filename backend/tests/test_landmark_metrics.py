@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+landmark_pb2 = pytest.importorskip("mediapipe.framework.formats.landmark_pb2")
+
+from app.services.cv_pipeline import CVPipeline
+from app.services.landmark_metrics import (
+    NUM_LANDMARKS, FACE_LEFT, FACE_RIGHT, LEFT_EYE_OUTER, LEFT_EYE_INNER,
+    FOREHEAD, CHIN, landmarks_to_array, frame_metrics, compute_metrics, compute_metrics_batch,
+)
+
+
+def to_proto(points: np.ndarray, visibility: bool = False):
+    landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in points:
+        point = landmarks.landmark.add(x=x, y=y, z=z)
+        if visibility:
+            point.visibility = 0.5
+    return landmarks
+
+
+@pytest.fixture(scope="module")
+def faces():
+    # Uniform points land ratios on both sides of every threshold; two degenerate faces
+    arrays = np.random.default_rng(7).random((300, NUM_LANDMARKS, 3), dtype=np.float32)
+    arrays[0, FACE_LEFT, 0] = arrays[0, FACE_RIGHT, 0]          # zero face width
+    arrays[1, LEFT_EYE_INNER, 0] = arrays[1, LEFT_EYE_OUTER, 0]  # zero eye width
+    return arrays
+
+
+def test_landmarks_to_array_reads_every_point(faces):
+    for visibility in (False, True):
+        assert np.array_equal(landmarks_to_array(to_proto(faces[2], visibility)), faces[2])
+    out = np.empty((NUM_LANDMARKS, 3), dtype=np.float32)
+    assert landmarks_to_array(to_proto(faces[3]), out) is out and np.array_equal(out, faces[3])
+
+
+def test_worker_path_matches_the_helpers(faces):
+    for points in faces:
+        proto = to_proto(points)
+        metrics, _ = frame_metrics(proto)
+        assert metrics["gaze"] == CVPipeline._detect_gaze(None, proto, 640, 480)
+        assert metrics["brow"] == CVPipeline._calculate_brow_furrow(None, proto)
+        assert metrics["smile"] == CVPipeline._calculate_smile(None, proto)
+
+
+def test_every_path_computes_the_same_metrics(faces):
+    batch = compute_metrics_batch(faces)
+    for i, points in enumerate(faces):
+        live, _ = frame_metrics(to_proto(points))
+        assert live == compute_metrics(points)
+        assert live["gaze"] == batch["gaze"][i]
+        for name, value in live.items():
+            if name != "gaze":
+                assert value == pytest.approx(batch[name][i], abs=1e-9)
+
+
+def test_mesh_without_iris_reads_center(faces):
+    points = faces[5][:468]
+    live, _ = frame_metrics(to_proto(points))
+    assert live == compute_metrics(points)
+    assert (live["gaze"], live["gaze_ratio"]) == ("CENTER", 0.5)
+    assert compute_metrics_batch(points[None])["gaze"][0] == "CENTER"
+
+
+def test_crop_coordinates_give_the_frame_metrics(faces):
+    # A 200 x 260 px crop at (300, 100) of a 640 x 480 frame: mesh points map affinely to the frame
+    w, h, (x0, y0, x1, y1) = 640, 480, (300, 100, 500, 360)
+    scale = np.array([(x1 - x0) / w, (y1 - y0) / h, 1.0])
+    offset = np.array([x0 / w, y0 / h, 0.0])
+    for points in faces[2:20]:
+        metrics, bounds = frame_metrics(to_proto(points), aspect=scale[1] / scale[0])
+        expected = compute_metrics(points.astype(np.float64) * scale + offset)
+        for name, value in expected.items():
+            assert metrics[name] == (value if name == "gaze" else pytest.approx(value, abs=1e-9))
+        xs, ys = points[[FACE_LEFT, FACE_RIGHT], 0], points[[FOREHEAD, CHIN], 1]
+        assert bounds == pytest.approx((xs.min(), ys.min(), xs.max(), ys.max()))
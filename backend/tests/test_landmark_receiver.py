@@ -0,0 +1,125 @@
+import struct
+
+import numpy as np
+import pytest
+
+from app.services.landmark_metrics import (
+    NUM_LANDMARKS, FACE_LEFT, FACE_RIGHT, FOREHEAD, CHIN, LEFT_EYE_OUTER, LEFT_EYE_INNER,
+)
+from app.services.landmark_receiver import (
+    LANDMARK_HEADER, LANDMARK_VERSION, MESH_SIZES, landmark_receiver, LandmarkPacketError,
+)
+
+
+def face(count: int = NUM_LANDMARKS) -> np.ndarray:
+    # A plausible mesh: points spread over a 0.3-0.7 box, the landmarks the checks use in place
+    points = np.random.default_rng(3).uniform(0.3, 0.7, (count, 3)).astype(np.float32)
+    points[:, 2] = (points[:, 2] - 0.5) * 0.2
+    points[FACE_LEFT, 0], points[FACE_RIGHT, 0] = 0.3, 0.7
+    points[FOREHEAD, 1], points[CHIN, 1] = 0.25, 0.75
+    points[LEFT_EYE_OUTER, 0], points[LEFT_EYE_INNER, 0] = 0.38, 0.46
+    return points
+
+
+def packet(points=None, face_count: int = 1, count: int = None, version: int = LANDMARK_VERSION,
+           seq: int = 7, timestamp: float = 1.7e12) -> bytes:
+    body = b"" if points is None else np.asarray(points, dtype="<f2").tobytes()
+    if count is None:
+        count = 0 if points is None else len(points)
+    return LANDMARK_HEADER.pack(seq, timestamp, face_count, version, count) + body
+
+
+@pytest.mark.parametrize("count", MESH_SIZES)
+def test_accepts_a_good_packet(count):
+    parsed = landmark_receiver.parse(packet(face(count)))
+    assert (parsed.seq, parsed.timestamp, parsed.face_count) == (7, 1.7e12, 1)
+    assert parsed.points.shape == (count, 3) and parsed.points.dtype == np.float32
+    result = landmark_receiver.analyze(parsed)
+    assert result["face_count"] == 1 and result["metrics"]["gaze"] in ("LEFT", "CENTER", "RIGHT")
+
+
+@pytest.mark.parametrize("faces", (0, 2))
+def test_accepts_a_face_count_without_landmarks(faces):
+    parsed = landmark_receiver.parse(packet(face_count=faces))
+    assert parsed.face_count == faces and parsed.points is None
+
+
+def test_accepts_a_packet_behind_an_outer_header():
+    parsed = landmark_receiver.parse(b"\xff" * 5 + packet(face()), offset=5)
+    assert parsed.points.shape == (NUM_LANDMARKS, 3)
+
+
+@pytest.mark.parametrize("cut", (1, LANDMARK_HEADER.size - 1, LANDMARK_HEADER.size, LANDMARK_HEADER.size + 6 * 100))
+def test_rejects_truncated_packets(cut):
+    with pytest.raises(LandmarkPacketError):
+        landmark_receiver.parse(packet(face())[:cut])
+
+
+@pytest.mark.parametrize("count", (NUM_LANDMARKS - 1, NUM_LANDMARKS + 1, 468 + 478))
+def test_rejects_a_count_that_does_not_match_the_payload(count):
+    with pytest.raises(LandmarkPacketError, match="size"):
+        landmark_receiver.parse(packet(face(), count=count))
+
+
+def test_rejects_trailing_bytes():
+    with pytest.raises(LandmarkPacketError, match="size"):
+        landmark_receiver.parse(packet(face()) + b"\0" * 6)
+
+
+def test_rejects_an_unexpected_mesh_size():
+    with pytest.raises(LandmarkPacketError, match="Expected"):
+        landmark_receiver.parse(packet(face()[:400]))
+
+
+@pytest.mark.parametrize("faces", (0, 2))
+def test_rejects_landmarks_without_exactly_one_face(faces):
+    with pytest.raises(LandmarkPacketError, match="exactly one face"):
+        landmark_receiver.parse(packet(face(), face_count=faces))
+
+
+def test_rejects_one_face_without_landmarks():
+    with pytest.raises(LandmarkPacketError, match="exactly one face"):
+        landmark_receiver.parse(packet(face_count=1))
+
+
+def test_rejects_other_versions_and_implausible_face_counts():
+    with pytest.raises(LandmarkPacketError, match="version"):
+        landmark_receiver.parse(packet(face(), version=LANDMARK_VERSION + 1))
+    with pytest.raises(LandmarkPacketError, match="face count"):
+        landmark_receiver.parse(packet(face_count=200))
+
+
+@pytest.mark.parametrize("value", (np.nan, np.inf, -np.inf))
+def test_rejects_non_finite_coordinates(value):
+    points = face()
+    points[100, 1] = value
+    with pytest.raises(LandmarkPacketError, match="Non-finite"):
+        landmark_receiver.parse(packet(points))
+
+
+@pytest.mark.parametrize("timestamp", (float("nan"), float("inf")))
+def test_rejects_a_non_finite_timestamp(timestamp):
+    with pytest.raises(LandmarkPacketError, match="timestamp"):
+        landmark_receiver.parse(packet(face(), timestamp=timestamp))
+
+
+@pytest.mark.parametrize("axis,value", ((0, 1.6), (0, -0.6), (1, 2.0), (2, 2.5), (2, -3.0)))
+def test_rejects_out_of_range_coordinates(axis, value):
+    points = face()
+    points[200, axis] = value
+    with pytest.raises(LandmarkPacketError, match="outside"):
+        landmark_receiver.parse(packet(points))
+
+
+def test_rejects_implausible_geometry():
+    tiny = face() * 0.01 + 0.5
+    with pytest.raises(LandmarkPacketError, match="face size"):
+        landmark_receiver.parse(packet(tiny))
+    upside_down = face()
+    upside_down[FOREHEAD, 1], upside_down[CHIN, 1] = 0.75, 0.25
+    with pytest.raises(LandmarkPacketError, match="Forehead"):
+        landmark_receiver.parse(packet(upside_down))
+    no_eye = face()
+    no_eye[LEFT_EYE_INNER, 0] = no_eye[LEFT_EYE_OUTER, 0]
+    with pytest.raises(LandmarkPacketError, match="eye width"):
+        landmark_receiver.parse(packet(no_eye))
@@ -0,0 +1,127 @@
+import itertools
+
+import pytest
+
+from app.services.confusion import ConfusionEngine
+from app.services.landmark_metrics import (
+    GAZE_LEFT_RATIO, GAZE_RIGHT_RATIO, BROW_BASELINE, BROW_GAIN, SMILE_RATIO, SMILE_ON, SMILE_OFF,
+)
+from app.services.metric_fusion import MetricFusion, smile_score
+from app.utils.timers import ManualClock, TimerWheel
+
+
+def raw_metrics(gaze_ratio: float, brow_ratio: float, mouth_ratio: float, **extra) -> dict:
+    # What landmark_metrics.compute_metrics reports for these ratios (single-frame decisions)
+    # on a frontal face whose eyes agree
+    gaze = "LEFT" if gaze_ratio < GAZE_LEFT_RATIO else "RIGHT" if gaze_ratio > GAZE_RIGHT_RATIO else "CENTER"
+    return {
+        "gaze": gaze, "gaze_ratio": gaze_ratio, "gaze_ratio_right": gaze_ratio, "eye_balance": 0.5,
+        "brow_ratio": brow_ratio, "brow": max(0.0, min(1.0, (BROW_BASELINE - brow_ratio) * BROW_GAIN)),
+        "mouth_ratio": mouth_ratio, "smile": SMILE_ON if mouth_ratio > SMILE_RATIO else SMILE_OFF,
+        "ear": 0.3, "yaw": 0.05, "pitch": 0.05, **extra,
+    }
+
+
+def feed(fusion: MetricFusion, metrics: dict, frames: int = 5, student_id: str = "S1", start: float = 0.0):
+    fused = None
+    for i in range(frames):
+        fused = fusion.fuse(student_id, {"face_count": 1, "metrics": dict(metrics)}, start + i * 0.2)
+    return fused
+
+
+@pytest.fixture
+def confusion():
+    return ConfusionEngine(TimerWheel(clock=ManualClock()))
+
+
+GAZE_RATIOS = (0.2, 0.44, 0.45, 0.46, 0.5, 0.55, 0.56, 0.8)
+BROW_RATIOS = (0.15, 0.26, 0.265, 0.27, 0.3)
+MOUTH_RATIOS = (0.0, 0.3, 0.35, 0.44, 0.45, 0.451, 0.5, 0.7)
+
+
+@pytest.mark.parametrize("gaze_ratio,brow_ratio,mouth_ratio",
+                         list(itertools.product(GAZE_RATIOS, BROW_RATIOS, MOUTH_RATIOS)))
+def test_constant_input_decides_like_the_single_frame_metrics(confusion, gaze_ratio, brow_ratio, mouth_ratio):
+    raw = raw_metrics(gaze_ratio, brow_ratio, mouth_ratio)
+    fused = feed(MetricFusion(enabled=True), raw)
+    assert fused["gaze"] == raw["gaze"]
+    assert fused["brow"] == pytest.approx(raw["brow"])
+    assert confusion.calculate_state(fused["brow"], fused["smile"]) == \
+        confusion.calculate_state(raw["brow"], raw["smile"])
+
+
+def test_smile_score_keeps_the_cutoff_and_rises_on_each_side():
+    below = [smile_score(m) for m in (0.3, 0.35, 0.4, SMILE_RATIO)]
+    above = [smile_score(m) for m in (SMILE_RATIO + 1e-6, 0.5, 0.55, 0.8)]
+    assert below == sorted(below) and max(below) <= SMILE_OFF < 0.3
+    assert above == sorted(above) and min(above) >= SMILE_ON > 0.5 and max(above) <= 1.0
+
+
+def test_disabled_returns_the_raw_metrics():
+    raw = raw_metrics(0.6, 0.2, 0.3)
+    assert MetricFusion(enabled=False).fuse("S1", {"face_count": 1, "metrics": raw}, 0.0) is raw
+
+
+def test_gaze_label_clears_only_inside_the_hysteresis_margin():
+    fusion = MetricFusion(enabled=True, hysteresis=0.02)
+    assert feed(fusion, raw_metrics(0.60, 0.25, 0.5), frames=20)["gaze"] == "RIGHT"
+    # Back just inside the cutoff: still RIGHT; well inside: CENTER
+    assert feed(fusion, raw_metrics(0.54, 0.25, 0.5), frames=20, start=10.0)["gaze"] == "RIGHT"
+    assert feed(fusion, raw_metrics(0.52, 0.25, 0.5), frames=20, start=20.0)["gaze"] == "CENTER"
+
+
+def test_both_eyes_are_blended_by_how_frontal_they_are():
+    fusion = MetricFusion(enabled=True)
+    # Left eye reads LEFT alone, the right eye (more frontal) reads center
+    fused = feed(fusion, raw_metrics(0.43, 0.25, 0.5, gaze_ratio_right=0.5, eye_balance=0.4))
+    assert fused["gaze"] == "CENTER"
+    assert fused["gaze_offset"] == pytest.approx(0.4 * 0.43 + 0.6 * 0.5 - 0.5)
+    assert feed(MetricFusion(enabled=True, eye_blend=0.0), raw_metrics(0.43, 0.25, 0.5, gaze_ratio_right=0.5))["gaze"] \
+        == "LEFT"
+
+
+def test_turned_head_reads_as_looking_away():
+    fusion = MetricFusion(enabled=True)
+    # Irises centered in the eyes, head turned toward the frame's right / left edge
+    assert feed(fusion, raw_metrics(0.5, 0.25, 0.5, yaw=0.3))["gaze"] == "RIGHT"
+    assert feed(fusion, raw_metrics(0.5, 0.25, 0.5, yaw=-0.3), student_id="S2")["gaze"] == "LEFT"
+    # Inside the dead zone the head turn does not count
+    assert feed(fusion, raw_metrics(0.5, 0.25, 0.5, yaw=0.12), student_id="S3")["gaze"] == "CENTER"
+    assert feed(MetricFusion(enabled=True, head_gain=0.0), raw_metrics(0.5, 0.25, 0.5, yaw=0.3))["gaze"] == "CENTER"
+
+
+def test_measured_check_uses_the_instance_cutoffs():
+    fusion = MetricFusion(enabled=True)
+    fusion.gaze_left, fusion.gaze_right = 0.3, 0.7
+    # CENTER at 0.35 is a measurement with these cutoffs (not a missing iris)
+    fused = feed(fusion, dict(raw_metrics(0.35, 0.25, 0.5), gaze="CENTER"))
+    assert fused["gaze"] == "CENTER" and fused["gaze_offset"] == pytest.approx(-0.15)
+
+
+def test_jumps_are_taken_at_once_by_default():
+    fusion = MetricFusion(enabled=True)
+    feed(fusion, raw_metrics(0.5, 0.25, 0.5), frames=10)
+    assert fusion.fuse("S1", {"face_count": 1, "metrics": raw_metrics(0.2, 0.25, 0.5)}, 3.0)["gaze"] == "LEFT"
+
+
+def test_single_glitched_frame_is_damped_with_jump_confirmation():
+    fusion = MetricFusion(enabled=True, confirm_jumps=True)
+    feed(fusion, raw_metrics(0.5, 0.25, 0.5), frames=10)
+    # One frame far off at 1 FPS: the estimate barely moves, the next normal frame wins
+    glitch = fusion.fuse("S1", {"face_count": 1, "metrics": raw_metrics(0.2, 0.25, 0.3)}, 3.0)
+    assert glitch["gaze"] == "CENTER"
+    assert glitch["smile"] > 0.5
+
+
+def test_lost_face_resets_the_track():
+    fusion = MetricFusion(enabled=True)
+    feed(fusion, raw_metrics(0.7, 0.25, 0.5))
+    fusion.fuse("S1", {"face_count": 0, "metrics": {}}, 2.0)
+    assert len(fusion) == 0
+
+
+def test_gaze_cutoffs_are_per_instance():
+    fusion = MetricFusion(enabled=True, gaze_left=0.3, gaze_right=0.7)
+    assert feed(fusion, raw_metrics(0.6, 0.25, 0.5))["gaze"] == "CENTER"
+    assert feed(fusion, raw_metrics(0.75, 0.25, 0.5), student_id="S2")["gaze"] == "RIGHT"
+    assert feed(MetricFusion(enabled=True), raw_metrics(0.6, 0.25, 0.5))["gaze"] == "RIGHT"
@@ -0,0 +1,139 @@
+import sqlite3
+
+import pytest
+
+from app.models.session_state import StudentRecord, STATUS_CODES
+from app.services.confusion import ConfusionEngine
+from app.services.metric_fusion import MetricFusion
+from app.services.proctoring import ProctoringEngine
+from app.services.session_evaluator import SessionEvaluator
+from app.state.persistence import StatePersistence
+from app.state.session_store import SessionStore
+from app.utils.timers import ManualClock, TimerWheel
+
+CONFUSED = STATUS_CODES["CONFUSED"]
+DISTRACTED = STATUS_CODES["DISTRACTED"]
+START = 1000.0
+
+
+def new_evaluator(clock: ManualClock) -> SessionEvaluator:
+    wheel = TimerWheel(tick=0.1, clock=clock)
+    return SessionEvaluator(ttl_seconds=300.0, offline_seconds=100.0, proctoring=ProctoringEngine(wheel),
+                            confusion=ConfusionEngine(wheel), wheel=wheel, fusion=MetricFusion(enabled=False))
+
+
+def record(student_id: str, status: int = 0, session_id: str = "ROOM") -> StudentRecord:
+    return StudentRecord(student_id, session_id, status, last_updated=START)
+
+
+@pytest.fixture
+def clock():
+    return ManualClock(START)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def open_log(path: str, clock: ManualClock, **kwargs) -> StatePersistence:
+    # The writer thread never commits on its own: the tests call _commit / _snapshot
+    persistence = StatePersistence(path, commit_ms=3_600_000, store=SessionStore(tombstones=8),
+                                   evaluator=new_evaluator(clock), **kwargs)
+    persistence.open()
+    return persistence
+
+
+def rows(path: str, table: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_changes_within_a_commit_coalesce_per_student(path, clock):
+    persistence = open_log(path, clock)
+    persistence.record(record("S1"))
+    persistence.record(record("S1"))                      # same key: not recorded
+    persistence.record(record("S1", CONFUSED))
+    persistence.record(record("S2"))
+    persistence._commit()
+    assert persistence.stats["recorded"] == 3
+    assert (persistence.stats["events"], persistence.stats["commits"]) == (2, 1)
+    assert rows(path, "events") == 2
+    persistence.close(snapshot=False)
+
+    persistence = open_log(path, clock)
+    assert persistence.store.get("S1").status == CONFUSED
+    persistence.close()
+
+
+def test_snapshot_truncates_the_log(path, clock):
+    persistence = open_log(path, clock)
+    for student_id in ("S1", "S2", "S3"):
+        persistence.record(record(student_id))
+    persistence._commit()
+    persistence._snapshot()
+    assert (rows(path, "events"), rows(path, "snapshots")) == (0, 1)
+
+    persistence.record(record("S1", CONFUSED))
+    persistence._commit()
+    persistence._snapshot()
+    # Only the latest snapshot is kept
+    assert (rows(path, "events"), rows(path, "snapshots")) == (0, 1)
+    persistence.close()
+
+
+def test_recovery_replays_the_log_tail_over_the_snapshot(path, clock):
+    persistence = open_log(path, clock)
+    persistence.record(record("S1"))
+    persistence.record(record("S2"))
+    persistence._commit()
+    persistence._snapshot()
+    # Tail: one change, one removal, one new student
+    persistence.record(record("S1", CONFUSED))
+    persistence.remove("S2")
+    persistence.record(record("S3", session_id="OTHER"))
+    persistence._commit()
+    persistence.close(snapshot=False)
+
+    persistence = open_log(path, clock)
+    store = persistence.store
+    assert sorted(s.student_id for s in store.values()) == ["S1", "S3"]
+    assert store.get("S1").status == CONFUSED and store.room_of("S3") == "OTHER"
+    assert rows(path, "events") == 3
+    persistence.close()
+
+
+def test_close_snapshots_what_is_pending(path, clock):
+    persistence = open_log(path, clock)
+    persistence.record(record("S1"))
+    persistence.close()
+    assert (rows(path, "events"), rows(path, "snapshots")) == (0, 1)
+
+    persistence = open_log(path, clock)
+    assert "S1" in persistence.store
+    persistence.close()
+
+
+def test_restore_resumes_the_rule_timers(path, clock):
+    persistence = open_log(path, clock)
+    evaluator = persistence.evaluator
+    # Looking away with a furrowed brow: both rule timers start at START
+    frame = {"face_count": 1, "metrics": {"gaze": "LEFT", "brow": 0.8, "smile": 0.0}}
+    evaluator.evaluate("S1", "ROOM", dict(frame))
+    clock.set(START + 1.5)
+    persistence.record(evaluator.evaluate("S1", "ROOM", dict(frame)))
+    assert evaluator.timers("S1") == (START, START)
+    persistence.close()
+
+    persistence = open_log(path, clock)
+    evaluator = persistence.evaluator
+    assert persistence.store.get("S1").status == CONFUSED
+    assert evaluator.confusion.confused.since("S1") == START
+    assert evaluator.proctoring.gaze_away.since("S1") == START
+    assert evaluator.confusion.confused.active("S1") and not evaluator.proctoring.gaze_away.active("S1")
+    # The restored gaze-away run still matures 3 s after it started
+    clock.set(START + 3.2)
+    evaluator.wheel.advance()
+    assert evaluator.proctoring.gaze_away.active("S1")
+    assert evaluator.evaluate("S1", "ROOM", dict(frame)).status == DISTRACTED
+    persistence.close()
@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from app.models.session_state import StudentRecord
+from app.services.confusion import ConfusionEngine
+from app.services.metric_fusion import MetricFusion
+from app.services.proctoring import ProctoringEngine
+from app.services.session_evaluator import SessionEvaluator
+from app.utils.timers import TimerWheel
+
+AWAY = {"face_count": 1, "metrics": {"gaze": "LEFT", "brow": 0.0, "smile": 0.1}}
+
+
+def make_evaluator() -> SessionEvaluator:
+    # Live wheel (monotonic clock), fusion off: the rules see these metrics as given
+    wheel = TimerWheel()
+    return SessionEvaluator(proctoring=ProctoringEngine(wheel), confusion=ConfusionEngine(wheel), wheel=wheel,
+                            fusion=MetricFusion(enabled=False))
+
+
+def test_records_and_timer_starts_are_wall_time_on_a_monotonic_wheel():
+    evaluator = make_evaluator()
+    state = evaluator.evaluate("S1", "ROOM", dict(AWAY))
+    assert state.last_updated == pytest.approx(time.time(), abs=1.0)
+    confusion_start, gaze_start = evaluator.timers("S1")
+    assert confusion_start is None
+    assert gaze_start == pytest.approx(time.time(), abs=1.0)
+
+
+def test_restore_continues_a_wall_time_run_on_the_wheel_clock():
+    evaluator = make_evaluator()
+    now = time.time()
+    evaluator.restore(StudentRecord("S1", "ROOM", 0, 0, last_updated=now), None, now - 10.0)
+    assert evaluator.proctoring.gaze_away.since("S1") == pytest.approx(time.monotonic() - 10.0, abs=1.0)
+    assert evaluator.timers("S1")[1] == pytest.approx(now - 10.0, abs=1e-3)
+    # The gaze-away run restored 10 s back is over the 3 s limit on the next frame
+    assert evaluator.evaluate("S1", "ROOM", dict(AWAY)).alert_name == "GAZE_AWAY"
@@ -0,0 +1,141 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models.session_state import StudentRecord, STATUS_CODES
+from app.routes import teacher
+from app.state.session_store import SessionStore
+
+CONFUSED = STATUS_CODES["CONFUSED"]
+
+
+def record(student_id: str, session_id: str = "ROOM", status: int = 0) -> StudentRecord:
+    return StudentRecord(student_id, session_id, status, last_updated=1000.0)
+
+
+def ids(students_json: str) -> list:
+    return [s["student_id"] for s in json.loads(students_json)]
+
+
+@pytest.fixture
+def store():
+    return SessionStore(tombstones=8)
+
+
+# --- changes(since) ---
+
+def test_changes_lists_only_students_changed_since(store):
+    store.put(record("A"))
+    store.put(record("B"))
+    since = store.version
+    store.put(record("B", status=CONFUSED))
+    version, full, students, removed = store.changes(since)
+    assert (version, full, removed) == (store.version, False, [])
+    assert ids(students) == ["B"]
+    assert store.changes(version) == (version, False, "[]", [])
+
+
+def test_evicted_student_comes_back_as_a_tombstone(store):
+    store.put(record("A"))
+    store.put(record("B"))
+    since = store.version
+    store.remove("A")
+    for session_id in (None, "ROOM"):
+        version, full, students, removed = store.changes(since, session_id)
+        assert (full, students, removed) == (False, "[]", ["A"])
+        assert version == store.version
+    # A client that already saw the removal gets nothing again
+    assert store.changes(store.version) == (store.version, False, "[]", [])
+
+
+def test_student_moving_rooms_is_removed_from_the_old_room_only(store):
+    store.put(record("A", "ROOM1"))
+    since = store.version
+    store.put(record("A", "ROOM2"))
+    assert store.changes(since, "ROOM1")[2:] == ("[]", ["A"])
+    assert ids(store.changes(since, "ROOM2")[2]) == ["A"]
+    _, full, students, removed = store.changes(since)
+    assert not full and ids(students) == ["A"] and removed == []
+
+
+def test_version_from_another_counter_gets_a_full_snapshot(store):
+    store.put(record("A"))
+    store.put(record("B"))
+    version, full, students, removed = store.changes(store.version + 5)
+    assert full and removed == []
+    assert ids(students) == ["A", "B"]
+
+
+def test_version_older_than_the_kept_tombstones_gets_a_full_snapshot(store):
+    store.put(record("KEEP"))
+    since = store.version
+    for n in range(10):
+        store.put(record(f"S{n}"))
+        store.remove(f"S{n}")
+    version, full, students, removed = store.changes(since)
+    assert full and ids(students) == ["KEEP"] and removed == []
+    # Recent enough: still a delta
+    assert not store.changes(version - 1)[1]
+
+
+# --- snapshot cache ---
+
+def test_snapshot_is_cached_until_the_room_changes(store):
+    store.put(record("A", "ROOM1"))
+    store.put(record("B", "ROOM2"))
+    first = store.snapshot("ROOM1")
+    everything = store.snapshot()
+    assert store.snapshot("ROOM1") is first and store.snapshot() is everything
+
+    # Another room's change keeps this room's snapshot, not the store-wide one
+    store.put(record("B", "ROOM2", CONFUSED))
+    assert store.snapshot("ROOM1") is first
+    assert store.snapshot() is not everything
+    assert json.loads(store.snapshot()[1])[1]["status"] == "CONFUSED"
+
+    store.put(record("A", "ROOM1", CONFUSED))
+    version, body = store.snapshot("ROOM1")
+    assert version == store.room_version("ROOM1") > first[0]
+    assert json.loads(body)[0]["status"] == "CONFUSED"
+
+
+def test_snapshot_of_an_emptied_room(store):
+    store.put(record("A"))
+    store.snapshot("ROOM")
+    store.remove("A")
+    assert store.snapshot("ROOM") == (store.version, "[]")
+    assert store.snapshot() == (store.version, "[]")
+
+
+# --- GET /teacher/sessions?since_version=&epoch= ---
+
+@pytest.fixture
+def client(store, monkeypatch):
+    monkeypatch.setattr(teacher, "SESSION_STORE", store)
+    app = FastAPI()
+    app.include_router(teacher.router)
+    return TestClient(app)
+
+
+def test_stale_epoch_resyncs_with_the_full_list(client, store):
+    store.put(record("A"))
+    store.put(record("B"))
+    version = store.version
+    # Same version number from another process' counter: still a full resync
+    body = client.get("/teacher/sessions", params={"since_version": version, "epoch": "stale"}).json()
+    assert body["full"] and body["epoch"] == store.epoch and body["version"] == version
+    assert [s["student_id"] for s in body["students"]] == ["A", "B"]
+
+
+def test_current_epoch_gets_the_delta(client, store):
+    store.put(record("A"))
+    store.put(record("B"))
+    since = store.version
+    store.remove("B")
+    params = {"since_version": since, "epoch": store.epoch}
+    body = client.get("/teacher/sessions", params=params).json()
+    assert not body["full"] and body["students"] == [] and body["removed"] == ["B"]
+    params["since_version"] = store.version
+    assert client.get("/teacher/sessions", params=params).status_code == 304
@@ -0,0 +1,175 @@
+import asyncio
+
+from app.models.session_state import STATUS_CODES
+from app.services.confusion import ConfusionEngine
+from app.services.connection_manager import ConnectionManager
+from app.services.metric_fusion import MetricFusion
+from app.services.proctoring import ProctoringEngine
+from app.services.session_evaluator import SessionEvaluator
+from app.state.backend import SharedBackend
+from app.state.broker import LocalBroker, LocalBrokerClient
+from app.state.class_summary import ClassSummaryStore
+from app.state.session_store import SessionStore
+from app.state.timeline_store import TimelineStore
+from app.utils.timers import ManualClock, TimerWheel
+
+OFFLINE = STATUS_CODES["OFFLINE"]
+FACE = {"face_count": 1, "metrics": {"gaze": "CENTER", "brow": 0.0, "smile": 0.1}}
+START = 1000.0
+
+
+class Worker:
+    """One uvicorn worker's state (store, timeline, evaluator, teachers) behind a SharedBackend."""
+    def __init__(self, url: str, clock: ManualClock):
+        self.wheel = TimerWheel(tick=0.5, clock=clock)
+        self.evaluator = SessionEvaluator(ttl_seconds=30.0, offline_seconds=10.0, proctoring=ProctoringEngine(self.wheel),
+                                          confusion=ConfusionEngine(self.wheel), wheel=self.wheel,
+                                          fusion=MetricFusion(enabled=False))
+        self.store = SessionStore(tombstones=8)
+        self.timeline = TimelineStore()
+        connections = ConnectionManager(self.store, hz=0.001, summaries=ClassSummaryStore())
+        self.backend = SharedBackend(lambda: LocalBrokerClient(url), hz=100.0, store=self.store,
+                                     timeline=self.timeline, evaluator=self.evaluator, connections=connections)
+        # What the timers emitted here (student.py's listeners)
+        self.emitted, self.evicted = [], []
+        self.evaluator.listeners.append(self._timed)
+        self.evaluator.evict_listeners.append(self._forget)
+
+    def frame(self, student_id: str, session_id: str = "ROOM"):
+        self._publish(self.evaluator.evaluate(student_id, session_id, dict(FACE)))
+
+    def advance(self):
+        self.wheel.advance()
+
+    def _publish(self, state):
+        self.store.put(state)
+        self.timeline.record(state)
+        self.backend.publish(state)
+
+    def _timed(self, state):
+        self.emitted.append(state.status)
+        self._publish(state)
+
+    def _forget(self, student_id: str):
+        self.evicted.append(student_id)
+        self.store.remove(student_id)
+        self.timeline.remove(student_id)
+        self.backend.remove(student_id)
+
+
+async def until(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "replication timed out"
+        await asyncio.sleep(0.01)
+
+
+def with_workers(test):
+    # Runs test(clock, a, b) against a broker on a free port with two started workers
+    async def run():
+        broker = LocalBroker("127.0.0.1", 0)
+        await broker.start()
+        clock = ManualClock(START)
+        url = f"redis://127.0.0.1:{broker.port}"
+        a, b = Worker(url, clock), Worker(url, clock)
+        await a.backend.start()
+        await b.backend.start()
+        try:
+            await test(clock, a, b)
+        finally:
+            await a.backend.stop()
+            await b.backend.stop()
+            await broker.stop()
+    asyncio.run(run())
+
+
+# --- broker ---
+
+def test_broker_serves_hashes_and_pushes_to_subscribers():
+    async def run():
+        broker = LocalBroker("127.0.0.1", 0)
+        await broker.start()
+        client = LocalBrokerClient(f"redis://127.0.0.1:{broker.port}")
+        pubsub = client.pubsub()
+        await pubsub.subscribe("updates")
+        messages = pubsub.listen()
+        assert (await messages.__anext__())["type"] == "subscribe"
+
+        assert await client.hset("h", mapping={"a": "1", "b": "2"}) == 2
+        assert await client.hset("h", "a", "3") == 0
+        assert await client.hdel("h", "b", "missing") == 1
+        assert await client.hgetall("h") == {"a": "3"}
+        assert await client.publish("updates", "hello") == 1
+        assert await messages.__anext__() == {"type": "message", "channel": "updates", "data": "hello"}
+        assert await client.publish("elsewhere", "nobody") == 0
+
+        await pubsub.aclose()
+        await client.aclose()
+        await broker.stop()
+    asyncio.run(run())
+
+
+# --- SharedBackend ---
+
+def test_workers_converge_on_each_others_students():
+    async def test(clock, a, b):
+        a.frame("S1")
+        b.frame("S2")
+        await until(lambda: "S2" in a.store and "S1" in b.store)
+        for worker in (a, b):
+            assert sorted(worker.store.room("ROOM")) == ["S1", "S2"]
+            assert worker.timeline.get("S1") is not None and worker.timeline.get("S2") is not None
+        # Each worker runs presence timers for its own student only
+        assert len(a.evaluator) == len(b.evaluator) == 1
+    with_workers(test)
+
+
+def test_offline_and_eviction_happen_once():
+    async def test(clock, a, b):
+        a.frame("S1")
+        await until(lambda: "S1" in b.store)
+
+        clock.set(START + 11.0)
+        a.advance()
+        b.advance()
+        await until(lambda: b.store.get("S1").status == OFFLINE)
+        assert (a.emitted, b.emitted) == ([OFFLINE], [])
+
+        clock.set(START + 31.0)
+        a.advance()
+        b.advance()
+        await until(lambda: "S1" not in b.store)
+        assert (a.evicted, b.evicted) == (["S1"], [])
+        assert len(b.wheel) == 0
+    with_workers(test)
+
+
+def test_ownership_follows_the_students_frames():
+    async def test(clock, a, b):
+        a.frame("S1")
+        await until(lambda: "S1" in b.store)
+        # The student's next frame lands on the other worker (POST path)
+        clock.set(START + 1.0)
+        b.frame("S1")
+        await until(lambda: a.store.get("S1").last_updated == START + 1.0)
+        assert (len(a.evaluator), len(b.evaluator)) == (0, 1)
+
+        clock.set(START + 12.0)
+        a.advance()
+        b.advance()
+        await until(lambda: a.store.get("S1").status == OFFLINE)
+        assert (a.emitted, b.emitted) == ([], [OFFLINE])
+    with_workers(test)
+
+
+def test_students_of_a_stopped_worker_expire_quietly():
+    async def test(clock, a, b):
+        a.frame("S1")
+        await until(lambda: "S1" in b.store)
+        await a.backend.stop()
+
+        clock.set(START + 31.0)
+        b.advance()
+        assert "S1" not in b.store and b.timeline.get("S1") is None
+        assert (b.emitted, b.evicted) == ([], [])
+    with_workers(test)
@@ -0,0 +1,74 @@
+import pytest
+
+from app.models.session_state import StudentRecord, STATUS_CODES
+from app.state.timeline_store import StudentTimeline, TimelineStore
+
+FOCUSED, CONFUSED = STATUS_CODES["FOCUSED"], STATUS_CODES["CONFUSED"]
+
+
+def record(ts: float, status: int, student_id: str = "S1", session_id: str = "ROOM") -> StudentRecord:
+    return StudentRecord(student_id, session_id, status, last_updated=ts)
+
+
+def transitions(timeline: StudentTimeline, times):
+    # Alternating statuses: every record is a transition
+    for n, ts in enumerate(times):
+        assert timeline.record(record(ts, CONFUSED if n % 2 else FOCUSED))
+
+
+def test_query_returns_rows_after_since_in_order():
+    timeline = StudentTimeline(capacity=8)
+    transitions(timeline, [1.0, 2.0, 3.0, 4.0])
+    assert timeline.query()["t"] == [1.0, 2.0, 3.0, 4.0]
+    assert timeline.query(2.0)["t"] == [3.0, 4.0]
+    assert timeline.query(2.5)["status"] == [FOCUSED, CONFUSED]
+    assert timeline.query(4.0)["t"] == []
+
+
+@pytest.mark.parametrize("since, expected", [
+    (0.0, [3.0, 4.0, 5.0, 6.0]),
+    (3.5, [4.0, 5.0, 6.0]),
+    # Rows 5 and 6 sit at the start of the ring, 3 and 4 at its end
+    (4.0, [5.0, 6.0]),
+    (5.5, [6.0]),
+    (6.0, []),
+])
+def test_wrapped_ring_keeps_the_newest_rows(since, expected):
+    timeline = StudentTimeline(capacity=4)
+    transitions(timeline, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    assert timeline.head == 2 and timeline.size == 4
+    columns = timeline.query(since)
+    assert columns["t"] == expected
+    assert len(columns["status"]) == len(columns["confusion_score"]) == len(expected)
+
+
+def test_late_records_are_dropped():
+    timeline = StudentTimeline(capacity=4)
+    transitions(timeline, [1.0, 2.0, 3.0, 4.0, 5.0])
+    # A transition older than the newest row (5.0, FOCUSED)
+    assert not timeline.record(record(3.5, CONFUSED))
+    assert timeline.query(3.0)["t"] == [4.0, 5.0]
+    # Same time as the newest row is still in order
+    assert timeline.record(record(5.0, CONFUSED))
+    assert timeline.query(4.5)["t"] == [5.0, 5.0]
+
+
+def test_unchanged_state_is_sampled():
+    timeline = StudentTimeline(capacity=8)
+    assert timeline.record(record(10.0, FOCUSED), sample_seconds=5.0)
+    assert not timeline.record(record(14.0, FOCUSED), sample_seconds=5.0)
+    assert timeline.record(record(15.0, FOCUSED), sample_seconds=5.0)
+    assert timeline.query()["t"] == [10.0, 15.0]
+
+
+def test_store_queries_the_room_the_student_last_reported():
+    store = TimelineStore(capacity=8, sample_seconds=5.0)
+    store.record(record(1.0, FOCUSED, "S1", "A"))
+    store.record(record(1.0, FOCUSED, "S2", "A"))
+    store.record(record(2.0, CONFUSED, "S1", "B"))
+    assert list(store.query("A")) == ["S2"]
+    assert store.query("B")["S1"]["t"] == [1.0, 2.0]
+    # Students without rows after `since` are left out
+    assert store.query("A", since=1.0) == {}
+    store.remove("S1")
+    assert store.query("B") == {} and len(store) == 1
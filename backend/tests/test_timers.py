@@ -0,0 +1,190 @@
+import time
+
+import pytest
+
+from app.utils.timers import Condition, ManualClock, TimerWheel
+
+
+@pytest.fixture
+def clock():
+    return ManualClock(0.0)
+
+
+def recorder():
+    fired = []
+    return fired, lambda key, now: fired.append((key, now))
+
+
+# --- TimerWheel ---
+
+def test_default_clock_is_monotonic():
+    wheel = TimerWheel()
+    assert wheel.clock is time.monotonic
+    now = time.monotonic()
+    assert wheel.wall_time(now) == pytest.approx(time.time(), abs=0.05)
+    assert wheel.clock_time(wheel.wall_time(now)) == pytest.approx(now, abs=1e-3)
+
+
+def test_manual_clock_times_are_not_converted(clock):
+    wheel = TimerWheel(clock=clock)
+    assert wheel.wall_time(12.5) == 12.5 and wheel.clock_time(12.5) == 12.5
+
+
+def test_timers_cascade_down_every_level(clock):
+    # Default (8, 6, 6, 6) wheel, 1 s ticks: deadlines on each side of the level boundaries
+    wheel = TimerWheel(tick=1.0, clock=clock)
+    fired, callback = recorder()
+    deadlines = (3, 255, 256, 300, 2 ** 14 - 1, 2 ** 14, 2 ** 14 + 7, 2 ** 20 + 3)
+    for deadline in reversed(deadlines):
+        wheel.schedule(deadline, deadline, callback)
+    assert wheel.advance(2) == 0
+    wheel.advance(2 ** 20 + 10)
+    assert fired == [(deadline, float(deadline)) for deadline in deadlines]
+    assert len(wheel) == 0
+
+
+def test_timer_fires_within_one_tick_of_its_deadline(clock):
+    wheel = TimerWheel(tick=0.1, clock=clock)
+    fired, callback = recorder()
+    wheel.schedule("a", 1.05, callback)
+    assert wheel.advance(1.05) == 0
+    assert wheel.advance(1.1) == 1
+    assert fired == [("a", pytest.approx(1.1))]
+
+
+def test_timer_beyond_the_horizon_is_parked_and_replaced(clock):
+    # Small wheel (4, 16, 64 ticks): a deadline past the last level waits in its farthest slot
+    wheel = TimerWheel(tick=1.0, bits=(2, 2, 2), clock=clock)
+    fired, callback = recorder()
+    wheel.schedule("far", 200, callback)
+    wheel.schedule("near", 50, callback)
+    wheel.advance(199)
+    assert fired == [("near", 50.0)]
+    wheel.advance(200)
+    assert fired[-1] == ("far", 200.0)
+
+
+def test_cancel_and_reschedule(clock):
+    wheel = TimerWheel(tick=1.0, clock=clock)
+    fired, callback = recorder()
+    wheel.schedule("a", 10, callback)
+    wheel.schedule("b", 500, callback)
+    wheel.schedule("c", 20, callback)
+    assert wheel.cancel("a") and not wheel.cancel("a")
+    # Moving a deadline keeps one timer per key, across levels both ways
+    wheel.schedule("b", 5, callback)
+    wheel.schedule("c", 400, callback)
+    assert len(wheel) == 2 and "a" not in wheel
+    wheel.advance(399)
+    assert fired == [("b", 5.0)]
+    wheel.advance(400)
+    assert fired == [("b", 5.0), ("c", 400.0)]
+    assert len(wheel) == 0
+
+
+def test_callback_may_reschedule_its_key(clock):
+    wheel = TimerWheel(tick=1.0, clock=clock)
+    fired = []
+
+    def again(key, now):
+        fired.append(now)
+        if len(fired) < 3:
+            wheel.schedule(key, now + 100, again)
+
+    wheel.schedule("a", 100, again)
+    wheel.advance(1000)
+    assert fired == [100.0, 200.0, 300.0]
+
+
+def test_deadline_in_the_past_fires_on_the_next_tick(clock):
+    clock.set(50.0)
+    wheel = TimerWheel(tick=1.0, clock=clock)
+    fired, callback = recorder()
+    wheel.schedule("late", 10, callback)
+    clock.set(51.0)
+    assert wheel.advance() == 1 and fired == [("late", 51.0)]
+
+
+# --- Condition ---
+
+@pytest.fixture
+def wheel(clock):
+    return TimerWheel(tick=0.1, clock=clock)
+
+
+def changes():
+    seen = []
+    return seen, lambda key, active, now: seen.append((key, active, round(now, 1)))
+
+
+def test_condition_needs_its_min_duration(wheel):
+    condition = Condition("gaze", wheel, on_seconds=3.0)
+    assert [condition.update("S1", True, t) for t in (0.0, 1.0, 2.9)] == [False, False, False]
+    assert condition.update("S1", True, 3.0)
+    assert condition.active("S1") and condition.since("S1") == 0.0
+
+
+def test_pending_condition_resets_on_a_clear_update(wheel):
+    condition = Condition("gaze", wheel, on_seconds=3.0)
+    condition.update("S1", True, 0.0)
+    assert not condition.update("S1", False, 2.0)
+    assert condition.since("S1") is None and len(condition) == 0 and len(wheel) == 0
+    assert not condition.update("S1", True, 2.5)
+    assert not condition.update("S1", True, 5.0)
+    assert condition.update("S1", True, 5.5)
+
+
+def test_condition_matures_between_updates(wheel, clock):
+    seen, on_change = changes()
+    condition = Condition("gaze", wheel, on_seconds=3.0, on_change=on_change)
+    condition.update("S1", True, 0.0)
+    clock.set(2.9)
+    wheel.advance()
+    assert seen == []
+    clock.set(3.1)
+    wheel.advance()
+    assert seen == [("S1", True, 3.0)] and condition.active("S1")
+
+
+def test_hysteresis_holds_an_active_condition(wheel, clock):
+    seen, on_change = changes()
+    condition = Condition("confused", wheel, on_seconds=1.0, off_seconds=2.0, on_change=on_change)
+    condition.update("S1", True, 0.0)
+    assert condition.update("S1", True, 1.0)
+    # Clear for less than off_seconds: still active; true again restarts the clear run
+    assert condition.update("S1", False, 2.0)
+    assert condition.update("S1", False, 3.5)
+    assert condition.update("S1", True, 3.8)
+    assert condition.update("S1", False, 4.0)
+    assert condition.update("S1", False, 5.9)
+    assert not condition.update("S1", False, 6.0)
+    assert seen == [] and len(wheel) == 0
+
+
+def test_hysteresis_clears_between_updates(wheel, clock):
+    seen, on_change = changes()
+    condition = Condition("confused", wheel, on_seconds=1.0, off_seconds=2.0, on_change=on_change)
+    condition.update("S1", True, 0.0)
+    condition.update("S1", True, 1.0)
+    condition.update("S1", False, 1.5)
+    clock.set(3.6)
+    wheel.advance()
+    assert seen == [("S1", False, 3.5)]
+    assert not condition.active("S1") and len(condition) == 0
+
+
+def test_without_hysteresis_a_clear_update_deactivates(wheel):
+    condition = Condition("gaze", wheel, on_seconds=1.0)
+    condition.update("S1", True, 0.0)
+    assert condition.update("S1", True, 1.0)
+    assert not condition.update("S1", False, 1.1)
+
+
+def test_restore_resumes_a_run(wheel, clock):
+    condition = Condition("gaze", wheel, on_seconds=3.0)
+    clock.set(10.0)
+    condition.restore("S1", 8.0)
+    assert not condition.active("S1")
+    clock.set(11.1)
+    wheel.advance()
+    assert condition.active("S1") and condition.since("S1") == 8.0
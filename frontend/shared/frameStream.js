@@ -0,0 +1,125 @@
+// SmartSession Frame Stream (Binary WebSocket ingestion)
+//
+// Protocol (see backend/app/routes/student.py):
+//   1. Text handshake once: {"studentId": "...", "sessionId": "...", "mode": "frames" | "landmarks"}
+//   2. Binary packets (little-endian), by mode:
+//      frames:    [uint32 seq][float64 timestamp ms] + JPEG bytes
+//      landmarks: [uint32 seq][float64 timestamp ms][uint8 faces][uint8 version][uint16 count]
+//                 + count x (x, y, z) float16, from a face mesh running in the browser
+//   3. Server replies with JSON messages ({type: "STATE" | "DROPPED" | "ERROR", ...}), with the
+//      capture profile to use next: capture: {interval_ms, width, quality} (interval only for landmarks)
+
+const HEADER_SIZE = 12;
+const LANDMARK_HEADER_SIZE = 16;
+const LANDMARK_VERSION = 1;
+
+// float32 -> float16 bits (round to nearest), enough precision for normalized coordinates
+const f32 = new Float32Array(1);
+const u32 = new Uint32Array(f32.buffer);
+
+function toHalf(value) {
+    f32[0] = value;
+    const bits = u32[0];
+    const sign = (bits >>> 16) & 0x8000;
+    const exponent = ((bits >>> 23) & 0xff) - 127 + 15;
+    const mantissa = bits & 0x7fffff;
+    if (exponent >= 0x1f) return sign | 0x7c00;           // overflow / Inf / NaN (rejected server-side)
+    if (exponent <= 0) {
+        if (exponent < -10) return sign;                   // underflow to zero
+        const m = (mantissa | 0x800000) >> (1 - exponent);
+        return sign | ((m + 0x1000) >> 13);
+    }
+    return (sign | (exponent << 10) | (mantissa >> 13)) + ((mantissa >> 12) & 1);
+}
+
+class FrameStream {
+    constructor() {
+        this.socket = null;
+        this.seq = 0;
+        this.listeners = [];
+    }
+
+    get isOpen() {
+        return this.socket !== null && this.socket.readyState === WebSocket.OPEN;
+    }
+
+    /**
+     * Opens the ingestion socket and performs the handshake.
+     * @param {string} url - e.g. ws://localhost:8000/student/ws
+     */
+    connect(url, studentId, sessionId, mode = 'frames') {
+        this.socket = new WebSocket(url);
+        this.socket.binaryType = 'arraybuffer';
+
+        this.socket.onopen = () => {
+            this.socket.send(JSON.stringify({ studentId, sessionId, mode }));
+        };
+        this.socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            this.listeners.forEach(cb => cb(data));
+        };
+        this.socket.onclose = () => {
+            this.socket = null;
+        };
+    }
+
+    /**
+     * Sends one encoded frame.
+     * @param {Blob} blob - JPEG/WebP frame from canvas.toBlob
+     */
+    async sendFrame(blob) {
+        if (!this.isOpen) return false;
+
+        const body = new Uint8Array(await blob.arrayBuffer());
+        const packet = new Uint8Array(HEADER_SIZE + body.length);
+        const header = new DataView(packet.buffer, 0, HEADER_SIZE);
+        header.setUint32(0, this.seq++ >>> 0, true);
+        header.setFloat64(4, Date.now(), true);
+        packet.set(body, HEADER_SIZE);
+
+        this.socket.send(packet);
+        return true;
+    }
+
+    /**
+     * Sends one face mesh result instead of a frame (socket opened with mode 'landmarks').
+     * @param {number} faceCount - faces seen by the client
+     * @param {Array<{x: number, y: number, z: number}>|null} landmarks - 468/478 normalized
+     *        points when exactly one face was seen, otherwise null
+     */
+    sendLandmarks(faceCount, landmarks) {
+        if (!this.isOpen) return false;
+
+        const points = faceCount === 1 && landmarks ? landmarks : [];
+        const packet = new ArrayBuffer(LANDMARK_HEADER_SIZE + points.length * 6);
+        const header = new DataView(packet, 0, LANDMARK_HEADER_SIZE);
+        header.setUint32(0, this.seq++ >>> 0, true);
+        header.setFloat64(4, Date.now(), true);
+        header.setUint8(12, Math.min(faceCount, 255));
+        header.setUint8(13, LANDMARK_VERSION);
+        header.setUint16(14, points.length, true);
+
+        const values = new Uint16Array(packet, LANDMARK_HEADER_SIZE);
+        points.forEach((p, i) => {
+            values[i * 3] = toHalf(p.x);
+            values[i * 3 + 1] = toHalf(p.y);
+            values[i * 3 + 2] = toHalf(p.z);
+        });
+
+        this.socket.send(packet);
+        return true;
+    }
+
+    onMessage(callback) {
+        this.listeners.push(callback);
+    }
+
+    disconnect() {
+        if (this.socket) {
+            this.socket.close();
+            this.socket = null;
+        }
+    }
+}
+
+export default FrameStream;
@@ -1,8 +1,13 @@
 import React, { useEffect, useRef, useState, useCallback } from 'react';
 
-const CAPTURE_INTERVAL_MS = 200; // 5 FPS capture rate
-
-const CameraView = ({ onFrameCapture, onError }) => {
+const DEFAULT_CAPTURE_INTERVAL_MS = 200; // 5 FPS capture rate
+const DEFAULT_JPEG_QUALITY = 0.6;
+
+// Capture profile suggested by the backend (capture interval, frame width, JPEG quality):
+// slower while the student is steadily focused or the server is loaded, smaller frames
+// when the face is large enough. The camera resolution is never upscaled.
+const CameraView = ({ onFrameCapture, onError, captureIntervalMs = DEFAULT_CAPTURE_INTERVAL_MS,
+                      captureWidth = null, captureQuality = DEFAULT_JPEG_QUALITY }) => {
     const videoRef = useRef(null);
     const canvasRef = useRef(null);
     const [error, setError] = useState(null);
@@ -17,24 +22,31 @@ const CameraView = ({ onFrameCapture, onError }) => {
         if (video.videoWidth === 0 || video.videoHeight === 0) return;
 
         const ctx = canvas.getContext('2d');
-        canvas.width = video.videoWidth;
-        canvas.height = video.videoHeight;
+        const scale = captureWidth ? Math.min(1, captureWidth / video.videoWidth) : 1;
+        canvas.width = Math.round(video.videoWidth * scale);
+        canvas.height = Math.round(video.videoHeight * scale);
 
         // Draw video frame to canvas
         ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-        // Convert to JPEG base64 string (0.6 quality for bandwidth efficiency)
-        const frameData = canvas.toDataURL('image/jpeg', 0.6);
+        // Encode to a binary JPEG Blob (quality from the capture profile).
+        // Binary avoids the ~33% base64 inflation of toDataURL.
+        canvas.toBlob((blob) => {
+            if (blob && onFrameCapture) {
+                onFrameCapture(blob);
+            }
+        }, 'image/jpeg', captureQuality);
+    }, [isStreamActive, onFrameCapture, captureWidth, captureQuality]);
 
-        if (onFrameCapture) {
-            onFrameCapture(frameData);
-        }
-    }, [isStreamActive, onFrameCapture]);
+    // Frame capture loop (restarts when the backend suggests a new interval)
+    useEffect(() => {
+        const captureInterval = setInterval(captureFrame, captureIntervalMs);
+        return () => clearInterval(captureInterval);
+    }, [captureFrame, captureIntervalMs]);
 
     // Initialize camera stream
     useEffect(() => {
         let stream = null;
-        let captureInterval = null;
 
         const initCamera = async () => {
             try {
@@ -53,9 +65,6 @@ const CameraView = ({ onFrameCapture, onError }) => {
                     videoRef.current.onloadedmetadata = () => setIsStreamActive(true);
                 }
 
-                // Start the frame capture loop
-                captureInterval = setInterval(captureFrame, CAPTURE_INTERVAL_MS);
-
             } catch (err) {
                 console.error("Camera initialization failed:", err);
                 let message = "Could not access camera.";
@@ -76,15 +85,12 @@ const CameraView = ({ onFrameCapture, onError }) => {
         initCamera();
 
         return () => {
-            // Cleanup: Stop stream tracks and clear interval
+            // Cleanup: Stop stream tracks
             if (stream) {
                 stream.getTracks().forEach(track => track.stop());
             }
-            if (captureInterval) {
-                clearInterval(captureInterval);
-            }
         };
-    }, [captureFrame, onError]);
+    }, [onError]);
 
     return (
         <div className="relative w-full max-w-2xl bg-black rounded-lg overflow-hidden shadow-xl aspect-video border border-gray-800">
@@ -128,7 +134,7 @@ const CameraView = ({ onFrameCapture, onError }) => {
             {isStreamActive && !error && (
                 <div className="absolute top-4 right-4 flex items-center bg-black/60 backdrop-blur-md border border-white/10 px-3 py-1 rounded-full shadow-lg">
                     <div className="w-2 h-2 bg-green-500 rounded-full animate-pulse mr-2 box-shadow-green" />
-                    <span className="text-xs text-green-400 font-mono font-bold tracking-wider">LIVE • 5FPS</span>
+                    <span className="text-xs text-green-400 font-mono font-bold tracking-wider">LIVE • {(1000 / captureIntervalMs).toFixed(1)}FPS</span>
                 </div>
             )}
         </div>
@@ -1,5 +1,24 @@
-import React, { useState, useCallback } from 'react';
+import React, { useState, useCallback, useEffect, useRef } from 'react';
 import CameraView from './CameraView';
+import FrameStream from '../shared/frameStream';
+
+const STUDENT_ID = 'S1'; // Hardcoded for MVP Demo
+const SESSION_ID = 'LIVE_SESSION';
+
+// Converts a Blob to a data URI for the HTTP fallback path
+const blobToDataUrl = (blob) => new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve(reader.result);
+    reader.onerror = reject;
+    reader.readAsDataURL(blob);
+});
+
+// Applies a capture profile update; keeps the same object when nothing changed (no re-render)
+const mergeProfile = (prev, update) => {
+    const next = { ...prev, ...update };
+    const changed = Object.keys(next).some(key => next[key] !== prev[key]);
+    return changed ? next : prev;
+};
 
 const StudentApp = () => {
     // Human-Readable State
@@ -8,11 +27,30 @@ const StudentApp = () => {
     const [lastFrameSize, setLastFrameSize] = useState(0);
     const [cameraError, setCameraError] = useState(null);
     const [backendStatus, setBackendStatus] = useState("Checking...");
+    // Capture profile negotiated with the backend: { interval_ms, width, quality }
+    const [captureProfile, setCaptureProfile] = useState({ interval_ms: 200, width: null, quality: 0.6 });
+    const streamRef = useRef(null);
+
+    // Primary channel: persistent binary WebSocket
+    useEffect(() => {
+        const stream = new FrameStream();
+        stream.onMessage((message) => {
+            // Backend capture profile (includes the admission backoff)
+            if (message.capture) {
+                setCaptureProfile(prev => mergeProfile(prev, message.capture));
+            } else if (message.admission && message.admission.interval_ms) {
+                setCaptureProfile(prev => mergeProfile(prev, { interval_ms: message.admission.interval_ms }));
+            }
+        });
+        stream.connect('ws://localhost:8000/student/ws', STUDENT_ID, SESSION_ID);
+        streamRef.current = stream;
+        return () => stream.disconnect();
+    }, []);
 
     // Handler: Receive frame from CameraView
-    const handleFrameCapture = useCallback(async (frameData) => {
-        // "frameData" is a base64 string
-        const sizeInBytes = frameData.length;
+    const handleFrameCapture = useCallback(async (blob) => {
+        // "blob" is a binary JPEG
+        const sizeInBytes = blob.size;
 
         // Log to console as requested for verification
         console.log(`Frame received: ${sizeInBytes} bytes`);
@@ -20,17 +58,32 @@ const StudentApp = () => {
         // Update UI state just to show things are working
         setLastFrameSize(sizeInBytes);
 
-        // Send to Backend (MVP Integration)
+        // 1. WebSocket (binary)
+        const stream = streamRef.current;
+        if (stream && await stream.sendFrame(blob)) {
+            setBackendStatus("🟢 Connected (WS)");
+            return;
+        }
+
+        // 2. HTTP Fallback (base64 JSON)
         try {
-            await fetch('http://localhost:8000/student/process-frame', {
+            const res = await fetch('http://localhost:8000/student/process-frame', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    studentId: 'S1', // Hardcoded for MVP Demo
-                    sessionId: 'LIVE_SESSION',
-                    frameData: frameData
+                    studentId: STUDENT_ID,
+                    sessionId: SESSION_ID,
+                    frameData: await blobToDataUrl(blob)
                 })
             });
+            const interval = Number(res.headers.get('X-Capture-Interval-Ms'));
+            const width = Number(res.headers.get('X-Capture-Width'));
+            const quality = Number(res.headers.get('X-Capture-Quality'));
+            setCaptureProfile(prev => mergeProfile(prev, {
+                interval_ms: interval > 0 ? interval : prev.interval_ms,
+                width: width > 0 ? width : prev.width,
+                quality: quality > 0 ? quality : prev.quality,
+            }));
             setBackendStatus("🟢 Connected");
         } catch (err) {
             console.error("Backend Error:", err);
@@ -60,6 +113,9 @@ const StudentApp = () => {
                 <CameraView
                     onFrameCapture={handleFrameCapture}
                     onError={handleCameraError}
+                    captureIntervalMs={captureProfile.interval_ms}
+                    captureWidth={captureProfile.width}
+                    captureQuality={captureProfile.quality}
                 />
 
                 {/* 2. Simple Debug Console (To prove it works without opening DevTools) */}
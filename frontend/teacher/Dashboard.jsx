@@ -1,14 +1,21 @@
 import React, { useState, useEffect } from 'react';
-import { fetchStudentStates } from "./api";
+import { fetchStudentStates, fetchTimeline, pollStudentStates } from "./api";
+
+// SessionState.quality_level: analysis fidelity the server could afford for this student
+const QUALITY_LABELS = ['Full', 'Reduced resolution', 'Sparse mesh', 'Face count only'];
 
 const Dashboard = () => {
     const [students, setStudents] = useState([]);
     const [timeline, setTimeline] = useState({}); // Stores history per student
     const [connectionStatus, setConnectionStatus] = useState('CONNECTED');
+    const [summaries, setSummaries] = useState({}); // Class summaries pushed per session_id
 
     // Polling Logic
     // Hybrid: WebSocket + Polling
     useEffect(() => {
+        // Optional class filter: /teacher?session=<session_id>
+        const sessionId = new URLSearchParams(window.location.search).get('session');
+
         // Shared Timeline Update Logic
         const updateTimeline = (data) => {
             setTimeline(prev => {
@@ -32,32 +39,83 @@ const Dashboard = () => {
             });
         };
 
+        const formatTime = (ts) => new Date(ts * 1000).toLocaleTimeString('en-US', { hour12: false, hour: "2-digit", minute: "2-digit", second: "2-digit" });
+
+        // Recorded history survives a page refresh: seed from the server timeline
+        const loadHistory = async (data) => {
+            const rooms = sessionId ? [sessionId] : [...new Set(data.map(s => s.session_id))];
+            const histories = await Promise.all(rooms.map(room => fetchTimeline(room)));
+            setTimeline(prev => {
+                const updated = { ...prev };
+                histories.forEach(rows => {
+                    Object.entries(rows).forEach(([studentId, entries]) => {
+                        const seeded = entries.slice(-10).reverse().map(e => ({ status: e.status, alert: e.alert, time: formatTime(e.t) }));
+                        updated[studentId] = [...(updated[studentId] || []), ...seeded].slice(0, 10);
+                    });
+                });
+                return updated;
+            });
+        };
+
         const loadStudents = async () => {
-            const data = await fetchStudentStates();
+            const data = await fetchStudentStates(sessionId);
             setStudents(data);
             updateTimeline(data);
+            return data;
         };
 
-        // 1. Initial Load & Polling (Fallback)
-        loadStudents();
-        const interval = setInterval(loadStudents, 1000); // Keep polling active for robust sync
+        // 1. Initial Load & Long-Polling (Fallback): the server answers when something changes
+        let stopped = false;
+        const pollLoop = async () => {
+            let etag;
+            while (!stopped) {
+                try {
+                    const result = await pollStudentStates(sessionId, etag);
+                    etag = result.etag;
+                    if (result.students && !stopped) {
+                        setStudents(result.students);
+                        updateTimeline(result.students);
+                    }
+                } catch (e) {
+                    console.error("Teacher API error:", e);
+                    await new Promise(resolve => setTimeout(resolve, 2000)); // Backend down: retry later
+                }
+            }
+        };
+        loadStudents().then(loadHistory).then(pollLoop);
 
         // 2. WebSocket (Real-Time)
         let ws;
         try {
-            ws = new WebSocket("ws://localhost:8000/teacher/ws");
+            const query = sessionId ? `?session_id=${encodeURIComponent(sessionId)}` : "";
+            ws = new WebSocket(`ws://localhost:8000/teacher/ws${query}`);
             ws.onopen = () => setConnectionStatus('CONNECTED (WS+HTTP)');
             ws.onmessage = (event) => {
-                const data = JSON.parse(event.data);
-                setStudents(data);
-                updateTimeline(data);
+                const message = JSON.parse(event.data);
+                if (message.type === 'snapshot') {
+                    setStudents(message.students);
+                } else if (message.type === 'delta') {
+                    // Merge changed students into the current list
+                    setStudents(prev => {
+                        const merged = new Map(prev.map(s => [s.student_id, s]));
+                        message.students.forEach(s => merged.set(s.student_id, s));
+                        (message.removed || []).forEach(id => merged.delete(id));
+                        return Array.from(merged.values());
+                    });
+                } else if (message.type === 'summary') {
+                    setSummaries(prev => ({ ...prev, [message.session_id]: message }));
+                    return;
+                } else {
+                    return;
+                }
+                updateTimeline(message.students);
             };
             ws.onerror = () => setConnectionStatus('CONNECTED (HTTP Fallback)');
             ws.onclose = () => setConnectionStatus('CONNECTED (HTTP Fallback)');
         } catch (e) { console.error("WS Init Failed", e); }
 
         return () => {
-            clearInterval(interval);
+            stopped = true;
             if (ws) ws.close();
         };
     }, []);
@@ -78,6 +136,10 @@ const Dashboard = () => {
         return Math.max(0, 100 - Math.round(student.confusion_score || 0));
     };
 
+    // Class-wide trend, shown when following a single class
+    const rooms = Object.values(summaries);
+    const trend = rooms.length === 1 ? rooms[0].windows['5m'].status : null;
+
     // Helper: Display Name Fallback
     const getDisplayName = (student) => {
         return student.name || student.student_id;
@@ -127,6 +189,11 @@ const Dashboard = () => {
                         <p className="text-3xl font-bold text-yellow-600 mt-1">
                             {students.filter(s => s.status === 'CONFUSED').length}
                         </p>
+                        {trend && (
+                            <p className="text-xs text-gray-500 mt-1">
+                                Last 5 min: {trend.CONFUSED}% confused, {trend.DISTRACTED}% distracted, {trend.OFFLINE}% offline
+                            </p>
+                        )}
                     </div>
                     <div className="bg-white p-5 rounded-xl border border-gray-200 shadow-sm border-l-4 border-l-red-500">
                         <p className="text-xs font-medium text-gray-500 uppercase tracking-wider">Alerts</p>
@@ -156,6 +223,13 @@ const Dashboard = () => {
                                 <div className="aspect-video bg-gray-100 flex items-center justify-center relative">
                                     <span className="text-gray-400 text-sm">No Video Feed</span>
 
+                                    {/* Coarse metrics while the server is under load (face counts stay exact) */}
+                                    {student.quality_level > 0 && (
+                                        <div className="absolute top-3 left-3 px-2 py-1 rounded text-xs font-medium bg-gray-700 text-white shadow-sm" title="Server under load: gaze / confusion metrics are coarser">
+                                            {QUALITY_LABELS[student.quality_level]}
+                                        </div>
+                                    )}
+
                                     {/* Status Indicator Badge */}
                                     <div className={`absolute top-3 right-3 px-2 py-1 rounded text-xs font-bold text-white shadow-sm ${getStatusColor(student.status, student.alert)}`}>
                                         {student.status}
@@ -223,6 +297,12 @@ const Dashboard = () => {
                                             <span className="text-gray-400">Faces:</span>
                                             <span>{student.face_count}</span>
                                         </div>
+                                        <div className="flex justify-between">
+                                            <span className="text-gray-400">Quality:</span>
+                                            <span className={student.quality_level > 0 ? "text-yellow-400" : "text-green-400"}>
+                                                {QUALITY_LABELS[student.quality_level || 0]}
+                                            </span>
+                                        </div>
                                         <div className="flex justify-between">
                                             <span className="text-gray-400">Score:</span>
                                             <span className={student.confusion_score > 50 ? "text-yellow-400" : "text-green-400"}>
@@ -4,10 +4,12 @@ const API_BASE = "http://localhost:8000";
 
 /**
  * Fetches latest session states from the real backend.
+ * @param {string} [sessionId] - Only this class (all classes if omitted)
  */
-export async function fetchStudentStates() {
+export async function fetchStudentStates(sessionId) {
     try {
-        const res = await fetch(`${API_BASE}/teacher/sessions`);
+        const query = sessionId ? `?session_id=${encodeURIComponent(sessionId)}` : "";
+        const res = await fetch(`${API_BASE}/teacher/sessions${query}`);
         if (!res.ok) throw new Error("Failed to fetch sessions");
         return await res.json();
     } catch (err) {
@@ -15,3 +17,51 @@ export async function fetchStudentStates() {
         return [];
     }
 }
+
+/**
+ * Long-polls session states: resolves when the list changed (or after `wait` seconds).
+ * Nothing is transferred while the list is unchanged (ETag / 304).
+ * @param {string} [sessionId] - Only this class (all classes if omitted)
+ * @param {string} [etag] - ETag of the list the caller already has
+ * @param {number} [wait] - Seconds the server may hold the request open
+ * @returns {Promise<{students: Array|null, etag: string|undefined}>} students is null when unchanged
+ */
+export async function pollStudentStates(sessionId, etag, wait = 20) {
+    const params = new URLSearchParams({ wait: String(wait) });
+    if (sessionId) params.set("session_id", sessionId);
+    const res = await fetch(`${API_BASE}/teacher/sessions?${params}`, {
+        headers: etag ? { "If-None-Match": etag } : {},
+        cache: "no-store",
+    });
+    if (res.status === 304) return { students: null, etag };
+    if (!res.ok) throw new Error("Failed to fetch sessions");
+    return { students: await res.json(), etag: res.headers.get("ETag") || undefined };
+}
+
+/**
+ * Fetches a class's recorded history (columnar, newest rows last).
+ * @param {string} sessionId
+ * @param {number} [since] - Only rows after this timestamp (seconds)
+ * @returns {Promise<Object<string, Array<{status, alert, face_count, confusion_score, t}>>>} rows per student
+ */
+export async function fetchTimeline(sessionId, since = 0) {
+    try {
+        const res = await fetch(`${API_BASE}/teacher/sessions/${encodeURIComponent(sessionId)}/timeline?since=${since}`);
+        if (!res.ok) throw new Error("Failed to fetch timeline");
+        const data = await res.json();
+        const rows = {};
+        Object.entries(data.students).forEach(([studentId, cols]) => {
+            rows[studentId] = cols.t.map((t, i) => ({
+                t,
+                status: data.status_names[cols.status[i]],
+                alert: data.alert_names[cols.alert[i]],
+                face_count: cols.face_count[i],
+                confusion_score: cols.confusion_score[i],
+            }));
+        });
+        return rows;
+    } catch (err) {
+        console.error("Teacher API error:", err);
+        return {};
+    }
+}